@@ -0,0 +1,330 @@
+# batch_processor.py
+"""
+📦 Processamento em lote de fotos de entrega
+
+O OCR (Tesseract) é a etapa cara e roda em um ProcessPoolExecutor, um
+processo por núcleo; cada worker mantém os motores do Tesseract carregados
+durante o lote (ver tesseract_pool.py). A assinatura visual (dHash) de cada
+foto também é calculada no pool e, assim que chega, pré-classifica a
+transportadora e o OCR da foto é submetido com o perfil dela: o OCR das
+primeiras fotos começa sem esperar as assinaturas do lote inteiro. As etapas
+leves (metadados EXIF, rotas mais próximas do GPS, análise de padrões,
+validação e aprendizado) rodam no processo principal, que também é o único
+a escrever nos arquivos de conhecimento e no JSONL do lote.
+"""
+
+import os
+import glob
+import hashlib
+import json
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, as_completed, wait
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from metadata_reader import extract_metadata
+from ocr_extractor import OCR_CONFIG, OCR_LANG, extract_ocr_data, limit_tile_threads
+from lib.visual_hash import image_hash
+from tesseract_pool import warm_up_worker
+
+SUPPORTED_FORMATS = {'.jpg', '.jpeg', '.png', '.tiff', '.bmp', '.mpo'}
+MANIFEST_FORMATS = {'.txt', '.lst', '.jsonl'}
+
+
+def _is_image(path: str) -> bool:
+    return os.path.splitext(path.lower())[1] in SUPPORTED_FORMATS
+
+
+def _read_manifest(manifest_path: str) -> List[str]:
+    """Lê um manifesto: uma foto por linha (.txt) ou objetos com 'image_path' (.jsonl)"""
+    base_dir = os.path.dirname(manifest_path)
+    paths = []
+
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+
+            if manifest_path.lower().endswith('.jsonl'):
+                entry = json.loads(line)
+                line = entry.get("image_path") or entry.get("path", "")
+                if not line:
+                    continue
+
+            # Caminhos relativos ao manifesto quando não existirem a partir do cwd
+            if not os.path.isabs(line) and not os.path.exists(line):
+                line = os.path.join(base_dir, line)
+            paths.append(line)
+
+    return paths
+
+
+def collect_photo_paths(source: str) -> List[str]:
+    """
+    Resolve a origem do lote em uma lista de fotos.
+
+    Args:
+        source: Diretório (varrido recursivamente), padrão glob ou manifesto
+
+    Returns:
+        list: Caminhos das fotos, sem duplicatas, na ordem encontrada
+    """
+    if os.path.isdir(source):
+        paths = []
+        for root, _, files in os.walk(source):
+            for file_name in sorted(files):
+                if _is_image(file_name):
+                    paths.append(os.path.join(root, file_name))
+        paths.sort()
+    elif os.path.isfile(source) and os.path.splitext(source.lower())[1] in MANIFEST_FORMATS:
+        paths = _read_manifest(source)
+    elif glob.has_magic(source):
+        paths = sorted(p for p in glob.glob(source, recursive=True) if _is_image(p))
+    elif os.path.isfile(source):
+        paths = [source]
+    else:
+        print(f"❌ [BATCH] Origem não encontrada: {source}")
+        return []
+
+    # Remover duplicatas mantendo a ordem
+    return list(dict.fromkeys(paths))
+
+
+def _init_ocr_worker(tile_threads: int):
+    """Initializer dos workers de OCR: divide os núcleos do OCR por blocos e pré-carrega o Tesseract"""
+    limit_tile_threads(tile_threads)
+    warm_up_worker(OCR_LANG, OCR_CONFIG)
+
+
+def _visual_carrier(visual_hash: Optional[int]) -> Optional[str]:
+    """Transportadora pré-classificada pela assinatura visual da foto (escolhe o perfil de OCR)"""
+    from lib import get_learning_engine
+
+    visual_match = get_learning_engine().visual_recognition(visual_hash)
+    return visual_match.company if visual_match else None
+
+
+def _photo_metadata(path: str) -> Optional[Dict]:
+    """Metadados EXIF da foto, ou None se ilegíveis (a foto é reprocessada e o erro registrado)"""
+    try:
+        return extract_metadata(path)
+    except Exception as e:
+        print(f"⚠️ [BATCH] Metadados ilegíveis em {path}: {e}")
+        return None
+
+
+def _default_output_path() -> str:
+    return f"data/batches/batch_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl"
+
+
+def _content_hash(path: str) -> Optional[str]:
+    try:
+        with open(path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return None
+
+
+def _plan_ocr(photo_paths: List[str]):
+    """
+    Decide quais fotos precisam de OCR: cópias (mesmo conteúdo) de outra foto
+    do lote seguem o OCR dela. Reenvios de lotes anteriores acertam o cache
+    de OCR (ver ocr_cache.py); só o tamanho das fotos é lido, e o sha256 só
+    é calculado para fotos com o mesmo tamanho de outra.
+
+    Returns:
+        tuple: (fotos para o OCR, {foto líder: [cópias dela neste lote]})
+    """
+    by_size: Dict[int, List[str]] = {}
+    for path in photo_paths:
+        try:
+            by_size.setdefault(os.path.getsize(path), []).append(path)
+        except OSError:
+            pass
+
+    leader_of: Dict[str, str] = {}
+    for same_size in by_size.values():
+        leaders: Dict[str, str] = {}  # sha256 -> primeira foto do lote com esse conteúdo
+        for path in same_size if len(same_size) > 1 else ():
+            content_hash = _content_hash(path)
+            if content_hash is None:
+                continue
+            leader_of[path] = leaders.setdefault(content_hash, path)
+
+    to_ocr, followers = [], {}
+    for path in photo_paths:
+        leader = leader_of.get(path, path)
+        if leader == path:
+            to_ocr.append(path)
+        else:
+            followers.setdefault(leader, []).append(path)
+    return to_ocr, followers
+
+
+def process_batch(source: str,
+                  workers: Optional[int] = None,
+                  output_path: Optional[str] = None) -> Dict:
+    """
+    Processa um lote de fotos com OCR paralelo.
+
+    Cópias de uma foto dentro do lote reaproveitam o OCR dela; reenvios de
+    fotos já processadas são servidos pelo cache de OCR.
+
+    Args:
+        source: Diretório, glob ou manifesto com os caminhos das fotos
+        workers: Processos de OCR (padrão: os.cpu_count())
+        output_path: Arquivo JSONL com um resultado por foto
+
+    Returns:
+        dict: Resumo do lote (totais, erros, throughput, arquivo gerado)
+    """
+    # Import tardio: main importa lib, que não é necessário nos workers
+    from main import process_intelligent_delivery
+    from lib import get_enhanced_validators, get_learning_engine
+
+    photo_paths = collect_photo_paths(source)
+    workers = workers or os.cpu_count() or 1
+    output_path = output_path or _default_output_path()
+
+    print(f"📦 [BATCH] {len(photo_paths)} fotos encontradas em: {source}")
+    print(f"⚙️ [BATCH] Workers de OCR: {workers}")
+    print(f"📝 [BATCH] Resultados em: {output_path}")
+
+    summary = {
+        "source": source,
+        "output_path": output_path,
+        "total": len(photo_paths),
+        "processed": 0,
+        "valid": 0,
+        "invalid": 0,
+        "errors": 0,
+        "ocr_calls_avoided": 0,
+        "workers": workers,
+        "elapsed_seconds": 0.0,
+        "photos_per_second": 0.0
+    }
+
+    if not photo_paths:
+        return summary
+
+    output_dir = os.path.dirname(output_path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    started = time.perf_counter()
+
+    with open(output_path, 'w', encoding='utf-8') as out, \
+            ProcessPoolExecutor(max_workers=workers, initializer=_init_ocr_worker,
+                                initargs=((os.cpu_count() or 1) // workers,)) as executor:
+
+        def finish(path, ocr_data=None, duplicate_of=None, error=None):
+            try:
+                if error is not None:
+                    raise error
+                result = process_intelligent_delivery(path, ocr_data=ocr_data,
+                                                      visual_hash=hashes.get(path),
+                                                      metadata=metadata.get(path),
+                                                      nearest_routes=nearest_routes.get(path))
+                record = {"status": "ok", **result, "duplicate_of": duplicate_of}
+
+                summary["processed"] += 1
+                if result["is_valid"]:
+                    summary["valid"] += 1
+                else:
+                    summary["invalid"] += 1
+            except Exception as e:
+                print(f"❌ [BATCH] Erro ao processar {path}: {e}")
+                record = {"status": "error", "image_path": path, "error": str(e)}
+                summary["errors"] += 1
+
+            out.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+            out.flush()
+
+            done = summary["processed"] + summary["errors"]
+            print(f"📦 [BATCH] {done}/{summary['total']} concluídas")
+
+        to_ocr, followers = _plan_ocr(photo_paths)
+        summary["ocr_calls_avoided"] = len(photo_paths) - len(to_ocr)
+        if summary["ocr_calls_avoided"]:
+            print(f"🔁 [BATCH] {summary['ocr_calls_avoided']} cópias de outras fotos do lote - OCR reaproveitado")
+
+        # Assinaturas visuais no pool (JPEG decodificado reduzido), no máximo uma por worker
+        # na fila: cada uma que chega submete o OCR da foto com o perfil da transportadora,
+        # e a próxima assinatura entra na fila atrás dele
+        hashes, metadata, futures = {}, {}, {}
+        pending = iter(to_ocr)
+        hashing = {}
+        preclassified = 0
+
+        def submit_next_hash():
+            path = next(pending, None)
+            if path is not None:
+                hashing[executor.submit(image_hash, path)] = path
+
+        for _ in range(workers):
+            submit_next_hash()
+
+        while hashing:
+            done, _ = wait(hashing, return_when=FIRST_COMPLETED)
+            for future in done:
+                path = hashing.pop(future)
+                hashes[path] = future.result()  # None se a foto não decodifica
+                carrier = _visual_carrier(hashes[path])
+                preclassified += carrier is not None
+                futures[executor.submit(extract_ocr_data, path, carrier)] = path
+                submit_next_hash()
+
+                # Metadados no processo principal enquanto o pool faz o OCR
+                metadata[path] = _photo_metadata(path)
+
+        if preclassified:
+            print(f"👁️ [BATCH] {preclassified} fotos pré-classificadas pela assinatura visual")
+
+        # Cópias têm os mesmos bytes: mesma assinatura e mesmos metadados da foto líder
+        for leader, copies in followers.items():
+            for path in copies:
+                hashes[path], metadata[path] = hashes[leader], metadata[leader]
+
+        # Rota mais próxima de todas as fotos com GPS, consultadas de uma vez no índice espacial
+        located = [path for path in photo_paths if metadata[path] and metadata[path].get("gps")]
+        nearest_routes = dict(zip(located, get_enhanced_validators().find_nearest_routes_bulk(
+            [metadata[path]["gps"] for path in located]
+        ))) if located else {}
+
+        for future in as_completed(futures):
+            path = futures[future]
+
+            try:
+                ocr_data = future.result()
+            except Exception as e:
+                finish(path, error=e)
+                for follower in followers.get(path, []):
+                    finish(follower, error=e)
+                continue
+
+            if ocr_data.get("ocr_cached"):
+                summary["ocr_calls_avoided"] += 1
+            finish(path, ocr_data)
+            for follower in followers.get(path, []):
+                finish(follower, ocr_data, duplicate_of=path)
+
+    # Gravar o conhecimento acumulado desde o último lote de gravações
+    get_learning_engine().flush()
+
+    elapsed = time.perf_counter() - started
+    summary["elapsed_seconds"] = round(elapsed, 3)
+    summary["photos_per_second"] = round(summary["total"] / elapsed, 3) if elapsed > 0 else 0.0
+
+    print("\n" + "="*60)
+    print("📦 RESUMO DO LOTE")
+    print("="*60)
+    print(f"   📸 Total: {summary['total']}")
+    print(f"   ✅ Válidas: {summary['valid']}")
+    print(f"   ❌ Inválidas: {summary['invalid']}")
+    print(f"   ⚠️ Erros: {summary['errors']}")
+    print(f"   🔁 OCR evitado (reenvios): {summary['ocr_calls_avoided']}")
+    print(f"   ⏱️ Tempo: {summary['elapsed_seconds']:.1f}s ({summary['photos_per_second']:.2f} fotos/s)")
+    print(f"   📝 Resultados: {output_path}")
+
+    return summary
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+⏱️ Benchmark do pré-processamento antes do Tesseract
+
+Para cada foto, mede o tempo do pré-processamento (ocr_preprocess.py) e a
+redução de pixels entregues ao Tesseract; se o binário do Tesseract estiver
+instalado, compara também o tempo do OCR na foto original e na processada.
+
+Uso:
+    python benchmarks/bench_preprocess.py [fotos...] [--runs 3] [--lang por+eng]
+"""
+
+import sys
+import time
+import argparse
+import statistics
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from PIL import Image
+
+from ocr_extractor import OCR_CONFIG, OCR_LANG
+from ocr_preprocess import preprocess_config, preprocess_for_ocr
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def _median_seconds(function, runs: int):
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings), result
+
+
+def _tesseract_available() -> bool:
+    try:
+        import pytesseract
+        pytesseract.get_tesseract_version()
+        return True
+    except Exception:
+        return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do pré-processamento de OCR")
+    parser.add_argument("images", nargs="*", help="Fotos (padrão: samples/*.jpg)")
+    parser.add_argument("--runs", type=int, default=3, help="Execuções por medição (mediana)")
+    parser.add_argument("--lang", default=OCR_LANG, help="Idioma do Tesseract")
+    args = parser.parse_args()
+
+    images = [Path(path) for path in args.images] or sorted((ROOT / "samples").glob("*.jpg"))
+    config = preprocess_config()
+    with_tesseract = _tesseract_available()
+
+    print("="*60)
+    print(f"⏱️ PRÉ-PROCESSAMENTO ({config.signature()}, mediana de {args.runs})")
+    print("="*60)
+    if not with_tesseract:
+        print("   ⚠️ Tesseract não encontrado: só o pré-processamento é medido")
+
+    for path in images:
+        image = Image.open(path).convert('RGB')
+        seconds, processed = _median_seconds(lambda: preprocess_for_ocr(image, config), args.runs)
+        ratio = (processed.size[0] * processed.size[1]) / (image.size[0] * image.size[1])
+
+        print(f"\n   📷 {path.name}: {image.size[0]}x{image.size[1]} → "
+              f"{processed.size[0]}x{processed.size[1]} ({ratio:.0%} dos pixels)")
+        print(f"      🔧 Pré-processamento: {seconds * 1000:8.1f} ms")
+
+        if with_tesseract:
+            import pytesseract
+
+            ocr = lambda img: pytesseract.image_to_string(img, lang=args.lang, config=OCR_CONFIG)
+            original_seconds, _ = _median_seconds(lambda: ocr(image), args.runs)
+            processed_seconds, _ = _median_seconds(lambda: ocr(processed), args.runs)
+            print(f"      🔍 Tesseract original:  {original_seconds * 1000:8.1f} ms")
+            print(f"      🔍 Tesseract processada: {processed_seconds * 1000:8.1f} ms "
+                  f"(+{seconds * 1000:.1f} ms de pré-processamento)")
+
+
+if __name__ == "__main__":
+    main()
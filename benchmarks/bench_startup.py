@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+⏱️ Benchmark do custo de inicialização
+
+Mede, em processos novos, o tempo de importação dos módulos de entrada
+(`python -X importtime`) e o tempo do primeiro acesso às instâncias globais
+de lib, que são criadas sob demanda. É o custo fixo pago por cada execução
+curta de main.py e por cada worker recriado.
+
+Uso:
+    python benchmarks/bench_startup.py [--runs 5] [--top 8]
+"""
+
+import os
+import sys
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Módulos de entrada importados por main.py, batch_processor.py e workers
+MODULES = ["lib", "ocr_extractor", "batch_processor", "main"]
+
+# Primeiro acesso a cada instância global (tempo medido dentro do processo)
+FIRST_USE = {
+    "get_tags_patterns()": "from lib import get_tags_patterns as f",
+    "get_learning_engine()": "from lib import get_learning_engine as f",
+    "get_enhanced_validators()": "from lib import get_enhanced_validators as f",
+}
+
+FIRST_USE_SCRIPT = """
+import time
+{import_line}
+started = time.perf_counter()
+f()
+print(time.perf_counter() - started)
+"""
+
+
+def _python(args, cwd=ROOT, env=None) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable] + args, cwd=cwd, env=env,
+                          capture_output=True, text=True, check=True)
+
+
+def import_times(module: str):
+    """(tempo cumulativo do módulo em µs, {import: µs}) de uma importação -X importtime"""
+    stderr = _python(["-X", "importtime", "-c", f"import {module}"]).stderr
+
+    cumulative = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line[len("import time:"):].split("|")
+        cumulative[name.strip()] = int(cumulative_us)
+    return cumulative[module], cumulative
+
+
+def first_use_seconds(import_line: str, workdir: Path) -> float:
+    env = dict(os.environ, PYTHONPATH=str(ROOT))
+    stdout = _python(["-c", FIRST_USE_SCRIPT.format(import_line=import_line)], cwd=workdir, env=env).stdout
+    return float(stdout.strip().splitlines()[-1])
+
+
+def _workdir(tmp: str) -> Path:
+    """Cópia de models/ e da base de rotas: o benchmark não altera os arquivos do repositório"""
+    workdir = Path(tmp)
+    shutil.copytree(ROOT / "models", workdir / "models")
+    (workdir / "lib").mkdir()
+    shutil.copy(ROOT / "lib" / "delivery_database.csv", workdir / "lib" / "delivery_database.csv")
+    return workdir
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do custo de inicialização")
+    parser.add_argument("--runs", type=int, default=5, help="Processos por medição (mediana)")
+    parser.add_argument("--top", type=int, default=8, help="Importações mais lentas listadas por módulo")
+    args = parser.parse_args()
+
+    print("="*60)
+    print("⏱️ INICIALIZAÇÃO - IMPORTAÇÃO (python -X importtime, mediana)")
+    print("="*60)
+
+    for module in MODULES:
+        runs = [import_times(module) for _ in range(args.runs)]
+        total_ms = statistics.median(total for total, _ in runs) / 1000
+        print(f"\n   📦 import {module}: {total_ms:8.1f} ms")
+
+        # Dependências de terceiros e submódulos mais caros (última execução)
+        _, cumulative = runs[-1]
+        top_level = {name: us for name, us in cumulative.items()
+                     if name != module and "." not in name or name.startswith("lib.")}
+        for name, us in sorted(top_level.items(), key=lambda item: -item[1])[:args.top]:
+            print(f"      {us / 1000:8.1f} ms  {name}")
+
+    print("\n" + "="*60)
+    print("⏱️ INICIALIZAÇÃO - PRIMEIRO USO DAS INSTÂNCIAS GLOBAIS (mediana)")
+    print("="*60)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = _workdir(tmp)
+        for label, import_line in FIRST_USE.items():
+            seconds = statistics.median(first_use_seconds(import_line, workdir) for _ in range(args.runs))
+            print(f"   🧠 {label:28s} {seconds * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+⏱️ Benchmark do OCR por blocos em paralelo
+
+Para cada foto, pré-processa a etiqueta, segmenta os blocos de texto
+(find_text_blocks) e mostra a participação do maior bloco e o ganho ideal
+estimado (estimated_tile_speedup) para cada número de threads: é esse
+ganho que decide, com OCR_TILE_MIN_SPEEDUP, se a etiqueta é dividida. Se o
+binário do Tesseract estiver instalado, compara também o tempo do OCR da
+etiqueta inteira com o do OCR por blocos.
+
+Uso:
+    python benchmarks/bench_tiles.py [fotos...] [--runs 3] [--threads 2 4 8]
+"""
+
+import sys
+import time
+import argparse
+import statistics
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from ocr_engines import OCRProfile, estimated_tile_speedup, get_engine, recognize_tiled
+from ocr_extractor import OCR_CONFIG, OCR_LANG, _decode_image
+from ocr_preprocess import find_text_blocks, preprocess_config, preprocess_for_ocr
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def _median_seconds(function, runs: int):
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def _tesseract_available() -> bool:
+    try:
+        import pytesseract
+        pytesseract.get_tesseract_version()
+        return True
+    except Exception:
+        return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do OCR por blocos em paralelo")
+    parser.add_argument("images", nargs="*", help="Fotos (padrão: samples/*.jpg)")
+    parser.add_argument("--runs", type=int, default=3, help="Execuções por medição (mediana)")
+    parser.add_argument("--threads", type=int, nargs="+", default=[2, 4, 8], help="Threads por foto")
+    args = parser.parse_args()
+
+    images = [Path(path) for path in args.images] or sorted((ROOT / "samples").glob("*.jpg"))
+    with_tesseract = _tesseract_available()
+    profile = OCRProfile("tesseract", OCR_LANG, OCR_CONFIG)
+
+    print("="*60)
+    print(f"⏱️ OCR POR BLOCOS (mediana de {args.runs})")
+    print("="*60)
+    if not with_tesseract:
+        print("   ⚠️ Tesseract não encontrado: só a segmentação e o ganho estimado são medidos")
+
+    for path in images:
+        with open(path, 'rb') as f:
+            label = preprocess_for_ocr(_decode_image(f.read()), preprocess_config())
+
+        started = time.perf_counter()
+        blocks = find_text_blocks(label)
+        segmentation_ms = (time.perf_counter() - started) * 1000
+
+        areas = sorted((width * height for _, _, width, height in blocks), reverse=True)
+        label_area = label.size[0] * label.size[1]
+        print(f"\n   📷 {path.name}: {len(blocks)} blocos em {segmentation_ms:.1f} ms")
+        if areas:
+            print(f"      🧱 Maior bloco: {areas[0] / label_area:.0%} da etiqueta, "
+                  f"{areas[0] / sum(areas):.0%} da área dos blocos")
+        for threads in args.threads:
+            print(f"      📈 {threads} threads: ganho ideal {estimated_tile_speedup(blocks, threads):.2f}x")
+
+        if with_tesseract and len(blocks) >= 2:
+            engine = get_engine("tesseract")
+            whole = _median_seconds(lambda: engine.recognize(label, profile, log=False), args.runs)
+            print(f"      🔍 Etiqueta inteira: {whole * 1000:8.1f} ms")
+            for threads in args.threads:
+                tiled = _median_seconds(
+                    lambda: recognize_tiled(engine, label, profile, threads, min_speedup=0.0), args.runs
+                )
+                print(f"      🧩 Blocos, {threads} threads: {tiled * 1000:8.1f} ms ({whole / tiled:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
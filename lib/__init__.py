@@ -1,17 +1,62 @@
 """
 🚚 Sistema Inteligente de Validação de Entregas - Biblioteca Principal
+
+As instâncias globais (tags_patterns, learning_engine, enhanced_validators)
+são criadas no primeiro acesso, e lib.validators (numpy, base de rotas) só é
+importado quando usado: `import lib` não lê modelos nem a base de rotas.
 """
 
-from .tags_patterns import TagsPatterns, PatternMatch, CompanyType, tags_patterns
-from .learning_engine import LearningEngine, LearningSession, learning_engine
-from .validators import ValidationResult, EnhancedValidators, enhanced_validators
+import importlib
+
+from .tags_patterns import TagsPatterns, PatternMatch, CompanyType, get_tags_patterns
+from .learning_engine import LearningEngine, LearningSession, get_learning_engine
+
+# Os submódulos acima têm o mesmo nome das instâncias globais: sem estes nomes
+# no namespace do pacote, `lib.tags_patterns` e `lib.learning_engine` passam
+# por __getattr__ e retornam as instâncias, como antes
+del tags_patterns, learning_engine
 
 __version__ = "2.0.0"
 __author__ = "OCR Learning System"
 
+# Nome exportado -> (submódulo, atributo), resolvidos no primeiro acesso
+_LAZY_EXPORTS = {
+    "tags_patterns": (".tags_patterns", "get_tags_patterns"),
+    "learning_engine": (".learning_engine", "get_learning_engine"),
+    "enhanced_validators": (".validators", "get_enhanced_validators"),
+    "ValidationResult": (".validators", "ValidationResult"),
+    "EnhancedValidators": (".validators", "EnhancedValidators"),
+}
+
+_INSTANCE_ACCESSORS = {"tags_patterns", "learning_engine", "enhanced_validators"}
+
+
+def get_enhanced_validators():
+    """Acesso à instância global sem importar lib.validators antes do primeiro uso"""
+    from .validators import get_enhanced_validators as accessor
+    return accessor()
+
+
+def __getattr__(name):
+    if name not in _LAZY_EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    module_name, attribute = _LAZY_EXPORTS[name]
+    value = getattr(importlib.import_module(module_name, __name__), attribute)
+    if name in _INSTANCE_ACCESSORS:
+        return value()
+
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_EXPORTS))
+
+
 # Exportar instâncias globais para facilitar uso
 __all__ = [
-    "TagsPatterns", "PatternMatch", "CompanyType", "tags_patterns",
-    "LearningEngine", "LearningSession", "learning_engine", 
-    "ValidationResult", "EnhancedValidators", "enhanced_validators"
-] 
\ No newline at end of file
+    "TagsPatterns", "PatternMatch", "CompanyType", "tags_patterns", "get_tags_patterns",
+    "LearningEngine", "LearningSession", "learning_engine", "get_learning_engine",
+    "ValidationResult", "EnhancedValidators", "enhanced_validators", "get_enhanced_validators"
+]
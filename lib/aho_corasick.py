@@ -0,0 +1,123 @@
+"""
+🔎 Autômato de Aho-Corasick
+Busca simultânea de muitos literais em uma única varredura do texto
+"""
+
+import time
+from collections import deque
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+
+class AhoCorasick:
+    """Autômato de Aho-Corasick sobre literais (busca sensível a maiúsculas)"""
+
+    def __init__(self, keywords: Iterable[str] = ()):
+        self._keywords: Set[str] = set()
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._terminal: List[Optional[str]] = [None]
+        self._output: List[Tuple[str, ...]] = [()]
+        self._built = True
+
+        # Estatísticas de construção
+        self.builds = 0
+        self.last_build_seconds = 0.0
+
+        for keyword in keywords:
+            self.add(keyword)
+
+    def __len__(self) -> int:
+        return len(self._keywords)
+
+    def __contains__(self, keyword: str) -> bool:
+        return keyword in self._keywords
+
+    @property
+    def node_count(self) -> int:
+        """Número de estados do autômato"""
+        return len(self._goto)
+
+    def add(self, keyword: str):
+        """Adiciona um literal à trie (os links de falha são recalculados na próxima busca)"""
+        if not keyword or keyword in self._keywords:
+            return
+
+        self._keywords.add(keyword)
+        node = 0
+        for char in keyword:
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._terminal.append(None)
+                self._output.append(())
+                self._goto[node][char] = next_node
+            node = next_node
+
+        self._terminal[node] = keyword
+        self._built = False
+
+    def build(self):
+        """Calcula links de falha e saídas herdadas (BFS a partir da raiz)"""
+        started = time.perf_counter()
+        goto, fail, output = self._goto, self._fail, self._output
+
+        # Saídas próprias de cada nó (descarta as herdadas de um build anterior)
+        for node, keyword in enumerate(self._terminal):
+            output[node] = (keyword,) if keyword is not None else ()
+
+        queue = deque()
+        for child in goto[0].values():
+            fail[child] = 0
+            queue.append(child)
+
+        while queue:
+            node = queue.popleft()
+            for char, child in goto[node].items():
+                queue.append(child)
+                state = fail[node]
+                while state and char not in goto[state]:
+                    state = fail[state]
+                fail[child] = goto[state].get(char, 0)
+                if fail[child] == child:
+                    fail[child] = 0
+                if output[fail[child]]:
+                    output[child] = output[child] + output[fail[child]]
+
+        self._built = True
+        self.builds += 1
+        self.last_build_seconds = time.perf_counter() - started
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, str]]:
+        """Itera (posição final exclusiva, literal) para todas as ocorrências, inclusive sobrepostas"""
+        if not self._built:
+            self.build()
+
+        goto, fail, output = self._goto, self._fail, self._output
+        node = 0
+
+        for position, char in enumerate(text, start=1):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            for keyword in output[node]:
+                yield position, keyword
+
+    def find_all(self, text: str) -> Set[str]:
+        """Conjunto de literais presentes no texto (equivale a `keyword in text` para cada um)"""
+        if not self._built:
+            self.build()
+
+        goto, fail, output = self._goto, self._fail, self._output
+        node = 0
+        found = set()
+
+        for char in text:
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if output[node]:
+                found.update(output[node])
+
+        return found
@@ -0,0 +1,227 @@
+"""
+🧾 Log CSV com Buffer
+Arquivo de log aberto uma única vez por processo, com linhas acumuladas em
+memória e gravadas por uma thread de fundo, rotação por tamanho/tempo e
+compressão gzip opcional dos arquivos rotacionados
+"""
+
+import io
+import os
+import csv
+import gzip
+import time
+import atexit
+import shutil
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+DEFAULT_FLUSH_SECONDS = 1.0
+DEFAULT_ROTATE_MB = 50.0
+DEFAULT_ROTATE_HOURS = 0.0   # 0 = sem rotação por tempo
+DEFAULT_MAX_BUFFERED_ROWS = 1000
+
+
+class BufferedCSVLog:
+    """
+    Sink CSV compartilhado por todas as sessões de um processo.
+
+    `write_row` só formata a linha e a coloca no buffer; a thread de fundo
+    grava o buffer a cada `flush_seconds` com uma única chamada `write` em um
+    descritor O_APPEND (linhas de processos diferentes não se misturam). O
+    arquivo é rotacionado ao passar de `rotate_bytes` ou `rotate_seconds`; se
+    outro processo rotacionou, o arquivo é reaberto na próxima gravação.
+    """
+
+    def __init__(self, path, header: Sequence[str],
+                 flush_seconds: float = DEFAULT_FLUSH_SECONDS,
+                 rotate_bytes: Optional[int] = None,
+                 rotate_seconds: Optional[float] = None,
+                 compress_rotated: bool = True,
+                 max_buffered_rows: int = DEFAULT_MAX_BUFFERED_ROWS):
+        self.path = Path(path)
+        self.header = list(header)
+        self.flush_seconds = flush_seconds
+        self.rotate_bytes = rotate_bytes
+        self.rotate_seconds = rotate_seconds
+        self.compress_rotated = compress_rotated
+        self.max_buffered_rows = max_buffered_rows
+
+        self._buffer: List[str] = []
+        self._lock = threading.Lock()       # protege o buffer
+        self._io_lock = threading.Lock()    # serializa gravação e rotação
+        self._fd: Optional[int] = None
+        self._opened_at = 0.0
+        self._stop = threading.Event()
+
+        # Estatísticas
+        self.rows_written = 0
+        self.flushes = 0
+        self.rotations = 0
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name=f"csv-log-{self.path.name}", daemon=True)
+        self._thread.start()
+
+    def _format(self, row: Sequence) -> str:
+        line = io.StringIO()
+        csv.writer(line).writerow(row)
+        return line.getvalue()
+
+    def write_row(self, row: Sequence):
+        """Enfileira uma linha (gravada pela thread de fundo)"""
+        line = self._format(row)
+        with self._lock:
+            self._buffer.append(line)
+            full = len(self._buffer) >= self.max_buffered_rows
+
+        # Buffer cheio: gravar já, sem esperar o próximo ciclo da thread
+        if full:
+            self.flush()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_seconds):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"⚠️ Erro ao gravar log {self.path}: {e}")
+
+    def _open(self):
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        if os.fstat(fd).st_size == 0:
+            os.write(fd, self._format(self.header).encode('utf-8'))
+        self._fd = fd
+        self._opened_at = time.time()
+
+    def _close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def _ensure_open(self):
+        """Abre o arquivo ou reabre se outro processo o rotacionou/removeu"""
+        if self._fd is not None:
+            try:
+                if os.stat(self.path).st_ino == os.fstat(self._fd).st_ino:
+                    return
+            except FileNotFoundError:
+                pass
+            self._close()
+        self._open()
+
+    def _rotation_due(self) -> bool:
+        if self.rotate_bytes and os.fstat(self._fd).st_size >= self.rotate_bytes:
+            return True
+        if self.rotate_seconds and time.time() - self._opened_at >= self.rotate_seconds:
+            return os.fstat(self._fd).st_size > len(self._format(self.header).encode('utf-8'))
+        return False
+
+    def _rotated_path(self) -> Path:
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        candidate = self.path.with_name(f"{self.path.stem}.{stamp}{self.path.suffix}")
+        counter = 1
+        while candidate.exists() or candidate.with_name(candidate.name + ".gz").exists():
+            candidate = self.path.with_name(f"{self.path.stem}.{stamp}-{counter}{self.path.suffix}")
+            counter += 1
+        return candidate
+
+    def _rotate(self):
+        rotated = self._rotated_path()
+        self._close()
+        try:
+            os.replace(self.path, rotated)
+        except FileNotFoundError:
+            return  # outro processo acabou de rotacionar
+        self.rotations += 1
+
+        if self.compress_rotated:
+            with open(rotated, 'rb') as src, gzip.open(f"{rotated}.gz", 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+            os.unlink(rotated)
+
+    def flush(self):
+        """Grava as linhas pendentes (e rotaciona o arquivo se necessário)"""
+        with self._io_lock:
+            with self._lock:
+                lines, self._buffer = self._buffer, []
+            if not lines:
+                return
+
+            self._ensure_open()
+            data = "".join(lines).encode('utf-8')
+            written = 0
+            while written < len(data):
+                written += os.write(self._fd, data[written:])
+
+            self.rows_written += len(lines)
+            self.flushes += 1
+
+            if self._rotation_due():
+                self._rotate()
+
+    def close(self):
+        """Para a thread de fundo e grava o que restou no buffer"""
+        self._stop.set()
+        if self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join()
+        self.flush()
+        with self._io_lock:
+            self._close()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            buffered = len(self._buffer)
+        return {
+            "path": str(self.path),
+            "buffered_rows": buffered,
+            "rows_written": self.rows_written,
+            "flushes": self.flushes,
+            "rotations": self.rotations
+        }
+
+
+_logs: Dict[str, BufferedCSVLog] = {}
+_logs_pid: Optional[int] = None
+_logs_lock = threading.Lock()
+
+
+def _close_all():
+    for log in list(_logs.values()):
+        log.close()
+
+
+atexit.register(_close_all)
+
+
+def get_csv_log(path, header: Sequence[str]) -> BufferedCSVLog:
+    """
+    Sink do processo atual para `path` (criado na primeira chamada).
+
+    Variáveis de ambiente:
+        LOG_FLUSH_SECONDS=1     intervalo da thread de gravação
+        LOG_ROTATE_MB=50        rotação por tamanho (0 desativa)
+        LOG_ROTATE_HOURS=0      rotação por tempo (0 desativa)
+        LOG_GZIP=1              comprime os arquivos rotacionados (0 desativa)
+    """
+    global _logs_pid
+
+    with _logs_lock:
+        # Threads não sobrevivem ao fork: cada processo filho cria seus próprios sinks
+        if _logs_pid != os.getpid():
+            _logs.clear()
+            _logs_pid = os.getpid()
+
+        key = str(Path(path).resolve())
+        log = _logs.get(key)
+        if log is None:
+            rotate_mb = float(os.getenv('LOG_ROTATE_MB', DEFAULT_ROTATE_MB))
+            rotate_hours = float(os.getenv('LOG_ROTATE_HOURS', DEFAULT_ROTATE_HOURS))
+            log = _logs[key] = BufferedCSVLog(
+                path, header,
+                flush_seconds=float(os.getenv('LOG_FLUSH_SECONDS', DEFAULT_FLUSH_SECONDS)),
+                rotate_bytes=int(rotate_mb * 1024 * 1024) or None,
+                rotate_seconds=rotate_hours * 3600 or None,
+                compress_rotated=os.getenv('LOG_GZIP', '1') != '0'
+            )
+        return log
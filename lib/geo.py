@@ -0,0 +1,30 @@
+"""
+🌍 Funções geográficas compartilhadas
+Distância de Haversine vetorizada com NumPy, usada pelo índice espacial
+de rotas (distâncias de um anel de células de uma vez)
+"""
+
+import math
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371  # Raio da Terra em km
+KM_PER_DEGREE = EARTH_RADIUS_KM * math.pi / 180
+
+
+def haversine_np(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """
+    Haversine vetorizado com broadcast NumPy.
+
+    Aceita escalares ou arrays (graus) e retorna as distâncias em km
+    com o formato resultante do broadcast das entradas.
+    """
+    lat1 = np.radians(np.asarray(lat1, dtype=np.float64))
+    lon1 = np.radians(np.asarray(lon1, dtype=np.float64))
+    lat2 = np.radians(np.asarray(lat2, dtype=np.float64))
+    lon2 = np.radians(np.asarray(lon2, dtype=np.float64))
+
+    a = np.sin((lat2 - lat1) / 2)**2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2)**2
+    c = 2 * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+    return EARTH_RADIUS_KM * c
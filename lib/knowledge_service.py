@@ -0,0 +1,512 @@
+"""
+🛰️ Serviço de Conhecimento (escritor único)
+Um processo dono de models/ recebe as sessões de aprendizado de vários
+workers por um socket Unix local (mensagens JSON, conexão autenticada por
+uma chave compartilhada) e publica snapshots somente leitura que os workers
+releem quando mudam
+
+Uso:
+    LEARNING_SERVICE_AUTHKEY=... python -m lib.knowledge_service --socket data/run/learning.sock
+    LEARNING_SERVICE_AUTHKEY=... LEARNING_SERVICE_SOCKET=data/run/learning.sock python3 main.py --image foto.jpg
+"""
+
+import os
+import json
+import time
+import queue
+import atexit
+import signal
+import argparse
+import threading
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from multiprocessing.connection import Client, Listener, AuthenticationError
+from typing import Dict, List, Optional
+
+from .aho_corasick import AhoCorasick
+from .learning_engine import LearningEngine, LearningSession, session_outcome
+from .persistence import atomic_write_bytes
+from .tags_patterns import CompanyType, PatternMatch
+
+DEFAULT_SOCKET = "data/run/learning.sock"
+SNAPSHOT_FILE = "knowledge_snapshot.json"
+DEFAULT_PUBLISH_EVERY = 50
+DEFAULT_PUBLISH_SECONDS = 5.0
+SNAPSHOT_CHECK_SECONDS = 1.0
+DEFAULT_MAX_PENDING = 10000
+MAX_MESSAGE_BYTES = 1 << 20  # Mensagens maiores encerram a conexão
+
+
+def _authkey() -> bytes:
+    """Chave compartilhada entre serviço e workers (sem padrão: sem ela, nada é iniciado)"""
+    key = os.getenv('LEARNING_SERVICE_AUTHKEY')
+    if not key:
+        raise ValueError("LEARNING_SERVICE_AUTHKEY não definida: o serviço de conhecimento exige uma chave compartilhada")
+    return key.encode('utf-8')
+
+
+# Protocolo: JSON em send_bytes/recv_bytes; nada recebido pelo socket é desserializado com pickle
+
+def _send_message(conn, message):
+    conn.send_bytes(json.dumps(message, ensure_ascii=False, default=str).encode('utf-8'))
+
+
+def _recv_message(conn):
+    return json.loads(conn.recv_bytes(MAX_MESSAGE_BYTES))
+
+
+def _encode_company(match: PatternMatch) -> Dict:
+    return {
+        "company": match.company.value,
+        "confidence": match.confidence,
+        "matched_text": match.matched_text,
+        "pattern_used": match.pattern_used,
+        "extracted_data": match.extracted_data
+    }
+
+
+def _decode_company(data: Dict) -> PatternMatch:
+    return PatternMatch(
+        company=CompanyType(data["company"]),
+        confidence=float(data["confidence"]),
+        matched_text=str(data["matched_text"]),
+        pattern_used=str(data["pattern_used"]),
+        extracted_data=dict(data["extracted_data"])
+    )
+
+
+class KnowledgeService:
+    """
+    Escritor único do conhecimento.
+
+    Uma thread por conexão só enfileira as mensagens; uma única thread
+    escritora as aplica ao LearningEngine na ordem de chegada, então as
+    contagens (total_images, successful_validations...) nunca se perdem.
+    Pedidos com resposta (stats, flush) passam pela mesma fila e enxergam
+    todas as sessões enviadas antes pela mesma conexão.
+    """
+
+    def __init__(self, socket_path: str, engine: LearningEngine,
+                 publish_every: int = DEFAULT_PUBLISH_EVERY,
+                 publish_seconds: float = DEFAULT_PUBLISH_SECONDS):
+        self.socket_path = Path(socket_path)
+        self.engine = engine
+        self.snapshot_path = engine.models_dir / SNAPSHOT_FILE
+        self.publish_every = publish_every
+        self.publish_seconds = publish_seconds
+
+        self._queue: "queue.Queue" = queue.Queue()
+        self._listener: Optional[Listener] = None
+        self._writer: Optional[threading.Thread] = None
+        self._sessions_since_publish = 0
+
+        # Estatísticas
+        self.sessions_applied = 0
+        self.snapshots_published = 0
+        self.connections = 0
+
+    def publish_snapshot(self):
+        """Publica (atomicamente) o snapshot somente leitura usado pelos workers"""
+        engine = self.engine
+        snapshot = {
+            "published_at": datetime.now().isoformat(),
+            "log_seq": engine.learned_patterns.get("log_seq", 0),
+            "learning_stats": engine.get_learning_stats(),
+            "quick_recognition": engine.pattern_cache["quick_recognition"],
+            "investigation_patterns": engine.suggest_investigation_patterns()
+        }
+        atomic_write_bytes(self.snapshot_path, json.dumps(snapshot, ensure_ascii=False, default=str).encode('utf-8'))
+        self._sessions_since_publish = 0
+        self.snapshots_published += 1
+
+    def _apply(self, message):
+        kind = message[0]
+
+        if kind == "session":
+            session = dict(message[1])
+            session["analysis_result"] = {
+                "company": _decode_company(session["analysis_result"]["company"]),
+                "extracted_data": dict(session["analysis_result"]["extracted_data"])
+            }
+            self.engine.process_learning_session(**session)
+            self.sessions_applied += 1
+            self._sessions_since_publish += 1
+        elif kind == "shortcut_hit":
+            self.engine.record_shortcut_hit(*message[1:])
+        elif kind == "stats":
+            reply = message[1]
+            reply["value"] = self.engine.get_learning_stats()
+            reply["done"].set()
+        elif kind == "flush":
+            reply = message[1]
+            self.engine.flush()
+            self.publish_snapshot()
+            reply["value"] = str(self.snapshot_path)
+            reply["done"].set()
+
+    def _write_loop(self):
+        last_publish = time.monotonic()
+
+        while True:
+            try:
+                message = self._queue.get(timeout=self.publish_seconds)
+            except queue.Empty:
+                message = None
+
+            if message is not None and message[0] == "stop":
+                break
+
+            if message is not None:
+                try:
+                    self._apply(message)
+                except Exception as e:
+                    print(f"❌ [SERVIÇO] Erro ao aplicar {message[0]}: {e}")
+
+            due = (self._sessions_since_publish >= self.publish_every or
+                   (self._sessions_since_publish and time.monotonic() - last_publish >= self.publish_seconds))
+            if due:
+                self.publish_snapshot()
+                last_publish = time.monotonic()
+
+        # Encerramento: tudo o que foi aplicado vai para o snapshot e para models/
+        self.engine.flush()
+        self.publish_snapshot()
+
+    def _request(self, kind: str):
+        reply = {"done": threading.Event(), "value": None}
+        self._queue.put((kind, reply))
+        reply["done"].wait()
+        return reply["value"]
+
+    def _handle(self, conn):
+        """Recebe mensagens de um worker até ele desconectar"""
+        with conn:
+            while True:
+                try:
+                    message = _recv_message(conn)
+                    kind = message[0]
+                except (EOFError, OSError):
+                    return
+                except (ValueError, TypeError, KeyError, IndexError) as e:
+                    print(f"⚠️ [SERVIÇO] Mensagem inválida, conexão encerrada: {e}")
+                    return
+
+                if kind in ("session", "shortcut_hit"):
+                    self._queue.put(message)
+                elif kind in ("stats", "flush"):
+                    _send_message(conn, self._request(kind))
+                elif kind == "ping":
+                    _send_message(conn, "pong")
+
+    def start(self):
+        """Cria o socket (0600 desde a criação, em diretório 0700) e a thread escritora"""
+        authkey = _authkey()
+        self.socket_path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        if self.socket_path.exists():
+            self.socket_path.unlink()  # socket órfão de uma execução anterior
+
+        previous_umask = os.umask(0o177)
+        try:
+            self._listener = Listener(str(self.socket_path), family='AF_UNIX', authkey=authkey)
+        finally:
+            os.umask(previous_umask)
+
+        self.publish_snapshot()
+        self._writer = threading.Thread(target=self._write_loop, name="knowledge-writer")
+        self._writer.start()
+
+    def accept_forever(self):
+        """Aceita workers (uma thread por conexão) até o listener ser fechado"""
+        while self._listener is not None:
+            try:
+                conn = self._listener.accept()
+            except AuthenticationError:
+                print("⚠️ [SERVIÇO] Conexão recusada: authkey inválida")
+                continue
+            except (OSError, EOFError):
+                if self._listener is None:
+                    return
+                continue
+            self.connections += 1
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def serve_forever(self):
+        """Atende workers até SIGINT/SIGTERM"""
+        self.start()
+
+        def stop(signum, frame):
+            raise KeyboardInterrupt
+
+        signal.signal(signal.SIGTERM, stop)
+        print(f"🛰️ [SERVIÇO] Conhecimento em {self.engine.models_dir} - escutando em {self.socket_path}")
+
+        try:
+            self.accept_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            # Um segundo sinal não pode interromper a gravação final
+            signal.signal(signal.SIGTERM, signal.SIG_IGN)
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            self.shutdown()
+
+    def shutdown(self):
+        if self._listener is not None:
+            self._listener.close()
+            self._listener = None
+            try:
+                self.socket_path.unlink()
+            except FileNotFoundError:
+                pass
+
+        if self._writer is not None:
+            self._queue.put(("stop",))
+            self._writer.join()
+            self._writer = None
+
+        print(f"🛰️ [SERVIÇO] Encerrado: {self.sessions_applied} sessões aplicadas, "
+              f"{self.snapshots_published} snapshots publicados")
+
+
+class RemoteLearningEngine:
+    """
+    Cliente do KnowledgeService com a mesma interface usada por main.py.
+
+    Sessões e acertos de shortcut são enviados sem esperar resposta (se o
+    serviço estiver fora, ficam pendentes e são reenviados na próxima
+    chamada e no encerramento; acima de `max_pending`, as mais antigas são
+    descartadas). quick_recognition roda localmente sobre o snapshot
+    publicado, relido quando muda.
+    """
+
+    def __init__(self, socket_path: str = DEFAULT_SOCKET, models_dir: str = "models",
+                 max_pending: Optional[int] = None):
+        self.socket_path = str(socket_path)
+        self.models_dir = Path(models_dir)
+        self.snapshot_path = self.models_dir / SNAPSHOT_FILE
+        self._authkey = _authkey()
+
+        if max_pending is None:
+            max_pending = int(os.getenv('LEARNING_SERVICE_MAX_PENDING', DEFAULT_MAX_PENDING))
+
+        self.session_counter = 0
+        self._conn = None
+        self._conn_pid: Optional[int] = None
+        self._pending: deque = deque(maxlen=max(1, max_pending))
+        self.dropped_messages = 0
+        self._warned = False
+
+        self._snapshot: Dict = {}
+        self._snapshot_key = None
+        self._next_snapshot_check = 0.0
+        self._matcher = AhoCorasick()
+        self._shortcut_order: Dict[str, int] = {}
+        self._signature_store = None
+        self._visual_index = None
+
+        atexit.register(self.close)
+
+    def _connection(self):
+        # Conexões não são compartilhadas entre processos (fork)
+        if self._conn is None or self._conn_pid != os.getpid():
+            self._conn = Client(self.socket_path, family='AF_UNIX', authkey=self._authkey)
+            self._conn_pid = os.getpid()
+        return self._conn
+
+    def _disconnect(self, error: Exception):
+        self._conn = None
+        if not self._warned:
+            print(f"⚠️ [APRENDIZADO] Serviço de conhecimento indisponível ({error}); "
+                  f"{len(self._pending)} mensagens pendentes")
+            self._warned = True
+
+    def _send(self, message=None) -> bool:
+        """Envia a mensagem (e as pendentes, na ordem); False se o serviço estiver fora"""
+        if message is not None:
+            if len(self._pending) == self._pending.maxlen:
+                if not self.dropped_messages:
+                    print(f"⚠️ [APRENDIZADO] Mais de {self._pending.maxlen} mensagens pendentes; "
+                          f"descartando as mais antigas")
+                self.dropped_messages += 1
+            self._pending.append(message)
+
+        try:
+            conn = self._connection()
+            while self._pending:
+                _send_message(conn, self._pending[0])
+                self._pending.popleft()
+        except (OSError, EOFError) as e:
+            self._disconnect(e)
+            return False
+
+        self._warned = False
+        return True
+
+    def _call(self, kind: str):
+        if not self._send():
+            return None
+        try:
+            conn = self._connection()
+            _send_message(conn, (kind,))
+            return _recv_message(conn)
+        except (OSError, EOFError) as e:
+            self._disconnect(e)
+            return None
+
+    def process_learning_session(self,
+                                 image_path: str,
+                                 ocr_text: str,
+                                 analysis_result: Dict,
+                                 gps_validation: bool = False,
+                                 route_match: bool = False,
+                                 visual_hash: Optional[int] = None) -> LearningSession:
+        """Envia a sessão ao serviço; o resultado é calculado localmente"""
+        self.session_counter += 1
+        timestamp = datetime.now().isoformat()
+        company = analysis_result["company"].company.value
+
+        self._send(("session", {
+            "image_path": image_path,
+            "ocr_text": ocr_text,
+            "analysis_result": {
+                "company": _encode_company(analysis_result["company"]),
+                "extracted_data": analysis_result["extracted_data"]
+            },
+            "gps_validation": gps_validation,
+            "route_match": route_match,
+            "timestamp": timestamp,
+            "visual_hash": visual_hash
+        }))
+
+        return LearningSession(
+            timestamp=timestamp,
+            image_path=image_path,
+            ocr_text=ocr_text,
+            company_detected=company,
+            confidence=analysis_result["company"].confidence,
+            extracted_data=analysis_result["extracted_data"],
+            gps_validation=gps_validation,
+            route_match=route_match,
+            learning_outcome=session_outcome(company, gps_validation, route_match)
+        )
+
+    def _refresh_snapshot(self):
+        """Relê o snapshot publicado se ele mudou (verificação limitada a 1x por segundo)"""
+        now = time.monotonic()
+        if now < self._next_snapshot_check:
+            return
+        self._next_snapshot_check = now + SNAPSHOT_CHECK_SECONDS
+
+        try:
+            stat = os.stat(self.snapshot_path)
+        except OSError:
+            return
+
+        key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if key == self._snapshot_key or stat.st_size == 0:
+            return
+
+        with open(self.snapshot_path, 'rb') as f:
+            snapshot = json.loads(f.read())
+
+        shortcuts = snapshot.get("quick_recognition", {})
+        if shortcuts != self._snapshot.get("quick_recognition"):
+            self._matcher = AhoCorasick(shortcuts)
+            self._shortcut_order = {phrase: order for order, phrase in enumerate(shortcuts)}
+
+        self._snapshot = snapshot
+        self._snapshot_key = key
+
+    def quick_recognition(self, text: str) -> Optional[str]:
+        """Reconhecimento rápido sobre o snapshot (acerto informado ao serviço)"""
+        self._refresh_snapshot()
+
+        found = self._matcher.find_all(text.lower())
+        if not found:
+            return None
+
+        phrase = min(found, key=self._shortcut_order.__getitem__)
+        self._send(("shortcut_hit", phrase, datetime.now().isoformat()))
+        return self._snapshot["quick_recognition"][phrase]
+
+    @property
+    def signature_store(self):
+        """Assinaturas visuais gravadas pelo serviço, mapeadas somente leitura"""
+        if self._signature_store is None:
+            from .signature_store import SignatureStore
+            self._signature_store = SignatureStore(self.models_dir / "company_signatures", readonly=True)
+        return self._signature_store
+
+    def visual_recognition(self, visual_hash: Optional[int]):
+        """Pré-classificação visual sobre as assinaturas gravadas pelo serviço"""
+        if visual_hash is None:
+            return None
+        if self._visual_index is None:
+            from .visual_hash import VisualSignatureIndex
+            self._visual_index = VisualSignatureIndex(self.signature_store)
+        return self._visual_index.classify(visual_hash)
+
+    def get_learning_stats(self) -> Dict:
+        """Estatísticas atualizadas do serviço (ou do último snapshot, se ele estiver fora)"""
+        stats = self._call("stats")
+        if stats is None:
+            self._next_snapshot_check = 0.0
+            self._refresh_snapshot()
+            stats = dict(self._snapshot.get("learning_stats", {
+                "total_images_processed": 0,
+                "successful_recognitions": 0,
+                "recognition_accuracy": 0.0,
+                "companies_learned": 0,
+                "companies_detail": {}
+            }))
+
+        stats["session_counter"] = self.session_counter
+        return stats
+
+    def suggest_investigation_patterns(self) -> List[Dict]:
+        self._refresh_snapshot()
+        return self._snapshot.get("investigation_patterns", [])
+
+    def flush(self):
+        """Espera o serviço aplicar tudo o que foi enviado e publicar um novo snapshot"""
+        if self._call("flush") is not None:
+            self._next_snapshot_check = 0.0
+            self._refresh_snapshot()
+
+    def close(self):
+        if self._pending:
+            self._send()
+            if self._pending:
+                print(f"⚠️ [APRENDIZADO] {len(self._pending)} mensagens não entregues ao serviço de conhecimento")
+
+        if self._conn is not None and self._conn_pid == os.getpid():
+            self._conn.close()
+        self._conn = None
+
+
+def serve(socket_path: str = DEFAULT_SOCKET, models_dir: str = "models", **kwargs):
+    """Inicia o serviço sobre `models_dir` (o processo do serviço é o único a gravar nele)"""
+    KnowledgeService(socket_path, LearningEngine(models_dir), **kwargs).serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serviço de conhecimento (escritor único de models/)")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET, help="Caminho do socket Unix")
+    parser.add_argument("--models-dir", default="models", help="Diretório dos modelos")
+    parser.add_argument("--publish-every", type=int, default=DEFAULT_PUBLISH_EVERY,
+                        help="Sessões entre snapshots publicados")
+    parser.add_argument("--publish-seconds", type=float, default=DEFAULT_PUBLISH_SECONDS,
+                        help="Intervalo máximo entre snapshots publicados")
+    args = parser.parse_args()
+
+    try:
+        _authkey()
+    except ValueError as e:
+        parser.error(str(e))
+
+    serve(args.socket, args.models_dir, publish_every=args.publish_every, publish_seconds=args.publish_seconds)
+
+
+if __name__ == "__main__":
+    main()
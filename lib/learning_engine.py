@@ -6,13 +6,50 @@ Sistema que aprende automaticamente com cada etiqueta processada
 import json
 import pickle
 import os
+import atexit
 from datetime import datetime
 from typing import Dict, List, Optional, Tuple
 from dataclasses import dataclass, asdict
-import csv
+import time
+from itertools import islice
 from pathlib import Path
 
-from .tags_patterns import CompanyType, PatternMatch, tags_patterns
+from .tags_patterns import CompanyType, PatternMatch, get_tags_patterns
+from .persistence import KnowledgeWriter
+from .session_log import SessionLog
+from .csv_log import get_csv_log
+from .aho_corasick import AhoCorasick
+
+# Cache de shortcuts (quick_recognition): limites e critérios de promoção/despejo
+SHORTCUT_CAPACITY = int(os.getenv('SHORTCUT_CAPACITY', 500))
+SHORTCUT_CANDIDATE_CAPACITY = SHORTCUT_CAPACITY * 4
+SHORTCUT_MIN_DELIVERIES = 2      # Entregas distintas antes de virar shortcut
+SHORTCUT_MIN_PRECISION = 0.8     # Abaixo disso o shortcut é removido...
+SHORTCUT_MIN_CHECKS = 3          # ...depois de conferido ao menos N vezes
+
+# Sessões no log antes de compactá-las em um novo snapshot de learned_patterns.json
+SNAPSHOT_EVERY = int(os.getenv('LEARNING_SNAPSHOT_EVERY', 500))
+EVOLUTION_TIMELINE_LIMIT = 100
+
+# Assinaturas visuais: só reconhecimentos de texto confiáveis ensinam o índice visual
+VISUAL_LEARN_MIN_CONFIDENCE = 0.8
+LOGO_SIGNATURE_LIMIT = 20
+
+# Trilha de auditoria das sessões
+LEARNING_LOG_FILE = "data/logs/learning_progress.csv"
+LEARNING_LOG_HEADER = [
+    "timestamp", "image_path", "company_detected", "confidence",
+    "data_fields_found", "gps_validation", "route_match",
+    "learning_outcome", "total_processed"
+]
+
+def session_outcome(company: str, gps_validation: bool, route_match: bool) -> str:
+    """Resultado de aprendizado de uma sessão"""
+    if company == "unknown":
+        return "unknown_pattern_logged"
+    if gps_validation and route_match:
+        return "successful_validation"
+    return "recognized_but_not_validated"
 
 @dataclass
 class LearningSession:
@@ -29,24 +66,51 @@ class LearningSession:
 class LearningEngine:
     """Motor de aprendizado que evolui com cada etiqueta processada"""
     
-    def __init__(self, models_dir: str = "models"):
+    def __init__(self, models_dir: str = "models",
+                 flush_every: Optional[int] = None, flush_seconds: Optional[float] = None):
         self.models_dir = Path(models_dir)
         self.models_dir.mkdir(exist_ok=True)
         
         # Arquivos de conhecimento
         self.patterns_file = self.models_dir / "learned_patterns.json"
-        self.signatures_file = self.models_dir / "company_signatures.pkl"
+        self.signatures_dir = self.models_dir / "company_signatures"
+        self.legacy_signatures_file = self.models_dir / "company_signatures.pkl"
         self.cache_file = self.models_dir / "pattern_cache.json"
+        self.session_log_file = self.models_dir / "learning_sessions.jsonl"
         
-        # Carregar conhecimento existente
+        # Carregar conhecimento existente (snapshot + sessões registradas depois dele)
         self.learned_patterns = self._load_learned_patterns()
-        self.company_signatures = self._load_company_signatures()
+        self.session_log = SessionLog(self.session_log_file, last_seq=self.learned_patterns.get("log_seq", 0))
+        self._sessions_since_snapshot = self._replay_session_log()
+        self._signature_store = None  # Tabelas mapeadas em memória, abertas no primeiro uso
+        self._visual_index = None
         self.pattern_cache = self._load_pattern_cache()
         
+        # Autômato dos shortcuts de quick_recognition (sincronizado sob demanda)
+        self._shortcut_matcher: Optional[AhoCorasick] = None
+        self._shortcut_source: Optional[Dict] = None
+        self._shortcut_order: Dict[str, int] = {}
+        self._shortcut_full_rebuilds = 0
+        self._shortcut_sync_seconds = 0.0
+        
         # Contadores de aprendizado
         self.session_counter = 0
         self.total_processed = self.learned_patterns.get("statistics", {}).get("total_images", 0)
         
+        # Gravação agrupada e atômica dos arquivos de conhecimento
+        self.knowledge_writer = KnowledgeWriter(flush_every, flush_seconds)
+        self.knowledge_writer.register(
+            "patterns", self.patterns_file,
+            lambda: json.dumps(self.learned_patterns, indent=2, ensure_ascii=False).encode('utf-8')
+        )
+        self.knowledge_writer.register(
+            "cache", self.cache_file,
+            lambda: json.dumps(self.pattern_cache, indent=2, ensure_ascii=False).encode('utf-8')
+        )
+        
+        # Registrado depois do KnowledgeWriter: roda antes do flush dele no encerramento
+        atexit.register(self._compact_on_exit)
+        
     def _load_learned_patterns(self) -> Dict:
         """Carrega padrões aprendidos do arquivo JSON"""
         if self.patterns_file.exists():
@@ -123,42 +187,65 @@ class LearningEngine:
             }
         }
     
-    def _load_company_signatures(self) -> Dict:
-        """Carrega assinaturas visuais das empresas"""
-        if self.signatures_file.exists():
-            try:
-                with open(self.signatures_file, 'rb') as f:
-                    return pickle.load(f)
-            except Exception as e:
-                print(f"Erro ao carregar assinaturas: {e}")
-        
-        return {
-            "visual_hashes": {},
-            "color_signatures": {},
-            "layout_patterns": {}
-        }
+    @property
+    def signature_store(self):
+        """
+        Assinaturas visuais das empresas (lib/signature_store.py).
+        
+        Gravadas em append em tabelas binárias de registros fixos, sem passar
+        pelo KnowledgeWriter; um company_signatures.pkl antigo é importado
+        uma vez e renomeado para .pkl.migrated.
+        """
+        if self._signature_store is None:
+            from .signature_store import SignatureStore
+            
+            store = SignatureStore(self.signatures_dir)
+            if self.legacy_signatures_file.exists() and not store.meta_path.exists():
+                try:
+                    with open(self.legacy_signatures_file, 'rb') as f:
+                        imported = store.import_legacy(pickle.load(f))
+                    self.legacy_signatures_file.rename(self.legacy_signatures_file.with_suffix(".pkl.migrated"))
+                    print(f"🗂️ Assinaturas migradas de {self.legacy_signatures_file.name}: {imported} registros")
+                except Exception as e:
+                    print(f"Erro ao migrar assinaturas: {e}")
+            self._signature_store = store
+        return self._signature_store
     
     def _load_pattern_cache(self) -> Dict:
-        """Carrega cache de reconhecimento rápido"""
+        """
+        Carrega cache de reconhecimento rápido.
+        
+        - quick_recognition: frase -> empresa (shortcuts ativos)
+        - text_shortcuts: frase -> estatísticas do shortcut (acertos, último uso, precisão)
+        - pattern_frequency: frase -> candidata ainda não promovida (empresa, entregas, última vez vista)
+        """
+        cache = {
+            "quick_recognition": {},
+            "text_shortcuts": {},
+            "pattern_frequency": {}
+        }
+        
         if self.cache_file.exists():
             try:
                 with open(self.cache_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+                    cache.update(json.load(f))
             except Exception as e:
                 print(f"Erro ao carregar cache: {e}")
         
-        return {
-            "quick_recognition": {},
-            "text_shortcuts": {},
-            "pattern_frequency": {}
-        }
+        # Shortcuts de versões anteriores (sem estatísticas) entram zerados
+        for phrase in cache["quick_recognition"]:
+            cache["text_shortcuts"].setdefault(phrase, self._new_shortcut_stats())
+        
+        return cache
     
     def process_learning_session(self, 
                                 image_path: str,
                                 ocr_text: str,
                                 analysis_result: Dict,
                                 gps_validation: bool = False,
-                                route_match: bool = False) -> LearningSession:
+                                route_match: bool = False,
+                                timestamp: Optional[str] = None,
+                                visual_hash: Optional[int] = None) -> LearningSession:
         """Processa uma sessão de aprendizado com uma nova etiqueta"""
         
         self.session_counter += 1
@@ -166,7 +253,7 @@ class LearningEngine:
         
         # Criar sessão de aprendizado
         session = LearningSession(
-            timestamp=datetime.now().isoformat(),
+            timestamp=timestamp or datetime.now().isoformat(),
             image_path=image_path,
             ocr_text=ocr_text,
             company_detected=analysis_result["company"].company.value,
@@ -177,31 +264,101 @@ class LearningEngine:
             learning_outcome=""
         )
         
-        # Processar aprendizado
-        if session.company_detected != "unknown":
-            self._learn_from_successful_recognition(session, analysis_result)
-        else:
-            self._learn_from_unknown_pattern(session, analysis_result)
+        # Registrar a sessão no log (uma linha, O(1)) e aplicá-la ao conhecimento
+        record = self._session_record(session)
+        if session.company_detected != "unknown" and analysis_result["company"].matched_text:
+            record["logo_text"] = analysis_result["company"].matched_text.strip().lower()
+        self.session_log.append(record)
+        session.learning_outcome = self._apply_session_record(record)
         
-        # Atualizar estatísticas
-        self._update_statistics(session)
+        if session.company_detected != "unknown":
+            self._check_shortcut_precision(ocr_text, session.company_detected)
+            self._create_shortcuts(ocr_text, session.company_detected, analysis_result)
+            
+            # Assinatura visual da foto para a pré-classificação antes do OCR
+            if session.confidence >= VISUAL_LEARN_MIN_CONFIDENCE:
+                self.visual_index.learn(visual_hash, session.company_detected)
         
-        # Salvar conhecimento
-        self._save_all_knowledge()
+        # Snapshot compactado a cada SNAPSHOT_EVERY sessões; o cache segue gravado em lote
+        self._sessions_since_snapshot += 1
+        if self._sessions_since_snapshot >= SNAPSHOT_EVERY:
+            self._compact_session_log()
+        self.knowledge_writer.session_done()
         
         # Log da sessão
         self._log_learning_session(session)
         
         return session
     
-    def _learn_from_successful_recognition(self, session: LearningSession, analysis: Dict):
+    def _session_record(self, session: LearningSession) -> Dict:
+        """Registro do log com tudo o que a sessão altera em learned_patterns"""
+        record = {
+            "timestamp": session.timestamp,
+            "image_path": session.image_path,
+            "company": session.company_detected,
+            "gps_validation": session.gps_validation,
+            "route_match": session.route_match,
+            "total_images": self.total_processed
+        }
+        
+        if session.company_detected != "unknown":
+            record["words"] = self._significant_words(session.ocr_text)
+        else:
+            record["ocr_text"] = session.ocr_text[:200]  # Primeiros 200 chars
+            record["extracted_data"] = session.extracted_data
+            record["potential_patterns"] = self._identify_potential_patterns(session.ocr_text)
+        
+        return record
+    
+    def _apply_session_record(self, record: Dict, verbose: bool = True) -> str:
+        """Aplica um registro do log a learned_patterns (sessão nova ou replay na carga)"""
+        if record["company"] != "unknown":
+            outcome = self._learn_from_successful_recognition(record, verbose)
+        else:
+            outcome = self._learn_from_unknown_pattern(record, verbose)
+        
+        self._update_statistics(record)
+        self.learned_patterns["log_seq"] = record["seq"]
+        return outcome
+    
+    def _replay_session_log(self) -> int:
+        """Reaplica as sessões gravadas depois do último snapshot; retorna quantas"""
+        replayed = 0
+        for record in self.session_log.replay(self.learned_patterns.get("log_seq", 0)):
+            self._apply_session_record(record, verbose=False)
+            replayed += 1
+        
+        if replayed:
+            print(f"📜 {replayed} sessões reaplicadas do log de aprendizado")
+        return replayed
+    
+    def _compact_session_log(self) -> bool:
+        """Grava o snapshot de learned_patterns.json e descarta do log as sessões já incluídas"""
+        seq = self.learned_patterns.get("log_seq", 0)
+        self.knowledge_writer.mark_dirty("patterns")
+        if not self.knowledge_writer.flush():
+            return False
+        
+        self.session_log.truncate_through(seq)
+        self._sessions_since_snapshot = 0
+        return True
+    
+    def _compact_on_exit(self):
+        if self._sessions_since_snapshot:
+            self._compact_session_log()
+        self.session_log.close()
+        if self._signature_store is not None:
+            self._signature_store.close()
+    
+    def _learn_from_successful_recognition(self, record: Dict, verbose: bool = True) -> str:
         """Aprende com reconhecimento bem-sucedido"""
         
-        company = session.company_detected
+        company = record["company"]
         
         # Verificar se empresa existe, se não, criar dinamicamente
         if company not in self.learned_patterns["companies"]:
-            print(f"🆕 [APRENDIZADO] Nova empresa detectada: {company} - Criando estrutura...")
+            if verbose:
+                print(f"🆕 [APRENDIZADO] Nova empresa detectada: {company} - Criando estrutura...")
             self.learned_patterns["companies"][company] = {
                 "confidence_score": 0.0,
                 "total_samples": 0,
@@ -220,33 +377,38 @@ class LearningEngine:
         # Atualizar contadores
         company_data["total_samples"] += 1
         
-        if session.gps_validation and session.route_match:
+        outcome = session_outcome(company, record["gps_validation"], record["route_match"])
+        if outcome == "successful_validation":
             company_data["successful_validations"] += 1
-            session.learning_outcome = "successful_validation"
-        else:
-            session.learning_outcome = "recognized_but_not_validated"
         
         # Aprender novos padrões de texto
-        self._extract_new_text_patterns(session.ocr_text, company_data)
+        self._extract_new_text_patterns(record["words"], company_data)
         
-        # Criar shortcuts para reconhecimento rápido
-        self._create_shortcuts(session.ocr_text, company, analysis)
+        # Texto que identificou a transportadora (logotipo/nome impresso na etiqueta)
+        logo_signatures = company_data["visual_patterns"]["logo_signatures"]
+        logo_text = record.get("logo_text")
+        if logo_text and logo_text not in logo_signatures and len(logo_signatures) < LOGO_SIGNATURE_LIMIT:
+            logo_signatures.append(logo_text)
         
         # Atualizar score de confiança da empresa
         success_rate = company_data["successful_validations"] / company_data["total_samples"]
         company_data["confidence_score"] = min(99.9, 60 + (success_rate * 35) + (company_data["total_samples"] * 0.05))
         
-        # Timeline de evolução
+        # Timeline de evolução (últimos EVOLUTION_TIMELINE_LIMIT pontos)
         company_data["evolution_timeline"].append({
-            "timestamp": session.timestamp,
+            "timestamp": record["timestamp"],
             "confidence": company_data["confidence_score"],
             "total_samples": company_data["total_samples"],
             "success_rate": success_rate
         })
+        if len(company_data["evolution_timeline"]) > EVOLUTION_TIMELINE_LIMIT:
+            company_data["evolution_timeline"] = company_data["evolution_timeline"][-EVOLUTION_TIMELINE_LIMIT:]
         
-        print(f"📚 Aprendizado: {company} agora tem {company_data['total_samples']} samples (confiança: {company_data['confidence_score']:.1f}%)")
+        if verbose:
+            print(f"📚 Aprendizado: {company} agora tem {company_data['total_samples']} samples (confiança: {company_data['confidence_score']:.1f}%)")
+        return outcome
     
-    def _learn_from_unknown_pattern(self, session: LearningSession, analysis: Dict):
+    def _learn_from_unknown_pattern(self, record: Dict, verbose: bool = True) -> str:
         """Aprende com padrão desconhecido para investigação futura"""
         
         unknown_data = self.learned_patterns["companies"]["unknown"]
@@ -254,11 +416,11 @@ class LearningEngine:
         
         # Salvar padrão para investigação
         pattern_to_investigate = {
-            "timestamp": session.timestamp,
-            "image_path": session.image_path,
-            "ocr_text": session.ocr_text[:200],  # Primeiros 200 chars
-            "extracted_data": session.extracted_data,
-            "potential_patterns": self._identify_potential_patterns(session.ocr_text)
+            "timestamp": record["timestamp"],
+            "image_path": record["image_path"],
+            "ocr_text": record["ocr_text"],
+            "extracted_data": record["extracted_data"],
+            "potential_patterns": record["potential_patterns"]
         }
         
         unknown_data["patterns_to_investigate"].append(pattern_to_investigate)
@@ -267,19 +429,24 @@ class LearningEngine:
         if len(unknown_data["patterns_to_investigate"]) > 50:
             unknown_data["patterns_to_investigate"] = unknown_data["patterns_to_investigate"][-50:]
         
-        session.learning_outcome = "unknown_pattern_logged"
-        print(f"🔍 Padrão desconhecido salvo para investigação futura")
+        if verbose:
+            print(f"🔍 Padrão desconhecido salvo para investigação futura")
+        return session_outcome("unknown", record["gps_validation"], record["route_match"])
+    
+    @staticmethod
+    def _significant_words(ocr_text: str) -> List[str]:
+        """Palavras significativas do OCR, sem repetição, na ordem do texto"""
+        return list(dict.fromkeys(
+            word for word in ocr_text.lower().split() if len(word) > 3 and word.isalpha()
+        ))
     
-    def _extract_new_text_patterns(self, ocr_text: str, company_data: Dict):
+    def _extract_new_text_patterns(self, words: List[str], company_data: Dict):
         """Extrai novos padrões de texto do OCR"""
         
         # Palavras-chave que aparecem frequentemente
-        words = ocr_text.lower().split()
-        
         for word in words:
-            if len(word) > 3 and word.isalpha():  # Palavras significativas
-                if word not in company_data["visual_patterns"]["text_patterns"]:
-                    company_data["visual_patterns"]["text_patterns"].append(word)
+            if word not in company_data["visual_patterns"]["text_patterns"]:
+                company_data["visual_patterns"]["text_patterns"].append(word)
         
         # Manter apenas os 50 padrões mais comuns
         if len(company_data["visual_patterns"]["text_patterns"]) > 50:
@@ -300,10 +467,83 @@ class LearningEngine:
             if confidence > 0.8 and len(value) > 5:
                 key_phrases.append(value.lower())
         
-        # Salvar shortcuts no cache
-        for phrase in key_phrases:
-            if phrase not in self.pattern_cache["quick_recognition"]:
-                self.pattern_cache["quick_recognition"][phrase] = company
+        # Frases novas entram como candidatas; viram shortcut ao se repetirem em outras entregas
+        self._record_shortcut_candidates(set(key_phrases), company)
+    
+    @staticmethod
+    def _new_shortcut_stats() -> Dict:
+        return {"hits": 0, "last_hit": None, "checks": 0, "correct": 0, "promoted_at": datetime.now().isoformat()}
+    
+    def _record_shortcut_candidates(self, phrases, company: str):
+        """Conta as entregas em que cada frase apareceu e promove as recorrentes"""
+        shortcuts = self.pattern_cache["quick_recognition"]
+        candidates = self.pattern_cache["pattern_frequency"]
+        now = datetime.now().isoformat()
+        
+        for phrase in phrases:
+            if phrase in shortcuts:
+                continue
+            
+            candidate = candidates.get(phrase)
+            if candidate is None or candidate["company"] != company:
+                # Frase nova (ou vista antes com outra empresa): recomeçar a contagem
+                candidate = candidates[phrase] = {"company": company, "deliveries": 0, "last_seen": now}
+            
+            candidate["deliveries"] += 1
+            candidate["last_seen"] = now
+            
+            if candidate["deliveries"] >= SHORTCUT_MIN_DELIVERIES:
+                del candidates[phrase]
+                self._promote_shortcut(phrase, company)
+        
+        # Candidatas limitadas: descartar as vistas há mais tempo
+        if len(candidates) > SHORTCUT_CANDIDATE_CAPACITY:
+            stale = sorted(candidates, key=lambda phrase: candidates[phrase]["last_seen"])
+            for phrase in stale[:len(candidates) - SHORTCUT_CANDIDATE_CAPACITY]:
+                del candidates[phrase]
+        
+        if phrases:
+            self.knowledge_writer.mark_dirty("cache")
+    
+    def _promote_shortcut(self, phrase: str, company: str):
+        """Ativa um shortcut, despejando o de menor valor se o cache estiver cheio"""
+        shortcuts = self.pattern_cache["quick_recognition"]
+        stats = self.pattern_cache["text_shortcuts"]
+        
+        if len(shortcuts) >= SHORTCUT_CAPACITY:
+            # LFU, desempatado por LRU (último acerto ou, sem acertos, promoção)
+            victim = min(shortcuts, key=lambda other: (
+                stats[other]["hits"], stats[other]["last_hit"] or stats[other]["promoted_at"]
+            ))
+            self._evict_shortcut(victim)
+        
+        shortcuts[phrase] = company
+        stats[phrase] = self._new_shortcut_stats()
+    
+    def _evict_shortcut(self, phrase: str):
+        self.pattern_cache["quick_recognition"].pop(phrase, None)
+        self.pattern_cache["text_shortcuts"].pop(phrase, None)
+        self._invalidate_shortcut_index()
+        self.knowledge_writer.mark_dirty("cache")
+    
+    def _check_shortcut_precision(self, ocr_text: str, company: str):
+        """Confere os shortcuts presentes no texto contra a empresa da análise completa"""
+        shortcuts = self.pattern_cache["quick_recognition"]
+        stats = self.pattern_cache["text_shortcuts"]
+        found = self._shortcut_index().find_all(ocr_text.lower())
+        
+        for phrase in found:
+            phrase_stats = stats[phrase]
+            phrase_stats["checks"] += 1
+            if shortcuts[phrase] == company:
+                phrase_stats["correct"] += 1
+            elif (phrase_stats["checks"] >= SHORTCUT_MIN_CHECKS and
+                  phrase_stats["correct"] / phrase_stats["checks"] < SHORTCUT_MIN_PRECISION):
+                print(f"🗑️ Shortcut impreciso removido: '{phrase}' ({phrase_stats['correct']}/{phrase_stats['checks']})")
+                self._evict_shortcut(phrase)
+        
+        if found:
+            self.knowledge_writer.mark_dirty("cache")
     
     def _identify_potential_patterns(self, ocr_text: str) -> List[str]:
         """Identifica potenciais padrões em texto desconhecido"""
@@ -311,7 +551,7 @@ class LearningEngine:
         potential_patterns = []
         
         # Códigos de rastreamento
-        tracking_codes = tags_patterns.extract_data(ocr_text, "nf_number")
+        tracking_codes = get_tags_patterns().extract_data(ocr_text, "nf_number")
         if tracking_codes:
             potential_patterns.append(f"tracking_code: {tracking_codes[0][0]}")
         
@@ -328,13 +568,13 @@ class LearningEngine:
         
         return potential_patterns
     
-    def _update_statistics(self, session: LearningSession):
+    def _update_statistics(self, record: Dict):
         """Atualiza estatísticas gerais do sistema"""
         
         stats = self.learned_patterns["statistics"]
-        stats["total_images"] = self.total_processed
+        stats["total_images"] = record["total_images"]
         
-        if session.company_detected != "unknown":
+        if record["company"] != "unknown":
             stats["successful_recognitions"] += 1
         
         # Calcular precisão atual
@@ -343,7 +583,7 @@ class LearningEngine:
             
             # Salvar evolução da precisão
             stats["accuracy_evolution"].append({
-                "timestamp": session.timestamp,
+                "timestamp": record["timestamp"],
                 "total_images": stats["total_images"],
                 "accuracy": current_accuracy
             })
@@ -357,56 +597,32 @@ class LearningEngine:
                                    if company != "unknown" and data["total_samples"] > 0)
         stats["companies_learned"] = companies_with_samples
         
-        # Atualizar timestamp
-        self.learned_patterns["last_updated"] = datetime.now().isoformat()
+        # Atualizar timestamp (o da sessão, para que o replay reproduza o mesmo estado)
+        self.learned_patterns["last_updated"] = record["timestamp"]
     
     def _save_all_knowledge(self):
-        """Salva todo o conhecimento adquirido"""
-        
-        # Salvar padrões aprendidos
-        with open(self.patterns_file, 'w', encoding='utf-8') as f:
-            json.dump(self.learned_patterns, f, indent=2, ensure_ascii=False)
-        
-        # Salvar assinaturas visuais
-        with open(self.signatures_file, 'wb') as f:
-            pickle.dump(self.company_signatures, f)
-        
-        # Salvar cache de reconhecimento
-        with open(self.cache_file, 'w', encoding='utf-8') as f:
-            json.dump(self.pattern_cache, f, indent=2, ensure_ascii=False)
+        """Salva imediatamente todo o conhecimento adquirido (snapshot compactado + demais arquivos)"""
+        self.knowledge_writer.mark_dirty()
+        self._compact_session_log()
+    
+    def flush(self):
+        """Grava o conhecimento pendente do lote atual (as sessões já estão no log)"""
+        self.knowledge_writer.flush()
     
     def _log_learning_session(self, session: LearningSession):
-        """Log detalhado da sessão de aprendizado"""
-        
-        log_dir = Path("data/logs")
-        log_dir.mkdir(exist_ok=True)
-        
-        log_file = log_dir / "learning_progress.csv"
-        
-        # Criar arquivo se não existir
-        if not log_file.exists():
-            with open(log_file, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.writer(f)
-                writer.writerow([
-                    "timestamp", "image_path", "company_detected", "confidence", 
-                    "data_fields_found", "gps_validation", "route_match", 
-                    "learning_outcome", "total_processed"
-                ])
-        
-        # Adicionar nova linha
-        with open(log_file, 'a', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            writer.writerow([
-                session.timestamp,
-                session.image_path,
-                session.company_detected,
-                session.confidence,
-                len(session.extracted_data),
-                session.gps_validation,
-                session.route_match,
-                session.learning_outcome,
-                self.total_processed
-            ])
+        """Log detalhado da sessão de aprendizado (sink bufferizado compartilhado pelo processo)"""
+        
+        get_csv_log(LEARNING_LOG_FILE, LEARNING_LOG_HEADER).write_row([
+            session.timestamp,
+            session.image_path,
+            session.company_detected,
+            session.confidence,
+            len(session.extracted_data),
+            session.gps_validation,
+            session.route_match,
+            session.learning_outcome,
+            self.total_processed
+        ])
     
     def get_learning_stats(self) -> Dict:
         """Retorna estatísticas de aprendizado"""
@@ -430,17 +646,88 @@ class LearningEngine:
             }
         }
     
+    def _shortcut_index(self) -> AhoCorasick:
+        """
+        Autômato sobre as frases de quick_recognition.
+        
+        Frases novas (sempre no fim do dicionário) são acrescentadas à trie sem
+        reconstruí-la; se o dicionário for trocado ou perder entradas, o
+        autômato é refeito do zero.
+        """
+        shortcuts = self.pattern_cache["quick_recognition"]
+        started = time.perf_counter()
+        
+        if self._shortcut_matcher is None or shortcuts is not self._shortcut_source or len(shortcuts) < len(self._shortcut_order):
+            self._shortcut_matcher = AhoCorasick()
+            self._shortcut_source = shortcuts
+            self._shortcut_order = {}
+            self._shortcut_full_rebuilds += 1
+        
+        if len(shortcuts) > len(self._shortcut_order):
+            for phrase in islice(shortcuts, len(self._shortcut_order), None):
+                self._shortcut_order[phrase] = len(self._shortcut_order)
+                self._shortcut_matcher.add(phrase)
+            self._shortcut_matcher.build()
+            self._shortcut_sync_seconds = time.perf_counter() - started
+        
+        return self._shortcut_matcher
+    
+    def _invalidate_shortcut_index(self):
+        """Força a reconstrução do autômato na próxima consulta (após remover ou trocar frases)"""
+        self._shortcut_matcher = None
+    
     def quick_recognition(self, text: str) -> Optional[str]:
-        """Reconhecimento rápido baseado em cache"""
+        """Reconhecimento rápido baseado em cache (uma única varredura do texto)"""
+        
+        found = self._shortcut_index().find_all(text.lower())
+        if not found:
+            return None
         
-        text_lower = text.lower()
+        # Mesma prioridade da busca sequencial: a frase cadastrada primeiro vence
+        shortcuts = self.pattern_cache["quick_recognition"]
+        phrase = min(found, key=self._shortcut_order.__getitem__)
         
-        # Verificar shortcuts diretos
-        for phrase, company in self.pattern_cache["quick_recognition"].items():
-            if phrase in text_lower:
-                return company
+        self.record_shortcut_hit(phrase)
+        return shortcuts[phrase]
+    
+    def record_shortcut_hit(self, phrase: str, timestamp: Optional[str] = None):
+        """Contabiliza um acerto do shortcut (também recebido de workers pelo serviço de conhecimento)"""
+        phrase_stats = self.pattern_cache["text_shortcuts"].get(phrase)
+        if phrase_stats is None:
+            return  # Shortcut despejado desde a consulta
+        
+        phrase_stats["hits"] += 1
+        phrase_stats["last_hit"] = timestamp or datetime.now().isoformat()
+        self.knowledge_writer.mark_dirty("cache")
+    
+    @property
+    def visual_index(self):
+        """Índice de assinaturas visuais (BK-tree sobre signature_store), criado no primeiro uso"""
+        if self._visual_index is None:
+            from .visual_hash import VisualSignatureIndex
+            self._visual_index = VisualSignatureIndex(self.signature_store)
+        return self._visual_index
+    
+    def visual_recognition(self, visual_hash: Optional[int]):
+        """Transportadora pela assinatura visual da foto (VisualMatch), antes do OCR; None se incerto"""
+        if visual_hash is None:
+            return None
+        return self.visual_index.classify(visual_hash)
+    
+    def get_shortcut_index_stats(self) -> Dict:
+        """Estatísticas do autômato de quick_recognition"""
+        matcher = self._shortcut_index()
         
-        return None
+        return {
+            "phrases": len(matcher),
+            "capacity": SHORTCUT_CAPACITY,
+            "candidates": len(self.pattern_cache["pattern_frequency"]),
+            "nodes": matcher.node_count,
+            "builds": matcher.builds,
+            "full_rebuilds": self._shortcut_full_rebuilds,
+            "last_build_ms": matcher.last_build_seconds * 1000,
+            "last_sync_ms": self._shortcut_sync_seconds * 1000
+        }
     
     def suggest_investigation_patterns(self) -> List[Dict]:
         """Sugere padrões desconhecidos que merecem investigação"""
@@ -454,5 +741,34 @@ class LearningEngine:
         ]
 
 
-# Instância global
-learning_engine = LearningEngine() 
\ No newline at end of file
+def create_learning_engine(models_dir: str = "models"):
+    """
+    Motor de aprendizado do processo.
+    
+    Com LEARNING_SERVICE_SOCKET definido, retorna um cliente do serviço de
+    conhecimento (lib/knowledge_service.py), que é o único processo a gravar
+    em `models_dir`; sem ele, um LearningEngine local.
+    """
+    socket_path = os.getenv('LEARNING_SERVICE_SOCKET')
+    if socket_path:
+        from .knowledge_service import RemoteLearningEngine
+        return RemoteLearningEngine(socket_path, models_dir)
+    return LearningEngine(models_dir)
+
+
+_learning_engine = None
+
+
+def get_learning_engine():
+    """Instância global (criada no primeiro uso, não na importação de lib)"""
+    global _learning_engine
+    if _learning_engine is None:
+        _learning_engine = create_learning_engine()
+    return _learning_engine
+
+
+def __getattr__(name):
+    # Compatibilidade com `from lib.learning_engine import learning_engine`
+    if name == "learning_engine":
+        return get_learning_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,150 @@
+"""
+💾 Persistência do Conhecimento
+Gravação atômica (arquivo temporário + rename) e agrupamento de gravações
+para os arquivos de modelo do LearningEngine
+"""
+
+import os
+import time
+import atexit
+import hashlib
+import tempfile
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+# Padrões de agrupamento (sobrescritos por KNOWLEDGE_FLUSH_EVERY / KNOWLEDGE_FLUSH_SECONDS)
+DEFAULT_FLUSH_EVERY = 20
+DEFAULT_FLUSH_SECONDS = 30.0
+
+
+def atomic_write_bytes(path, data: bytes):
+    """
+    Grava `data` em `path` de forma atômica: leitores veem o arquivo antigo
+    inteiro ou o novo inteiro, nunca um arquivo pela metade.
+    """
+    path = Path(path)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def _digest(data: bytes) -> str:
+    return hashlib.sha1(data).hexdigest()
+
+
+class KnowledgeWriter:
+    """
+    Agrupa gravações de arquivos de conhecimento.
+
+    Cada arquivo é registrado com uma função que o serializa em bytes.
+    `mark_dirty` apenas marca o arquivo; a gravação acontece em `flush`,
+    chamado por `session_done` a cada `flush_every` sessões ou
+    `flush_seconds` segundos, e no encerramento do processo. Arquivos cujo
+    conteúdo serializado não mudou desde a última gravação são pulados.
+    """
+
+    def __init__(self, flush_every: Optional[int] = None, flush_seconds: Optional[float] = None):
+        if flush_every is None:
+            flush_every = int(os.getenv('KNOWLEDGE_FLUSH_EVERY', DEFAULT_FLUSH_EVERY))
+        if flush_seconds is None:
+            flush_seconds = float(os.getenv('KNOWLEDGE_FLUSH_SECONDS', DEFAULT_FLUSH_SECONDS))
+
+        self.flush_every = max(1, flush_every)
+        self.flush_seconds = flush_seconds
+
+        self._serializers: Dict[str, Callable[[], bytes]] = {}
+        self._paths: Dict[str, Path] = {}
+        self._digests: Dict[str, Optional[str]] = {}
+        self._dirty = set()
+        self._pending_sessions = 0
+        self._last_flush = time.monotonic()
+        self._lock = threading.RLock()
+
+        # Estatísticas
+        self.flushes = 0
+        self.files_written = 0
+        self.files_skipped = 0
+
+        atexit.register(self.flush)
+
+    def register(self, name: str, path, serializer: Callable[[], bytes]):
+        """Registra um arquivo; o conteúdo atual em disco serve de base para pular gravações iguais"""
+        path = Path(path)
+        digest = None
+        if path.exists():
+            try:
+                digest = _digest(path.read_bytes())
+            except OSError:
+                pass
+
+        with self._lock:
+            self._serializers[name] = serializer
+            self._paths[name] = path
+            self._digests[name] = digest
+
+    def mark_dirty(self, *names: str):
+        with self._lock:
+            self._dirty.update(names or self._serializers)
+
+    def session_done(self) -> bool:
+        """Contabiliza uma sessão e grava se o lote atingiu o limite de sessões ou de tempo"""
+        with self._lock:
+            self._pending_sessions += 1
+            due = (self._pending_sessions >= self.flush_every or
+                   time.monotonic() - self._last_flush >= self.flush_seconds)
+        if due:
+            self.flush()
+        return due
+
+    def flush(self) -> bool:
+        """Grava os arquivos marcados (atomicamente, só os que mudaram); False se alguma gravação falhou"""
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            self._pending_sessions = 0
+            self._last_flush = time.monotonic()
+
+            for name in sorted(dirty):
+                try:
+                    data = self._serializers[name]()
+                    digest = _digest(data)
+                    if digest == self._digests[name]:
+                        self.files_skipped += 1
+                        continue
+
+                    atomic_write_bytes(self._paths[name], data)
+                    self._digests[name] = digest
+                    self.files_written += 1
+                except Exception as e:
+                    # Mantém marcado para a próxima tentativa
+                    self._dirty.add(name)
+                    print(f"❌ Erro ao salvar {self._paths[name]}: {e}")
+
+            if dirty:
+                self.flushes += 1
+            return not self._dirty
+
+    @property
+    def pending_sessions(self) -> int:
+        return self._pending_sessions
+
+    def stats(self) -> Dict:
+        return {
+            "flush_every": self.flush_every,
+            "flush_seconds": self.flush_seconds,
+            "pending_sessions": self._pending_sessions,
+            "dirty_files": sorted(self._dirty),
+            "flushes": self.flushes,
+            "files_written": self.files_written,
+            "files_skipped": self.files_skipped
+        }
@@ -0,0 +1,546 @@
+"""
+🗃️ Armazenamento Colunar de Rotas
+Base de rotas em colunas NumPy (coordenadas e janelas já convertidas, textos
+internados em um vocabulário único) com snapshot binário para carga rápida
+"""
+
+import io
+import os
+import csv
+import hashlib
+from array import array
+from datetime import time
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Incrementar quando o formato do snapshot mudar
+ROUTE_SNAPSHOT_VERSION = 2
+
+DEFAULT_SNAPSHOT_DIR = "data/cache"
+
+_MISSING = -1  # Código de campo ausente na linha do CSV (DictReader devolveria None)
+
+# Bloco de leitura ao conferir o trecho já lido do CSV (sha256)
+SOURCE_HASH_CHUNK = 1 << 20
+
+# Final do trecho já lido conferido a cada acréscimo (sha256), com o estado do sha256 mantido em memória
+SOURCE_TAIL_BYTES = 1 << 20
+
+
+def _parse_float(value: Optional[str]) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _parse_seconds(value: Optional[str]) -> int:
+    """Horário HH:MM[:SS] em segundos do dia, ou -1 se inválido"""
+    try:
+        parsed = time.fromisoformat(value)
+    except (TypeError, ValueError):
+        return -1
+    return parsed.hour * 3600 + parsed.minute * 60 + parsed.second
+
+
+def _source_hash(f, length: int):
+    """sha256 dos primeiros `length` bytes do arquivo aberto e o último desses bytes"""
+    digest = hashlib.sha256()
+    last = b""
+    f.seek(0)
+    while length > 0:
+        chunk = f.read(min(length, SOURCE_HASH_CHUNK))
+        if not chunk:
+            break
+        digest.update(chunk)
+        last = chunk[-1:]
+        length -= len(chunk)
+    return digest, last
+
+
+def _tail_digest(f, offset: int) -> bytes:
+    """sha256 dos últimos SOURCE_TAIL_BYTES bytes antes de `offset`"""
+    start = max(0, offset - SOURCE_TAIL_BYTES)
+    f.seek(start)
+    return hashlib.sha256(f.read(offset - start)).digest()
+
+
+def _file_identity(f) -> Tuple[int, int]:
+    stat = os.fstat(f.fileno())
+    return (stat.st_dev, stat.st_ino)
+
+
+class SourceState(NamedTuple):
+    """
+    Trecho do CSV de origem já incorporado: tamanho, estado do sha256 nesse
+    ponto (continuado a cada acréscimo, sem reler o trecho), identidade do
+    arquivo e sha256 do final do trecho
+    """
+    offset: int
+    hasher: "hashlib._Hash"
+    identity: Tuple[int, int]
+    tail: bytes
+
+
+def _seconds_to_time(seconds: int) -> Optional[time]:
+    if seconds < 0:
+        return None
+    return time(seconds // 3600, (seconds // 60) % 60, seconds % 60)
+
+
+class RouteRecord(Mapping):
+    """
+    Visão leve de uma linha do RouteStore.
+
+    Acessível como o dicionário do csv.DictReader (`route["cep"]`,
+    `route.get("route_id")`), mais os campos já convertidos `lat`, `lon`,
+    `window_start` e `window_end`.
+    """
+
+    __slots__ = ("_store", "row")
+
+    def __init__(self, store: "RouteStore", row: int):
+        self._store = store
+        self.row = row
+
+    def __getitem__(self, field: str) -> Optional[str]:
+        return self._store.value(field, self.row)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._store.fieldnames)
+
+    def __len__(self) -> int:
+        return len(self._store.fieldnames)
+
+    def __repr__(self) -> str:
+        return f"RouteRecord({dict(self)!r})"
+
+    @property
+    def lat(self) -> float:
+        return float(self._store.lat[self.row])
+
+    @property
+    def lon(self) -> float:
+        return float(self._store.lon[self.row])
+
+    @property
+    def window_start(self) -> Optional[time]:
+        return _seconds_to_time(int(self._store.window_start[self.row]))
+
+    @property
+    def window_end(self) -> Optional[time]:
+        return _seconds_to_time(int(self._store.window_end[self.row]))
+
+
+class RouteStore(Sequence):
+    """
+    Rotas em formato colunar.
+
+    Cada campo de texto é uma coluna int32 de códigos para um vocabulário
+    compartilhado (motoristas, cidades, datas e status repetidos ocupam uma
+    única string). Coordenadas ficam em float64 (NaN se inválidas) e janelas
+    de entrega em segundos do dia (-1 se inválidas).
+
+    Acréscimos escrevem em buffers com folga (capacidade dobra sob demanda) e
+    só então publicam as colunas estendidas, `codes` por último: um leitor
+    nunca vê uma posição ainda não escrita. Alterações são feitas no lugar.
+    """
+
+    def __init__(self, fieldnames: List[str], codes: np.ndarray, vocab: List[str],
+                 lat: np.ndarray, lon: np.ndarray,
+                 window_start: np.ndarray, window_end: np.ndarray):
+        self.fieldnames = list(fieldnames)
+        self.codes = codes  # (campos, linhas)
+        self.vocab = vocab
+        self.lat = lat
+        self.lon = lon
+        self.window_start = window_start
+        self.window_end = window_end
+        self._field_rows = {field: position for position, field in enumerate(self.fieldnames)}
+        self._vocab_index: Optional[Dict[str, int]] = None  # construído só na primeira alteração
+        self._buffers: Optional[Tuple[np.ndarray, ...]] = None  # colunas com folga para acréscimos
+
+        # Trecho do CSV de origem já incorporado (tamanho em bytes e sha256)
+        self.source_offset = 0
+        self.source_digest = b""
+        self._source: Optional[SourceState] = None  # só em memória; sem ele, o trecho é relido uma vez
+
+    def __len__(self) -> int:
+        return self.codes.shape[1]
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [RouteRecord(self, position) for position in range(*row.indices(len(self)))]
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError("route index out of range")
+        return RouteRecord(self, row)
+
+    def value(self, field: str, row: int) -> Optional[str]:
+        """Valor original (texto do CSV) de um campo"""
+        code = self.codes[self._field_rows[field], row]
+        return None if code == _MISSING else self.vocab[code]
+
+    def column(self, field: str, start: int = 0, stop: Optional[int] = None) -> List[Optional[str]]:
+        """Coluna de um campo (inteira ou o trecho [start:stop]) como lista de textos"""
+        if field not in self._field_rows:
+            return [None] * len(range(len(self))[start:stop])
+        vocab = self.vocab
+        codes = self.codes[self._field_rows[field], start:stop]
+        return [None if code == _MISSING else vocab[code] for code in codes.tolist()]
+
+    @property
+    def nbytes(self) -> int:
+        """Memória aproximada das colunas e do vocabulário"""
+        arrays = (self.codes, self.lat, self.lon, self.window_start, self.window_end)
+        return sum(column.nbytes for column in arrays) + sum(len(text) for text in self.vocab)
+
+    @classmethod
+    def empty(cls) -> "RouteStore":
+        return cls([], np.empty((0, 0), dtype=np.int32), [],
+                   np.empty(0), np.empty(0), np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int32))
+
+    @classmethod
+    def from_csv(cls, csv_path) -> "RouteStore":
+        """Lê o CSV de rotas (mesmo formato do csv.DictReader) em colunas"""
+        with open(csv_path, 'rb') as f:
+            raw = f.read()
+            identity = _file_identity(f)
+
+        reader = csv.reader(io.StringIO(raw.decode('utf-8'), newline=''))
+        fieldnames = next(reader, [])
+        store = cls(fieldnames, np.empty((len(fieldnames), 0), dtype=np.int32), [],
+                    np.empty(0), np.empty(0), np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int32))
+        store.codes = store._encode_lines(reader)
+
+        # Conversões feitas uma vez por valor distinto do vocabulário
+        store.lat = store._convert("gps_lat", _parse_float, np.float64, np.nan)
+        store.lon = store._convert("gps_lon", _parse_float, np.float64, np.nan)
+        store.window_start = store._convert("delivery_window_start", _parse_seconds, np.int32, -1)
+        store.window_end = store._convert("delivery_window_end", _parse_seconds, np.int32, -1)
+
+        hasher = hashlib.sha256(raw)
+        store.source_offset = len(raw)
+        store.source_digest = hasher.digest()
+        store._source = SourceState(len(raw), hasher, identity,
+                                    hashlib.sha256(raw[-SOURCE_TAIL_BYTES:]).digest())
+        return store
+
+    def _intern(self, text: Optional[str]) -> int:
+        """Código do texto no vocabulário (acrescentando-o se novo)"""
+        if text is None:
+            return _MISSING
+        if self._vocab_index is None:
+            self._vocab_index = {value: code for code, value in enumerate(self.vocab)}
+        code = self._vocab_index.get(text)
+        if code is None:
+            code = self._vocab_index[text] = len(self.vocab)
+            self.vocab.append(text)
+        return code
+
+    def _encode_lines(self, lines: Iterable[List[str]]) -> np.ndarray:
+        """Codifica linhas posicionais do CSV em uma matriz (campos, linhas)"""
+        columns = [array('i') for _ in self.fieldnames]
+        intern = self._intern
+
+        for line in lines:
+            if not line:
+                continue  # DictReader também ignora linhas vazias
+            for position, column in enumerate(columns):
+                column.append(intern(line[position]) if position < len(line) else _MISSING)
+
+        rows = len(columns[0]) if columns else 0
+        codes = np.empty((len(self.fieldnames), rows), dtype=np.int32)
+        for position, column in enumerate(columns):
+            codes[position] = np.frombuffer(column, dtype=np.int32)
+        return codes
+
+    def _convert(self, field: str, parse, dtype, missing) -> np.ndarray:
+        if field not in self._field_rows:
+            return np.full(len(self), missing, dtype=dtype)
+
+        column_codes = self.codes[self._field_rows[field]]
+        distinct = np.unique(column_codes[column_codes != _MISSING])
+        lookup = np.full(len(self.vocab) + 1, missing, dtype=dtype)  # última posição: ausente
+        lookup[distinct] = [parse(self.vocab[code]) for code in distinct.tolist()]
+        return lookup[column_codes]
+
+    def _parsed_row(self, codes: np.ndarray) -> Tuple[float, float, int, int]:
+        def text(field):
+            position = self._field_rows.get(field)
+            if position is None or codes[position] == _MISSING:
+                return None
+            return self.vocab[codes[position]]
+
+        return (_parse_float(text("gps_lat")), _parse_float(text("gps_lon")),
+                _parse_seconds(text("delivery_window_start")), _parse_seconds(text("delivery_window_end")))
+
+    def _buffers_for(self, rows: int) -> Tuple[np.ndarray, ...]:
+        """Buffers (codes, lat, lon, janelas) com espaço para `rows` linhas; só são copiados ao dobrar"""
+        buffers = self._buffers
+        if buffers is not None and buffers[1].shape[0] >= rows:
+            return buffers
+
+        length, capacity = len(self), max(rows, 2 * len(self), 16)
+        columns = (self.codes, self.lat, self.lon, self.window_start, self.window_end)
+        buffers = []
+        for column in columns:
+            buffer = np.empty(column.shape[:-1] + (capacity,), dtype=column.dtype)
+            buffer[..., :length] = column
+            buffers.append(buffer)
+        self._buffers = tuple(buffers)
+        return self._buffers
+
+    def append_lines(self, lines: Iterable[List[str]]) -> range:
+        """
+        Acrescenta linhas posicionais (na ordem de `fieldnames`) e retorna as
+        posições novas, em tempo proporcional às linhas acrescentadas.
+
+        As linhas são escritas além do fim atual e as colunas estendidas são
+        publicadas depois, `codes` por último (define len()).
+        """
+        start = len(self)
+        new_codes = self._encode_lines(lines)
+        count = new_codes.shape[1]
+        if count == 0:
+            return range(start, start)
+        stop = start + count
+
+        parsed = [self._parsed_row(new_codes[:, column]) for column in range(count)]
+        codes, lat, lon, window_start, window_end = self._buffers_for(stop)
+        codes[:, start:stop] = new_codes
+        for buffer, values in zip((lat, lon, window_start, window_end), zip(*parsed)):
+            buffer[start:stop] = values
+
+        self.lat, self.lon = lat[:stop], lon[:stop]
+        self.window_start, self.window_end = window_start[:stop], window_end[:stop]
+        self.codes = codes[:, :stop]
+
+        return range(start, stop)
+
+    def append_rows(self, rows: Iterable[Mapping]) -> range:
+        """Acrescenta rotas no formato do csv.DictReader (campos fora de `fieldnames` são ignorados)"""
+        rows = list(rows)
+        if not self.fieldnames and rows:
+            self.fieldnames = list(rows[0].keys())
+            self._field_rows = {field: position for position, field in enumerate(self.fieldnames)}
+            self.codes = np.empty((len(self.fieldnames), 0), dtype=np.int32)
+            self._buffers = None
+
+        return self.append_lines([[row.get(field) for field in self.fieldnames] for row in rows])
+
+    def update_rows(self, rows: Sequence[int], changes: Mapping):
+        """
+        Altera campos de rotas existentes (KeyError para campo desconhecido).
+
+        As colunas são alteradas no lugar, em tempo proporcional às linhas
+        alteradas: um leitor concorrente pode ver uma rota com parte dos
+        campos já alterados.
+        """
+        for field in changes:
+            if field not in self._field_rows:
+                raise KeyError(field)
+        rows = list(rows)
+        if not rows:
+            return
+
+        for field, text in changes.items():
+            self.codes[self._field_rows[field], rows] = self._intern(text)
+
+        for row in rows:
+            (self.lat[row], self.lon[row],
+             self.window_start[row], self.window_end[row]) = self._parsed_row(self.codes[:, row])
+
+    def update_row(self, row: int, changes: Mapping):
+        """Altera campos de uma rota existente (ver update_rows)"""
+        self.update_rows([row], changes)
+
+    def rows_where(self, field: str, text: str) -> List[int]:
+        """Posições das rotas cujo campo tem exatamente o texto informado"""
+        if field not in self._field_rows:
+            return []
+        if self._vocab_index is None:
+            self._vocab_index = {value: code for code, value in enumerate(self.vocab)}
+        code = self._vocab_index.get(text)
+        if code is None:
+            return []
+        return np.flatnonzero(self.codes[self._field_rows[field]] == code).tolist()
+
+    def _verified_source(self, f, offset: int) -> Optional[SourceState]:
+        """
+        Estado do sha256 no fim do trecho já lido, se o arquivo ainda começa por ele.
+
+        Com o estado em memória, do mesmo arquivo (dispositivo e inode), basta
+        conferir o final do trecho; sem ele (base vinda do snapshot) ou se o
+        arquivo foi substituído, o trecho inteiro é relido e conferido uma vez.
+        """
+        identity = _file_identity(f)
+        source = self._source
+        if source is not None and source.offset == offset and source.identity == identity:
+            if _tail_digest(f, offset) != source.tail:
+                return None
+            hasher = source.hasher.copy()
+        else:
+            hasher, _ = _source_hash(f, offset)
+            if hasher.digest() != self.source_digest:
+                return None
+
+        f.seek(max(0, offset - 1))
+        if f.read(1) != b"\n":
+            return None
+        return SourceState(offset, hasher, identity, _tail_digest(f, offset))
+
+    def read_appended_lines(self, csv_path) -> Optional[Tuple[List[List[str]], SourceState]]:
+        """
+        Linhas acrescentadas ao CSV desde a última leitura.
+
+        Só o crescimento do arquivo, com o trecho já lido intacto, conta como
+        adição; o sha256 é continuado só com os bytes novos. O trecho é
+        conferido pela identidade do arquivo e pelo final (SOURCE_TAIL_BYTES):
+        uma edição no lugar que mantenha o inode, o final do trecho e ainda
+        aumente o arquivo passaria como acréscimo.
+
+        Returns:
+            tuple: (linhas, novo estado do trecho lido), ou None se o arquivo não
+                   for apenas uma extensão do trecho já lido (não cresceu, foi
+                   editado antes do fim ou não tinha quebra de linha no ponto de corte)
+        """
+        offset = self.source_offset
+        with open(csv_path, 'rb') as f:
+            size = f.seek(0, os.SEEK_END)
+            if size <= offset:
+                return None
+
+            source = self._verified_source(f, offset)
+            if source is None:
+                return None
+
+            f.seek(offset)
+            appended = f.read(size - offset)
+
+            # Linha final ainda sendo escrita fica para a próxima leitura
+            complete = appended[:appended.rfind(b"\n") + 1]
+            if not complete:
+                return [], source
+
+            source.hasher.update(complete)
+            source = source._replace(offset=offset + len(complete),
+                                     tail=_tail_digest(f, offset + len(complete)))
+
+        lines = list(csv.reader(io.StringIO(complete.decode('utf-8'), newline='')))
+        return lines, source
+
+    def extend_from_csv(self, csv_path) -> Optional[range]:
+        """Incorpora as linhas acrescentadas ao CSV; None se for preciso recarregar tudo"""
+        appended = self.read_appended_lines(csv_path)
+        if appended is None:
+            return None
+
+        lines, self._source = appended
+        self.source_offset, self.source_digest = self._source.offset, self._source.hasher.digest()
+        return self.append_lines(lines)
+
+    def save_snapshot(self, snapshot_path, source_stat: Optional[os.stat_result] = None):
+        """
+        Grava o snapshot binário (.npz); com `source_stat`, registra tamanho/mtime
+        do CSV de origem e o trecho já lido dele (tamanho e sha256)
+        """
+        if any("\x00" in text for text in self.vocab):
+            raise ValueError("vocabulário contém NUL, snapshot não suportado")
+
+        snapshot_path = Path(snapshot_path)
+        snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+
+        source = (-1, -1)
+        if source_stat is not None:
+            source = (source_stat.st_size, source_stat.st_mtime_ns)
+
+        tmp_path = snapshot_path.with_name(f".{snapshot_path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, 'wb') as f:
+            np.savez(
+                f,
+                meta=np.array([ROUTE_SNAPSHOT_VERSION, *source, self.source_offset], dtype=np.int64),
+                source_digest=np.frombuffer(self.source_digest, dtype=np.uint8),
+                fieldnames=np.frombuffer("\x00".join(self.fieldnames).encode('utf-8'), dtype=np.uint8),
+                vocab=np.frombuffer("\x00".join(self.vocab).encode('utf-8'), dtype=np.uint8),
+                codes=self.codes,
+                lat=self.lat,
+                lon=self.lon,
+                window_start=self.window_start,
+                window_end=self.window_end
+            )
+        os.replace(tmp_path, snapshot_path)
+
+    @classmethod
+    def load_snapshot(cls, snapshot_path, source_path=None) -> Optional["RouteStore"]:
+        """Carrega um snapshot; None se ausente, de outra versão ou desatualizado em relação ao CSV"""
+        try:
+            with np.load(snapshot_path) as data:
+                meta = data["meta"].tolist()
+                if meta[0] != ROUTE_SNAPSHOT_VERSION:
+                    return None
+                if source_path is not None:
+                    stat = os.stat(source_path)
+                    if meta[1:3] != [stat.st_size, stat.st_mtime_ns]:
+                        return None
+
+                fieldnames_blob = data["fieldnames"].tobytes().decode('utf-8')
+                vocab_blob = data["vocab"].tobytes().decode('utf-8')
+                fieldnames = fieldnames_blob.split("\x00") if fieldnames_blob else []
+                codes = data["codes"]
+                vocab = vocab_blob.split("\x00") if codes.size else []
+
+                store = cls(fieldnames, codes, vocab, data["lat"], data["lon"],
+                            data["window_start"], data["window_end"])
+
+                if source_path is not None and meta[1] >= 0:
+                    store.source_offset = meta[3]
+                    store.source_digest = data["source_digest"].tobytes()
+            return store
+        except (OSError, KeyError, ValueError):
+            return None
+
+
+def default_snapshot_path(csv_path) -> Path:
+    """
+    Caminho padrão do snapshot de um CSV de rotas (ROUTE_SNAPSHOT_DIR ou data/cache).
+
+    O nome leva um hash do caminho absoluto: bases com o mesmo nome de arquivo
+    em diretórios diferentes não sobrescrevem o snapshot uma da outra.
+    """
+    snapshot_dir = Path(os.getenv('ROUTE_SNAPSHOT_DIR', DEFAULT_SNAPSHOT_DIR))
+    csv_path = Path(csv_path).resolve()
+    path_hash = hashlib.sha256(str(csv_path).encode('utf-8')).hexdigest()[:12]
+    return snapshot_dir / f"routes_{csv_path.stem}_{path_hash}.npz"
+
+
+def load_route_store(csv_path, snapshot_path=None) -> RouteStore:
+    """
+    Carrega a base de rotas, usando o snapshot binário quando ainda válido.
+
+    O snapshot é regravado sempre que o CSV muda (tamanho ou mtime).
+    Com ROUTE_SNAPSHOT=0 o CSV é sempre lido e nenhum snapshot é gravado.
+    """
+    if os.getenv('ROUTE_SNAPSHOT', '1') == '0':
+        return RouteStore.from_csv(csv_path)
+
+    # Estado do CSV antes da leitura: se ele mudar durante a carga, o snapshot já nasce desatualizado
+    source_stat = os.stat(csv_path)
+
+    if snapshot_path is None:
+        snapshot_path = default_snapshot_path(csv_path)
+
+    store = RouteStore.load_snapshot(snapshot_path, source_path=csv_path)
+    if store is not None:
+        return store
+
+    store = RouteStore.from_csv(csv_path)
+    try:
+        store.save_snapshot(snapshot_path, source_stat=source_stat)
+    except (OSError, ValueError) as e:
+        print(f"[Rotas] ⚠️ Snapshot não gravado: {e}")
+    return store
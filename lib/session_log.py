@@ -0,0 +1,93 @@
+"""
+📜 Log de Sessões de Aprendizado
+Registro append-only (JSONL) das sessões aplicadas ao conhecimento, com
+compactação depois de cada snapshot
+"""
+
+import os
+import json
+import threading
+from pathlib import Path
+from typing import Dict, Iterator
+
+from .persistence import atomic_write_bytes
+
+
+class SessionLog:
+    """
+    Log JSONL append-only.
+
+    Cada registro recebe um número de sequência (`seq`) crescente. O snapshot
+    guarda o último `seq` já incorporado; na carga, só os registros posteriores
+    são reaplicados, e `truncate_through` descarta os já cobertos pelo snapshot.
+    """
+
+    def __init__(self, path, last_seq: int = 0):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.last_seq = last_seq
+        self._lock = threading.Lock()
+        self._file = None
+
+        # Continuar a numeração depois do último registro já gravado
+        for record in self._read():
+            self.last_seq = max(self.last_seq, record["seq"])
+
+    def _read(self) -> Iterator[Dict]:
+        if not self.path.exists():
+            return
+
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # Linha final incompleta (processo interrompido durante a escrita)
+                if isinstance(record, dict) and "seq" in record:
+                    yield record
+
+    def replay(self, after_seq: int) -> Iterator[Dict]:
+        """Registros com seq > after_seq, em ordem de gravação"""
+        for record in self._read():
+            if record["seq"] > after_seq:
+                yield record
+
+    def append(self, record: Dict) -> int:
+        """Atribui o próximo seq e grava o registro em uma única linha; retorna o seq"""
+        with self._lock:
+            self.last_seq += 1
+            record["seq"] = self.last_seq
+            line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+
+            if self._file is None:
+                self._file = open(self.path, 'a', encoding='utf-8')
+            self._file.write(line)
+            self._file.flush()
+
+            return self.last_seq
+
+    def truncate_through(self, seq: int):
+        """Remove os registros com seq <= seq (já incorporados a um snapshot)"""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+            remaining = [
+                json.dumps(record, ensure_ascii=False, default=str) + "\n"
+                for record in self._read() if record["seq"] > seq
+            ]
+            atomic_write_bytes(self.path, "".join(remaining).encode('utf-8'))
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    @property
+    def size_bytes(self) -> int:
+        try:
+            return os.path.getsize(self.path)
+        except OSError:
+            return 0
@@ -0,0 +1,222 @@
+"""
+🗂️ Assinaturas Visuais das Empresas
+Tabelas binárias de registros de tamanho fixo (um arquivo por tipo de
+assinatura), acrescentadas em append e lidas via np.memmap somente leitura:
+vários workers compartilham a mesma cópia no page cache em vez de cada um
+desserializar a sua
+"""
+
+import os
+import json
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from .persistence import atomic_write_bytes
+
+SIGNATURES_VERSION = 1
+COLOR_BINS = 24      # Histograma RGB, 8 faixas por canal
+LAYOUT_GRID = 4      # Densidade de texto em uma grade 4x4
+
+# Layout fixo de cada tabela (little-endian, sem padding)
+TABLE_DTYPES = {
+    "visual_hashes": np.dtype([("company", "<u2"), ("hash", "<u8")]),
+    "color_signatures": np.dtype([("company", "<u2"), ("histogram", "<f4", (COLOR_BINS,))]),
+    "layout_patterns": np.dtype([("company", "<u2"), ("density", "<f4", (LAYOUT_GRID * LAYOUT_GRID,))]),
+}
+
+# Campo com o valor da assinatura em cada tabela
+VALUE_FIELDS = {
+    "visual_hashes": "hash",
+    "color_signatures": "histogram",
+    "layout_patterns": "density",
+}
+
+
+class SignatureTable:
+    """
+    Arquivo plano de registros `dtype`, sem cabeçalho.
+
+    O número de registros é o tamanho do arquivo dividido pelo tamanho do
+    registro; bytes de um registro incompleto no fim (gravação interrompida)
+    são ignorados pelos leitores e descartados na próxima gravação.
+    """
+
+    def __init__(self, path, dtype: np.dtype, readonly: bool = False):
+        self.path = Path(path)
+        self.dtype = dtype
+        self.readonly = readonly
+
+        self._rows = np.empty(0, dtype=dtype)
+        self._mapped_size = 0
+        self._fd: Optional[int] = None
+
+    def _valid_size(self) -> int:
+        try:
+            size = os.stat(self.path).st_size
+        except FileNotFoundError:
+            return 0
+        return size - size % self.dtype.itemsize
+
+    @property
+    def rows(self) -> np.ndarray:
+        """Registros atuais (memmap somente leitura, remapeado quando o arquivo cresce)"""
+        size = self._valid_size()
+        if size != self._mapped_size:
+            if size == 0:
+                self._rows = np.empty(0, dtype=self.dtype)
+            else:
+                self._rows = np.memmap(self.path, dtype=self.dtype, mode='r',
+                                       shape=(size // self.dtype.itemsize,))
+            self._mapped_size = size
+        return self._rows
+
+    def __len__(self) -> int:
+        return self._valid_size() // self.dtype.itemsize
+
+    def append(self, records: np.ndarray):
+        """Acrescenta registros ao fim do arquivo (uma única gravação O_APPEND)"""
+        if self.readonly:
+            raise PermissionError(f"Tabela de assinaturas aberta somente leitura: {self.path}")
+
+        records = np.ascontiguousarray(records, dtype=self.dtype)
+        if not len(records):
+            return
+
+        if self._fd is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+
+        # Descartar registro incompleto de uma gravação interrompida
+        size = os.fstat(self._fd).st_size
+        if size % self.dtype.itemsize:
+            os.ftruncate(self._fd, size - size % self.dtype.itemsize)
+
+        data = records.tobytes()
+        written = 0
+        while written < len(data):
+            written += os.write(self._fd, data[written:])
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+class SignatureStore:
+    """
+    Assinaturas visuais por empresa.
+
+    As empresas são gravadas como ids (uint16) em um vocabulário em
+    `meta.json`, regravado atomicamente antes do primeiro registro de uma
+    empresa nova; as tabelas ficam em `<tabela>.bin` no mesmo diretório.
+    """
+
+    def __init__(self, directory, readonly: bool = False):
+        self.directory = Path(directory)
+        self.meta_path = self.directory / "meta.json"
+        self.readonly = readonly
+
+        self.companies: List[str] = []
+        self._company_ids: Dict[str, int] = {}
+        self._load_meta()
+
+        self.tables = {
+            name: SignatureTable(self.directory / f"{name}.bin", dtype, readonly)
+            for name, dtype in TABLE_DTYPES.items()
+        }
+
+    def _load_meta(self):
+        if not self.meta_path.exists():
+            return
+
+        with open(self.meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+
+        if meta.get("version") != SIGNATURES_VERSION:
+            raise ValueError(f"Versão de assinaturas não suportada em {self.meta_path}: {meta.get('version')}")
+        for name, descr in meta.get("tables", {}).items():
+            if name in TABLE_DTYPES and np.dtype([tuple(field) for field in descr]) != TABLE_DTYPES[name]:
+                raise ValueError(f"Layout da tabela {name} em {self.meta_path} difere do esperado")
+
+        self.companies = meta["companies"]
+        self._company_ids = {company: index for index, company in enumerate(self.companies)}
+
+    def _save_meta(self):
+        meta = {
+            "version": SIGNATURES_VERSION,
+            "companies": self.companies,
+            "tables": {name: dtype.descr for name, dtype in TABLE_DTYPES.items()}
+        }
+        self.directory.mkdir(parents=True, exist_ok=True)
+        atomic_write_bytes(self.meta_path, json.dumps(meta, indent=2, ensure_ascii=False).encode('utf-8'))
+
+    def company_id(self, company: str, create: bool = False) -> Optional[int]:
+        """Id da empresa no vocabulário (criado e persistido se `create`)"""
+        company_id = self._company_ids.get(company)
+        if company_id is None and self.readonly:
+            self._load_meta()  # Empresa criada pelo processo que grava as assinaturas
+            company_id = self._company_ids.get(company)
+        if company_id is None and create:
+            company_id = len(self.companies)
+            self.companies.append(company)
+            self._company_ids[company] = company_id
+            self._save_meta()
+        return company_id
+
+    def company_name(self, company_id: int) -> str:
+        if company_id >= len(self.companies):
+            self._load_meta()  # Empresa criada por outro processo depois da nossa leitura
+        return self.companies[company_id]
+
+    def add(self, table: str, company: str, values: Iterable):
+        """Acrescenta assinaturas de uma empresa à tabela"""
+        if self.readonly:
+            raise PermissionError(f"Assinaturas abertas somente leitura: {self.directory}")
+
+        values = list(values)
+        records = np.zeros(len(values), dtype=TABLE_DTYPES[table])
+        records["company"] = self.company_id(company, create=True)
+        records[VALUE_FIELDS[table]] = values
+        self.tables[table].append(records)
+
+    def add_visual_hash(self, company: str, value: int):
+        self.add("visual_hashes", company, [value])
+
+    def add_color_signature(self, company: str, histogram):
+        self.add("color_signatures", company, [histogram])
+
+    def add_layout_pattern(self, company: str, density):
+        self.add("layout_patterns", company, [density])
+
+    def rows(self, table: str, company: Optional[str] = None) -> np.ndarray:
+        """Registros da tabela (todos ou só os de `company`)"""
+        rows = self.tables[table].rows
+        if company is None:
+            return rows
+
+        company_id = self.company_id(company)
+        if company_id is None:
+            return rows[:0]
+        return rows[rows["company"] == company_id]
+
+    def values(self, table: str, company: Optional[str] = None) -> np.ndarray:
+        return self.rows(table, company)[VALUE_FIELDS[table]]
+
+    def counts(self) -> Dict[str, int]:
+        return {name: len(table) for name, table in self.tables.items()}
+
+    def import_legacy(self, signatures: Dict) -> int:
+        """Importa o dicionário do antigo company_signatures.pkl ({tabela: {empresa: [valores]}})"""
+        imported = 0
+        for table in TABLE_DTYPES:
+            for company, values in (signatures.get(table) or {}).items():
+                values = values if isinstance(values, (list, tuple)) else [values]
+                self.add(table, company, values)
+                imported += len(values)
+        return imported
+
+    def close(self):
+        for table in self.tables.values():
+            table.close()
@@ -0,0 +1,253 @@
+"""
+🗺️ Índice Espacial de Rotas
+Buckets em grade lat/lon para busca de vizinho mais próximo e por raio
+sem percorrer todas as rotas a cada validação
+"""
+
+import math
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from .geo import EARTH_RADIUS_KM, KM_PER_DEGREE, haversine_np
+
+# Pontos mínimos por lote de anéis quando a busca segue pelas células ocupadas
+RING_CHUNK_POINTS = 2048
+
+
+class RouteSpatialIndex:
+    """
+    Índice em grade (células de `cell_size_deg` graus) sobre pontos lat/lon.
+
+    A busca do mais próximo expande anéis de células ao redor da consulta e
+    para quando a menor distância possível do próximo anel supera o k-ésimo
+    melhor resultado. Se os anéis percorridos já somam mais células que as
+    ocupadas (consulta em região vazia, longe dos dados), segue pelas células
+    ocupadas ordenadas por anel, com o mesmo critério de parada. Empates são
+    resolvidos pela ordem de inserção, o mesmo resultado de uma varredura
+    linear. As distâncias de cada anel são calculadas de uma vez com NumPy.
+    Não trata o antimeridiano (±180°).
+    """
+
+    def __init__(self, cell_size_deg: float = 0.01):
+        self.cell_size = cell_size_deg
+        self._cells: Dict[Tuple[int, int], List[int]] = {}
+        self._coords = np.empty((16, 2), dtype=np.float64)  # (lat, lon), capacidade dobra sob demanda
+        self._items: List[Any] = []
+        self._removed: set = set()  # posições retiradas do índice (remove), com coordenadas NaN
+        self._max_abs_lat = 0.0
+
+    def __len__(self) -> int:
+        return len(self._items) - len(self._removed)
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return (math.floor(lat / self.cell_size), math.floor(lon / self.cell_size))
+
+    def add(self, lat: float, lon: float, item: Any) -> int:
+        """Indexa um ponto e retorna sua posição de inserção"""
+        index = len(self._items)
+        if index == len(self._coords):
+            self._coords = np.resize(self._coords, (2 * index, 2))
+        self._coords[index] = (lat, lon)
+        self._items.append(item)
+
+        key = self._cell(lat, lon)
+        self._cells.setdefault(key, []).append(index)
+        self._max_abs_lat = max(self._max_abs_lat, abs(lat))
+        return index
+
+    def _discard_from_cell(self, key: Tuple[int, int], index: int):
+        # Listas substituídas (não alteradas) para não perturbar buscas em andamento
+        remaining = [other for other in self._cells[key] if other != index]
+        if remaining:
+            self._cells[key] = remaining
+        else:
+            del self._cells[key]
+
+    def move(self, index: int, lat: float, lon: float):
+        """Atualiza as coordenadas de um ponto já indexado (mantém a posição de inserção)"""
+        if self._coords[index, 0] == lat and self._coords[index, 1] == lon:
+            return
+        old_key = self._cell(*self._coords[index])
+        new_key = self._cell(lat, lon)
+        # Linha alterada no lugar (uma única atribuição NumPy, atômica sob o GIL)
+        self._coords[index] = (lat, lon)
+        self._max_abs_lat = max(self._max_abs_lat, abs(lat))
+
+        if new_key != old_key:
+            self._discard_from_cell(old_key, index)
+            self._cells[new_key] = sorted(self._cells.get(new_key, []) + [index])
+
+    def remove(self, index: int):
+        """Retira um ponto das buscas (ex: rota que perdeu as coordenadas); a posição não é reaproveitada"""
+        if index in self._removed:
+            return
+        self._discard_from_cell(self._cell(*self._coords[index]), index)
+        self._coords[index] = (np.nan, np.nan)
+        self._removed.add(index)
+
+    def _live_indexes(self) -> np.ndarray:
+        """Posições de inserção dos pontos ainda indexados"""
+        if not self._removed:
+            return np.arange(len(self._items))
+        return np.flatnonzero(~np.isnan(self._coords[:len(self._items), 0]))
+
+    def _ring_lower_bound_km(self, ring: int, query_lat: float) -> float:
+        """Menor distância possível entre a consulta e qualquer ponto no anel `ring`"""
+        if ring <= 1:
+            return 0.0
+
+        # Diferença mínima de (ring - 1) células em latitude ou longitude;
+        # a longitude é o caso pior, ponderada pelo cosseno da maior latitude
+        delta = math.radians((ring - 1) * self.cell_size)
+        max_lat = min(90.0, max(self._max_abs_lat, abs(query_lat)))
+        chord = math.cos(math.radians(max_lat)) * math.sin(min(delta, math.pi) / 2)
+        return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, chord))
+
+    def _ring_cells(self, center: Tuple[int, int], ring: int):
+        ci, cj = center
+        if ring == 0:
+            yield center
+            return
+        for dj in range(-ring, ring + 1):
+            yield (ci - ring, cj + dj)
+            yield (ci + ring, cj + dj)
+        for di in range(-ring + 1, ring):
+            yield (ci + di, cj - ring)
+            yield (ci + di, cj + ring)
+
+    def _rings(self, center: Tuple[int, int]):
+        """
+        (anel, posições) em ordem crescente de anel ao redor de `center`.
+
+        Percorre os anéis célula a célula enquanto o total de células visitadas
+        não passa de ~4x as ocupadas; a partir daí, ordena as células ocupadas
+        restantes por anel (custo proporcional às ocupadas, não à extensão dos
+        dados), para que uma rota isolada longe das demais não torne cara a
+        consulta de quem está perto do aglomerado nem de quem está longe dele.
+        """
+        budget = 4 * len(self._cells) + 9
+        ring = 0
+        while (2 * ring + 1) ** 2 <= budget:
+            yield ring, [index for key in self._ring_cells(center, ring)
+                         for index in self._cells.get(key, ())]
+            ring += 1
+
+        keys = list(self._cells)
+        if not keys:
+            return
+        cells = np.asarray(keys, dtype=np.int64)
+        rings = np.maximum(np.abs(cells[:, 0] - center[0]), np.abs(cells[:, 1] - center[1]))
+        beyond = np.flatnonzero(rings >= ring)
+        beyond = beyond[np.argsort(rings[beyond], kind="stable")]
+
+        # Anéis agrupados em lotes de ~RING_CHUNK_POINTS pontos; o limite
+        # inferior de um lote é o do seu primeiro anel
+        chunk_ring, chunk = None, []
+        for position in beyond:
+            ring = int(rings[position])
+            if chunk_ring is not None and ring != chunk_ring and len(chunk) >= RING_CHUNK_POINTS:
+                yield chunk_ring, chunk
+                chunk_ring, chunk = None, []
+            if chunk_ring is None:
+                chunk_ring = ring
+            chunk.extend(self._cells.get(keys[position], ()))
+        if chunk:
+            yield chunk_ring, chunk
+
+    def _distances(self, lat: float, lon: float, indexes) -> np.ndarray:
+        coords = self._coords[indexes]
+        return haversine_np(lat, lon, coords[:, 0], coords[:, 1])
+
+    @staticmethod
+    def _smallest(distances: np.ndarray, indexes: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Os k menores por (distância, índice de inserção)"""
+        if len(distances) > k:
+            # Seleção parcial O(n); a ordenação fica só com os empatados até o k-ésimo
+            keep = distances <= np.partition(distances, k - 1)[k - 1]
+            distances, indexes = distances[keep], indexes[keep]
+        order = np.lexsort((indexes, distances))[:k]
+        return distances[order], indexes[order]
+
+    def _results(self, distances: np.ndarray, indexes: np.ndarray) -> List[Tuple[float, Any]]:
+        return [(float(distance), self._items[index]) for distance, index in zip(distances, indexes)]
+
+    def nearest(self, lat: float, lon: float, k: int = 1) -> List[Tuple[float, Any]]:
+        """
+        Os k pontos mais próximos.
+
+        Returns:
+            list: (distância em km, item) em ordem crescente de distância
+        """
+        if not len(self) or k <= 0:
+            return []
+
+        best_distances = np.empty(0, dtype=np.float64)
+        best_indexes = np.empty(0, dtype=np.int64)
+
+        for ring, ring_indexes in self._rings(self._cell(lat, lon)):
+            # Nenhum ponto deste anel em diante pode ser estritamente mais próximo
+            if len(best_indexes) == k and best_distances[-1] < self._ring_lower_bound_km(ring, lat):
+                break
+
+            if ring_indexes:
+                ring_indexes = np.asarray(ring_indexes, dtype=np.int64)
+                best_distances, best_indexes = self._smallest(
+                    np.concatenate((best_distances, self._distances(lat, lon, ring_indexes))),
+                    np.concatenate((best_indexes, ring_indexes)),
+                    k
+                )
+
+        return self._results(best_distances, best_indexes)
+
+    def nearest_bulk(self, points, k: int = 1) -> List[List[Tuple[float, Any]]]:
+        """
+        Os k pontos mais próximos para muitas consultas de uma vez (ex: todas
+        as fotos do dia). Cada consulta usa a grade, como em `nearest`: a
+        memória fica limitada aos anéis visitados por ponto, sem matriz
+        consultas x pontos indexados.
+
+        Args:
+            points: Sequência ou array (n, 2) de (lat, lon)
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        return [self.nearest(lat, lon, k) for lat, lon in points.tolist()]
+
+    def within_radius(self, lat: float, lon: float, radius_km: float) -> List[Tuple[float, Any]]:
+        """
+        Todos os pontos a até `radius_km` da consulta.
+
+        Returns:
+            list: (distância em km, item) em ordem crescente de distância
+        """
+        if not len(self) or radius_km < 0:
+            return []
+
+        # Extensão em graus do raio (longitude alargada pela maior latitude alcançada)
+        lat_span = radius_km / KM_PER_DEGREE
+        max_lat = min(90.0, abs(lat) + lat_span)
+        lon_chord = math.sin(radius_km / EARTH_RADIUS_KM / 2) / max(math.cos(math.radians(max_lat)), 1e-12)
+
+        if max_lat >= 89.0 or lon_chord >= 1.0:
+            candidates = self._live_indexes()
+        else:
+            lon_span = math.degrees(2 * math.asin(lon_chord))
+            min_i, max_i = self._cell(lat - lat_span, lon)[0], self._cell(lat + lat_span, lon)[0]
+            min_j, max_j = self._cell(lat, lon - lon_span)[1], self._cell(lat, lon + lon_span)[1]
+
+            if (max_i - min_i + 1) * (max_j - min_j + 1) > len(self._cells):
+                candidates = [index for (ci, cj), indexes in self._cells.items()
+                              if min_i <= ci <= max_i and min_j <= cj <= max_j
+                              for index in indexes]
+            else:
+                candidates = [index for ci in range(min_i, max_i + 1)
+                              for cj in range(min_j, max_j + 1)
+                              for index in self._cells.get((ci, cj), ())]
+
+        indexes = np.asarray(candidates, dtype=np.int64)
+        if len(indexes) == 0:
+            return []
+
+        distances = self._distances(lat, lon, indexes)
+        inside = distances <= radius_km
+        return self._results(*self._smallest(distances[inside], indexes[inside], len(indexes)))
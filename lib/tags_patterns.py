@@ -4,10 +4,21 @@ Patterns inteligentes para identificar transportadoras e extrair dados
 """
 
 import re
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, List, NamedTuple, Optional, Tuple
 from dataclasses import dataclass
 from enum import Enum
 
+from .aho_corasick import AhoCorasick
+
+# Caracteres que IGNORECASE casa com letras ASCII mas que str.lower() não converte
+_CASE_FOLD = str.maketrans({"\u0131": "i", "\u017f": "s", "\u0307": None})
+
+# Regex auxiliares da validação de extrações
+_NON_DIGITS = re.compile(r"[^0-9]")
+_HAS_DIGIT = re.compile(r"\d+")
+_NF_FORMAT = re.compile(r"^[A-Z]?\d+$")
+
+
 class CompanyType(Enum):
     AMAZON = "amazon"
     CORREIOS = "correios"
@@ -16,6 +27,11 @@ class CompanyType(Enum):
     CUSTOM = "custom"
     UNKNOWN = "unknown"
 
+class ExtractedField(NamedTuple):
+    """Valor extraído e sua confiança (desempacota como a tupla (valor, confiança))"""
+    value: str
+    confidence: float
+
 @dataclass
 class PatternMatch:
     company: CompanyType
@@ -30,21 +46,31 @@ class TagsPatterns:
     def __init__(self):
         self.company_patterns = self._load_company_patterns()
         self.data_extraction_patterns = self._load_data_patterns()
+        self._compile_company_matcher()
+        self._compile_extraction_plan()
         
     def _load_company_patterns(self) -> Dict[CompanyType, List[Dict]]:
-        """Carrega padrões de identificação de transportadoras"""
+        """
+        Carrega padrões de identificação de transportadoras.
+        
+        `literals`: textos (minúsculos, ASCII) dos quais ao menos um aparece
+        em todo texto que o padrão casa; o padrão só roda quando um deles
+        está na etiqueta. Sem a chave (ex: padrões aprendidos), roda sempre.
+        """
         return {
             CompanyType.AMAZON: [
                 {
                     "name": "amazon_logo",
                     "pattern": r"(?i)(amazon\.com\.br|amazon\.com|fulfillment.*amazon|prime.*amazon)",
                     "confidence": 0.95,
+                    "literals": ["amazon"],
                     "shortcuts": ["amazon.com.br", "amazon.com", "prime", "fulfillment"]
                 },
                 {
                     "name": "amazon_specific_warehouse",
                     "pattern": r"(?i)(av\.?\s+das\s+nações\s+unidas.*barueri|fulfillment.*center)",
                     "confidence": 0.85,
+                    "literals": ["barueri", "fulfillment"],
                     "context": "amazon_warehouse_complete"
                 }
             ],
@@ -54,6 +80,7 @@ class TagsPatterns:
                     "name": "correios_official", 
                     "pattern": r"(?i)(correios\.com\.br|empresa\s+brasileira\s+de\s+correios|pac.*correios|sedex.*correios)",
                     "confidence": 0.95,
+                    "literals": ["correios"],
                     "shortcuts": ["correios.com.br", "empresa brasileira", "ecorreios"]
                 },
                 {
@@ -69,6 +96,7 @@ class TagsPatterns:
                     "name": "ml_logistics_signature",
                     "pattern": r"(?i)(logistics\s*#\d+|conta\s*logistics)",
                     "confidence": 0.95,
+                    "literals": ["logistics"],
                     "shortcuts": ["logistics", "conta logistics"],
                     "context": "ml_specific_trained"
                 },
@@ -76,12 +104,14 @@ class TagsPatterns:
                     "name": "ml_warehouse_tambore",
                     "pattern": r"(?i)(tambore|jussara.*1250)",
                     "confidence": 0.85,
+                    "literals": ["tambore", "jussara"],
                     "context": "ml_warehouse_location"
                 },
                 {
                     "name": "ml_traditional",
                     "pattern": r"(?i)(mercado\s*livre|mercado\s*envios|meli)",
                     "confidence": 0.75,
+                    "literals": ["mercado", "meli"],
                     "shortcuts": ["mercado livre", "mercado envios", "meli"]
                 }
             ],
@@ -91,6 +121,7 @@ class TagsPatterns:
                     "name": "jadlog_signature",
                     "pattern": r"(?i)(jadlog|jad\s*log)",
                     "confidence": 0.95,
+                    "literals": ["jad"],
                     "shortcuts": ["jadlog"],
                     "context": "jadlog_official"
                 },
@@ -98,13 +129,19 @@ class TagsPatterns:
                     "name": "jadlog_patterns",
                     "pattern": r"(?i)(squeeze|aluminio|corpo|unico)",
                     "confidence": 0.70,
+                    "literals": ["squeeze", "aluminio", "corpo", "unico"],
                     "context": "jadlog_products"
                 }
             ]
         }
     
     def _load_data_patterns(self) -> Dict[str, Dict]:
-        """Carrega padrões para extração de dados específicos"""
+        """
+        Carrega padrões para extração de dados específicos.
+        
+        `literals[i]` tem o mesmo papel que nos padrões de empresas para
+        `patterns[i]`; None, ou a chave ausente, faz o padrão rodar sempre.
+        """
         return {
             "recipient_name": {
                 "patterns": [
@@ -112,6 +149,7 @@ class TagsPatterns:
                     r"(?i)^([a-záàâãéèêíìîóòôõúùûç\s]{10,50})$",  # Nome completo
                     r"([A-ZÁÀÂÃÉÈÊÍÌÎÓÒÔÕÚÙÛÇ][a-záàâãéèêíìîóòôõúùûç]+(?:\s+[A-ZÁÀÂÃÉÈÊÍÌÎÓÒÔÕÚÙÛÇ][a-záàâãéèêíìîóòôõúùûç]+)+)"
                 ],
+                "literals": [["para", "destinat", "nome"], None, None],
                 "confidence_base": 0.8
             },
             
@@ -121,6 +159,7 @@ class TagsPatterns:
                     r"(?i)(?:endereço|end):\s*([^,\n]+)",
                     r"([A-Z][a-z]+\s+[A-Z][a-z]+.*?\d+)"
                 ],
+                "literals": [["rua", "av", "alameda", "pra"], ["end"], None],
                 "confidence_base": 0.7
             },
             
@@ -130,6 +169,7 @@ class TagsPatterns:
                     r"(?i)cep:\s*(\d{5})-?(\d{3})",
                     r"(\d{8})"  # CEP sem separador
                 ],
+                "literals": [None, ["cep:"], None],
                 "confidence_base": 0.9
             },
             
@@ -139,6 +179,7 @@ class TagsPatterns:
                     r"(?i)cidade:\s*([a-záàâãéèêíìîóòôõúùûç\s]+)",
                     r"([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)\s*,\s*[A-Z]{2}"
                 ],
+                "literals": [["-"], ["cidade:"], [","]],
                 "confidence_base": 0.75
             },
             
@@ -148,10 +189,50 @@ class TagsPatterns:
                     r"(?i)nota\s+fiscal\s*:?\s*([A-Z]?\d+)",
                     r"(?i)nf\s*:?\s*([A-Z]?\d+)"
                 ],
+                "literals": [None, ["fiscal"], ["nf"]],
                 "confidence_base": 0.85
             }
         }
     
+    def add_company_pattern(self, company: CompanyType, pattern_info: Dict):
+        """Registra um novo padrão (ex: aprendido) e recompila o matcher"""
+        self.company_patterns.setdefault(company, []).append(pattern_info)
+        self._compile_company_matcher()
+    
+    def _compile_company_matcher(self):
+        """
+        Pré-compila os padrões de empresas e monta o índice de literais.
+        
+        Cada padrão contribui com os literais obrigatórios declarados na sua
+        entrada (`literals`); junto com os shortcuts, eles formam um único autômato de
+        Aho-Corasick. O texto é varrido uma vez e só os padrões cujos literais
+        apareceram são executados, independente de quantas empresas existem.
+        """
+        self._company_entries = []
+        self._literal_index = AhoCorasick()
+        self._patterns_by_literal = {}
+        self._unfiltered_patterns = []
+        
+        for company, patterns in self.company_patterns.items():
+            for pattern_info in patterns:
+                index = len(self._company_entries)
+                compiled = re.compile(pattern_info["pattern"])
+                shortcuts = [shortcut.lower() for shortcut in pattern_info.get("shortcuts", [])]
+                literals = pattern_info.get("literals")
+                
+                if literals is None:
+                    self._unfiltered_patterns.append(index)
+                else:
+                    for literal in literals:
+                        literal = literal.translate(_CASE_FOLD)
+                        self._literal_index.add(literal)
+                        self._patterns_by_literal.setdefault(literal, []).append(index)
+                
+                for shortcut in shortcuts:
+                    self._literal_index.add(shortcut)
+                
+                self._company_entries.append((company, pattern_info, compiled, shortcuts))
+    
     def identify_company(self, text: str) -> PatternMatch:
         """Identifica a transportadora baseada no texto extraído"""
         best_match = PatternMatch(
@@ -163,76 +244,129 @@ class TagsPatterns:
         )
         
         text_clean = text.strip()
+        text_lower = text_clean.lower()
         
-        for company, patterns in self.company_patterns.items():
-            for pattern_info in patterns:
-                matches = re.findall(pattern_info["pattern"], text_clean)
+        # Varredura única: literais obrigatórios dos padrões + shortcuts
+        found = self._literal_index.find_all(text_lower)
+        text_folded = text_lower.translate(_CASE_FOLD)
+        literal_hits = found if text_folded == text_lower else found | self._literal_index.find_all(text_folded)
+        
+        candidates = set(self._unfiltered_patterns)
+        for literal in literal_hits:
+            candidates.update(self._patterns_by_literal.get(literal, ()))
+        
+        for index in sorted(candidates):
+            company, pattern_info, compiled, shortcuts = self._company_entries[index]
+            matches = compiled.findall(text_clean)
+            
+            if matches:
+                confidence = pattern_info["confidence"]
+                
+                # Bonus de confiança para múltiplas ocorrências
+                if len(matches) > 1:
+                    confidence = min(0.99, confidence + 0.05)
                 
-                if matches:
-                    confidence = pattern_info["confidence"]
-                    
-                    # Bonus de confiança para múltiplas ocorrências
-                    if len(matches) > 1:
-                        confidence = min(0.99, confidence + 0.05)
-                    
-                    # Bonus para shortcuts conhecidos
-                    if "shortcuts" in pattern_info:
-                        for shortcut in pattern_info["shortcuts"]:
-                            if shortcut.lower() in text_clean.lower():
-                                confidence = min(0.99, confidence + 0.03)
-                    
-                    if confidence > best_match.confidence:
-                        best_match = PatternMatch(
-                            company=company,
-                            confidence=confidence,
-                            matched_text=str(matches[0]) if matches else "",
-                            pattern_used=pattern_info["name"],
-                            extracted_data={}
-                        )
+                # Bonus para shortcuts conhecidos
+                for shortcut in shortcuts:
+                    if shortcut in found:
+                        confidence = min(0.99, confidence + 0.03)
+                
+                if confidence > best_match.confidence:
+                    best_match = PatternMatch(
+                        company=company,
+                        confidence=confidence,
+                        matched_text=str(matches[0]) if matches else "",
+                        pattern_used=pattern_info["name"],
+                        extracted_data={}
+                    )
         
         return best_match
     
-    def extract_data(self, text: str, data_type: str) -> List[Tuple[str, float]]:
-        """Extrai dados específicos do texto usando padrões inteligentes"""
-        results = []
+    def _compile_extraction_plan(self):
+        """
+        Pré-compila os padrões de extração de dados uma única vez por instância.
+        
+        O plano guarda, por campo, as regex compiladas com o número de grupos
+        (para reproduzir a saída de re.findall direto dos objetos de match) e
+        os literais obrigatórios declarados para cada padrão, que permitem
+        pular padrões que não podem casar com o texto.
+        """
+        flags = re.MULTILINE | re.IGNORECASE
+        self._extraction_plan = {}
+        
+        for data_type, patterns_info in self.data_extraction_patterns.items():
+            compiled_patterns = []
+            declared = patterns_info.get("literals") or [None] * len(patterns_info["patterns"])
+            for pattern, literals in zip(patterns_info["patterns"], declared):
+                regex = re.compile(pattern, flags)
+                if literals is not None:
+                    literals = tuple(literal.translate(_CASE_FOLD) for literal in literals)
+                compiled_patterns.append((regex, regex.groups, literals))
+            
+            self._extraction_plan[data_type] = (compiled_patterns, patterns_info["confidence_base"])
+    
+    def _extract_field(self, text: str, data_type: str, text_folded: Optional[str] = None) -> List[ExtractedField]:
+        """Todas as extrações válidas de um campo, ordenadas por confiança"""
+        plan = self._extraction_plan.get(data_type)
+        if plan is None:
+            return []
         
-        if data_type not in self.data_extraction_patterns:
-            return results
+        if text_folded is None:
+            text_folded = text.lower().translate(_CASE_FOLD)
         
-        patterns_info = self.data_extraction_patterns[data_type]
-        base_confidence = patterns_info["confidence_base"]
+        compiled_patterns, base_confidence = plan
+        best = {}  # valor -> confiança (ordem de inserção = ordem de descoberta)
         
-        for pattern in patterns_info["patterns"]:
-            matches = re.findall(pattern, text, re.MULTILINE | re.IGNORECASE)
+        for regex, group_count, literals in compiled_patterns:
+            # Pular padrões cujo literal obrigatório não aparece no texto
+            if literals is not None and not any(literal in text_folded for literal in literals):
+                continue
             
-            for match in matches:
-                if isinstance(match, tuple):
+            for match in regex.finditer(text):
+                if group_count == 0:
+                    extracted = match.group(0).strip()
+                elif group_count == 1:
+                    extracted = (match.group(1) or "").strip()
+                elif data_type == "cep" and group_count == 2:
                     # Para CEP e outros com grupos
-                    if data_type == "cep" and len(match) == 2:
-                        extracted = f"{match[0]}-{match[1]}"
-                    else:
-                        extracted = " ".join(match).strip()
+                    extracted = f"{match.group(1) or ''}-{match.group(2) or ''}"
                 else:
-                    extracted = match.strip()
+                    extracted = " ".join(group or "" for group in match.groups()).strip()
+                
+                if extracted in best:
+                    continue
                 
                 # Validações específicas por tipo
                 confidence = self._validate_extraction(data_type, extracted, base_confidence)
                 
                 if confidence > 0.3:  # Threshold mínimo
-                    results.append((extracted, confidence))
-        
-        # Remover duplicatas e ordenar por confiança
-        unique_results = list(set(results))
-        unique_results.sort(key=lambda x: x[1], reverse=True)
+                    best[extracted] = confidence
         
-        return unique_results[:3]  # Top 3 resultados
+        # Ordenar por confiança (estável: empates mantêm a ordem de descoberta)
+        results = [ExtractedField(value, confidence) for value, confidence in best.items()]
+        results.sort(key=lambda field: field.confidence, reverse=True)
+        return results
+    
+    def extract_all(self, text: str) -> Dict[str, ExtractedField]:
+        """Extrai o melhor valor de cada campo usando o plano pré-compilado"""
+        extracted_data = {}
+        text_folded = text.lower().translate(_CASE_FOLD)
+        for data_type in self._extraction_plan:
+            results = self._extract_field(text, data_type, text_folded)
+            if results:
+                extracted_data[data_type] = results[0]  # Melhor resultado
+        return extracted_data
+    
+    def extract_data(self, text: str, data_type: str) -> List[Tuple[str, float]]:
+        """Extrai dados específicos do texto usando padrões inteligentes"""
+        return self._extract_field(text, data_type)[:3]  # Top 3 resultados
     
     def _validate_extraction(self, data_type: str, extracted: str, base_confidence: float) -> float:
         """Valida extração específica e ajusta confiança"""
         
         if data_type == "cep":
             # CEP deve ter 8 dígitos
-            clean_cep = re.sub(r"[^0-9]", "", extracted)
+            clean_cep = _NON_DIGITS.sub("", extracted)
             if len(clean_cep) == 8:
                 return min(0.95, base_confidence + 0.1)
             else:
@@ -243,7 +377,8 @@ class TagsPatterns:
             words = extracted.split()
             if len(words) >= 2 and 5 <= len(extracted) <= 60:
                 # Bonus para nomes completos típicos brasileiros
-                if any(prefix in extracted.lower() for prefix in ["de", "da", "do", "dos", "das"]):
+                extracted_lower = extracted.lower()
+                if any(prefix in extracted_lower for prefix in ("de", "da", "do", "dos", "das")):
                     return min(0.95, base_confidence + 0.1)
                 return base_confidence
             else:
@@ -251,14 +386,14 @@ class TagsPatterns:
         
         elif data_type == "address":
             # Endereço deve ter número
-            if re.search(r"\d+", extracted):
+            if _HAS_DIGIT.search(extracted):
                 return min(0.90, base_confidence + 0.05)
             else:
                 return base_confidence * 0.7
         
         elif data_type == "nf_number":
             # Nota fiscal deve ser numérica ou alfanumérica
-            if re.match(r"^[A-Z]?\d+$", extracted):
+            if _NF_FORMAT.match(extracted):
                 return min(0.90, base_confidence + 0.05)
             else:
                 return base_confidence * 0.6
@@ -272,11 +407,7 @@ class TagsPatterns:
         company_match = self.identify_company(text)
         
         # 2. Extrair todos os dados
-        extracted_data = {}
-        for data_type in self.data_extraction_patterns.keys():
-            results = self.extract_data(text, data_type)
-            if results:
-                extracted_data[data_type] = results[0]  # Melhor resultado
+        extracted_data = self.extract_all(text)
         
         # 3. Calcular score geral
         total_confidence = company_match.confidence
@@ -307,5 +438,20 @@ class TagsPatterns:
             return "❌ Etiqueta com baixa qualidade - Repetir foto ou processar manualmente"
 
 
-# Instância global para uso em outros módulos
-tags_patterns = TagsPatterns() 
\ No newline at end of file
+_tags_patterns: Optional[TagsPatterns] = None
+
+
+def get_tags_patterns() -> TagsPatterns:
+    """Instância global para uso em outros módulos (criada no primeiro uso)"""
+    global _tags_patterns
+    if _tags_patterns is None:
+        _tags_patterns = TagsPatterns()
+    return _tags_patterns
+
+
+def __getattr__(name):
+    # Compatibilidade com `from lib.tags_patterns import tags_patterns`
+    if name == "tags_patterns":
+        return get_tags_patterns()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+ 
\ No newline at end of file
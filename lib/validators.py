@@ -3,15 +3,140 @@
 Validação inteligente que considera contexto e histórico de aprendizado
 """
 
-import csv
-import math
-from datetime import datetime, time
-from typing import Dict, List, Optional, Tuple
+from datetime import datetime
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
 from pathlib import Path
+import os
 import re
+import csv
+import time
+import threading
+
+import numpy as np
 
 from .tags_patterns import PatternMatch, CompanyType
-from .learning_engine import LearningEngine
+from .spatial_index import RouteSpatialIndex
+from .route_store import RouteRecord, RouteStore, load_route_store
+
+_NON_DIGITS = re.compile(r"[^0-9]")
+
+# Pontos por campo coincidente na busca de rota por dados do OCR
+ROUTE_MATCH_POINTS = {"recipient_name": 2, "cep": 2, "nf_number": 3}
+ROUTE_MATCH_MIN_SCORE = 2
+
+# Intervalo (s) entre verificações de alteração do CSV de rotas
+DEFAULT_RELOAD_INTERVAL = 5.0
+
+
+def _trigrams(text: str) -> set:
+    return {text[start:start + 3] for start in range(len(text) - 2)}
+
+
+class RouteTables:
+    """
+    Base de rotas e todos os seus índices.
+
+    Acréscimos e alterações são aplicados no lugar (sob o lock de escrita do
+    EnhancedValidators), em tempo proporcional às rotas afetadas: as linhas
+    novas são publicadas na base antes de entrar nos índices, então uma
+    posição vinda de um índice sempre existe na base. Uma recarga completa
+    cria outra instância à parte, trocada de uma vez, para que validações em
+    andamento nunca vejam a base de uma versão e os índices de outra.
+    """
+
+    def __init__(self, routes: RouteStore):
+        self.routes = routes
+        self.spatial = RouteSpatialIndex()
+        self.spatial_slots: Dict[int, int] = {}  # posição da rota -> posição no índice espacial
+        self.by_nf: Dict[str, List[int]] = {}
+        self.by_cep: Dict[str, List[int]] = {}
+        self.by_name_token: Dict[str, List[int]] = {}
+        self.by_compact_name: Dict[str, List[int]] = {}  # nome sem espaços, em minúsculas
+        self.by_name_trigram: Dict[str, List[int]] = {}  # trigramas do nome sem espaços
+        self.index_rows(range(len(routes)))
+
+    @staticmethod
+    def _keys(nf: Optional[str], cep: Optional[str], name: Optional[str]) -> Tuple[str, str, set, str, set]:
+        """
+        Chaves normalizadas: NF em maiúsculas, CEP só dígitos, tokens do nome
+        em minúsculas, nome sem espaços e seus trigramas
+        """
+        name = (name or "").lower()
+        compact = "".join(name.split())
+        return ((nf or "").upper(), _NON_DIGITS.sub("", cep or ""), set(name.split()),
+                compact, _trigrams(compact))
+
+    def _indexes(self, keys: Tuple[str, str, set, str, set]):
+        """(índice, chaves da rota nele) para cada índice de dados"""
+        nf, cep, tokens, compact, trigrams = keys
+        return ((self.by_nf, {nf} - {""}),
+                (self.by_cep, {cep} - {""}),
+                (self.by_name_token, tokens),
+                (self.by_compact_name, {compact} - {""}),
+                (self.by_name_trigram, trigrams))
+
+    def index_rows(self, rows: range):
+        """Indexa (coordenadas, NF, CEP e nome) as rotas nas posições informadas"""
+        routes = self.routes
+        columns = zip(rows,
+                      routes.column("nf_number", rows.start, rows.stop),
+                      routes.column("cep", rows.start, rows.stop),
+                      routes.column("recipient_name", rows.start, rows.stop))
+        
+        for position, nf, cep, name in columns:
+            lat, lon = routes.lat[position], routes.lon[position]
+            if not (np.isnan(lat) or np.isnan(lon)):
+                self.spatial_slots[position] = self.spatial.add(float(lat), float(lon), routes[position])
+            
+            for index, keys in self._indexes(self._keys(nf, cep, name)):
+                for key in keys:
+                    index.setdefault(key, []).append(position)
+
+    @staticmethod
+    def _discard(index: Dict[str, List[int]], key: str, position: int):
+        remaining = [other for other in index.get(key, ()) if other != position]
+        if remaining:
+            index[key] = remaining
+        else:
+            index.pop(key, None)
+
+    @staticmethod
+    def _insert(index: Dict[str, List[int]], key: str, position: int):
+        index[key] = sorted(index.get(key, []) + [position])
+
+    def _route_keys(self, position: int) -> Tuple[str, str, set, str, set]:
+        route = self.routes[position]
+        return self._keys(route.get("nf_number"), route.get("cep"), route.get("recipient_name"))
+
+    def update_rows(self, positions: List[int], changes: Mapping):
+        """Aplica as mesmas alterações a várias rotas e reindexa só o que mudou"""
+        old_keys = {position: self._route_keys(position) for position in positions}
+        self.routes.update_rows(positions, changes)
+        
+        for position in positions:
+            old_indexes, new_indexes = self._indexes(old_keys[position]), self._indexes(self._route_keys(position))
+            for (index, old), (_, new) in zip(old_indexes, new_indexes):
+                for key in old - new:
+                    self._discard(index, key, position)
+                for key in new - old:
+                    self._insert(index, key, position)
+            
+            self._reindex_location(position)
+
+    def _reindex_location(self, position: int):
+        """Move a rota no índice espacial; sem coordenadas válidas, retira-a das buscas"""
+        route = self.routes[position]
+        lat, lon = route.lat, route.lon
+        slot = self.spatial_slots.get(position)
+        
+        if np.isnan(lat) or np.isnan(lon):
+            if slot is not None:
+                self.spatial.remove(slot)
+                del self.spatial_slots[position]
+        elif slot is not None:
+            self.spatial.move(slot, lat, lon)
+        else:
+            self.spatial_slots[position] = self.spatial.add(lat, lon, route)
 
 class ValidationResult:
     """Resultado detalhado de validação"""
@@ -59,43 +184,224 @@ class ValidationResult:
 class EnhancedValidators:
     """Sistema de validação melhorado com aprendizado"""
     
-    def __init__(self, database_path: str = "lib/delivery_database.csv"):
+    def __init__(self, database_path: str = "lib/delivery_database.csv", reload_interval: Optional[float] = None):
         self.database_path = Path(database_path)
-        self.delivery_routes = self._load_delivery_database()
-        
-    def _load_delivery_database(self) -> List[Dict]:
-        """Carrega base de dados de rotas de entrega"""
-        routes = []
+        if reload_interval is None:
+            reload_interval = float(os.getenv('ROUTE_RELOAD_INTERVAL', DEFAULT_RELOAD_INTERVAL))
+        self.reload_interval = reload_interval  # <= 0 desativa a verificação automática
+        
+        self._write_lock = threading.Lock()
+        self._source_key = self._stat_database()
+        self._tables = RouteTables(self._load_delivery_database())
+        self._next_check = time.monotonic() + self.reload_interval
+        self._watcher: Optional[threading.Thread] = None
+        self._refresher: Optional[threading.Thread] = None
+        self._stop_watching = threading.Event()
+    
+    @property
+    def delivery_routes(self) -> RouteStore:
+        return self._tables.routes
+    
+    @property
+    def route_index(self) -> RouteSpatialIndex:
+        return self._tables.spatial
+    
+    @property
+    def routes_by_nf(self) -> Dict[str, List[int]]:
+        return self._tables.by_nf
+    
+    @property
+    def routes_by_cep(self) -> Dict[str, List[int]]:
+        return self._tables.by_cep
+    
+    @property
+    def routes_by_name_token(self) -> Dict[str, List[int]]:
+        return self._tables.by_name_token
+    
+    def _load_delivery_database(self) -> RouteStore:
+        """Carrega base de dados de rotas de entrega (colunar, via snapshot binário quando válido)"""
         
         if not self.database_path.exists():
             print(f"⚠️ Base de dados não encontrada: {self.database_path}")
-            return routes
+            return RouteStore.empty()
         
         try:
-            with open(self.database_path, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                routes = list(reader)
-                
+            routes = load_route_store(self.database_path)
             print(f"📊 Carregadas {len(routes)} rotas da base de dados")
+            return routes
             
         except Exception as e:
             print(f"❌ Erro ao carregar base de dados: {e}")
         
-        return routes
+        return RouteStore.empty()
+    
+    def _stat_database(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self.database_path)
+        except OSError:
+            return None
+        return (stat.st_size, stat.st_mtime_ns)
+    
+    def refresh_if_changed(self, force: bool = False) -> bool:
+        """
+        Incorpora alterações do CSV de rotas sem reiniciar o processo.
+        
+        Roda na thread que chama (watcher, check_for_changes ou uso direto).
+        Linhas acrescentadas ao final (arquivo maior, com o trecho já lido
+        intacto) são indexadas de forma incremental; qualquer outra edição,
+        inclusive uma que mantenha o tamanho, gera uma recarga completa,
+        montada à parte e trocada de uma vez. Fora de `force`, verifica no
+        máximo a cada `reload_interval` segundos. Se outra thread já estiver
+        atualizando, retorna sem esperar.
+        
+        Returns:
+            bool: True se a base foi atualizada
+        """
+        now = time.monotonic()
+        if not force and (self.reload_interval <= 0 or now < self._next_check):
+            return False
+        if not self._write_lock.acquire(blocking=False):
+            return False
+        
+        try:
+            self._next_check = now + self.reload_interval
+            source_key = self._stat_database()
+            if source_key is None or source_key == self._source_key:
+                return False
+            
+            tables = self._tables
+            try:
+                added = tables.routes.extend_from_csv(self.database_path)
+            except (OSError, UnicodeDecodeError, csv.Error):
+                added = None
+            
+            if added is not None:
+                tables.index_rows(added)
+                if added:
+                    print(f"🔄 {len(added)} novas rotas incorporadas da base de dados")
+            else:
+                self._tables = RouteTables(self._load_delivery_database())
+                print("🔄 Base de dados de rotas recarregada")
+            
+            self._source_key = source_key
+            return True
+        finally:
+            self._write_lock.release()
+    
+    def check_for_changes(self):
+        """
+        Verificação feita pelas validações: no máximo a cada `reload_interval`
+        segundos, um stat do CSV; se ele mudou, a atualização roda em uma
+        thread de fundo e as validações seguem com a base atual até a troca.
+        """
+        now = time.monotonic()
+        if self.reload_interval <= 0 or now < self._next_check:
+            return
+        self._next_check = now + self.reload_interval
+        
+        if self._stat_database() in (None, self._source_key):
+            return
+        if self._refresher is not None and self._refresher.is_alive():
+            return
+        
+        def refresh():
+            try:
+                self.refresh_if_changed(force=True)
+            except Exception as e:
+                print(f"⚠️ Erro ao atualizar base de rotas: {e}")
+        
+        self._refresher = threading.Thread(target=refresh, name="route-refresh", daemon=True)
+        self._refresher.start()
+    
+    def start_watching(self, interval: Optional[float] = None):
+        """Verifica o CSV de rotas em uma thread de fundo (em vez de só durante as validações)"""
+        if self._watcher is not None and self._watcher.is_alive():
+            return
+        
+        interval = interval or self.reload_interval or DEFAULT_RELOAD_INTERVAL
+        self._stop_watching.clear()
+        
+        def watch():
+            while not self._stop_watching.wait(interval):
+                try:
+                    self.refresh_if_changed(force=True)
+                except Exception as e:
+                    print(f"⚠️ Erro ao atualizar base de rotas: {e}")
+        
+        self._watcher = threading.Thread(target=watch, name="route-watcher", daemon=True)
+        self._watcher.start()
+    
+    def stop_watching(self):
+        self._stop_watching.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
+    
+    def add_routes(self, routes: Iterable[Mapping]) -> range:
+        """
+        Acrescenta rotas (formato do csv.DictReader) em memória, já indexadas.
+        
+        Não grava no CSV: uma recarga completa posterior as descarta.
+        
+        Returns:
+            range: Posições das novas rotas
+        """
+        with self._write_lock:
+            tables = self._tables
+            added = tables.routes.append_rows(routes)
+            tables.index_rows(added)
+            return added
+    
+    def update_route(self, route_id: str, changes: Mapping) -> int:
+        """
+        Altera campos (ex: status, janela, coordenadas) das rotas com este route_id,
+        atualizando os índices afetados. Retorna o número de rotas alteradas.
+        """
+        with self._write_lock:
+            tables = self._tables
+            positions = tables.routes.rows_where("route_id", route_id)
+            tables.update_rows(positions, changes)
+            return len(positions)
+    
+    def find_nearest_routes(self, lat: float, lon: float, k: int = 1) -> List[Tuple[float, Dict]]:
+        """Retorna as k rotas mais próximas como (distância em km, rota)"""
+        return self.route_index.nearest(lat, lon, k)
+    
+    def find_nearest_routes_bulk(self, device_points: List[Tuple[float, float]], k: int = 1) -> List[List[Tuple[float, Dict]]]:
+        """
+        Rotas mais próximas para muitos pontos de uma vez (fotos do lote,
+        conciliação do dia), cada um consultado no índice espacial. O resultado
+        de cada ponto pode ser passado a comprehensive_validation(nearest_routes=...).
+        """
+        self.check_for_changes()
+        return self.route_index.nearest_bulk(device_points, k)
+    
+    def find_routes_within(self, lat: float, lon: float, radius_km: float) -> List[Tuple[float, Dict]]:
+        """Retorna as rotas a até radius_km como (distância em km, rota), da mais próxima à mais distante"""
+        return self.route_index.within_radius(lat, lon, radius_km)
     
     def comprehensive_validation(self, 
                                analysis_result: Dict,
                                device_gps: Tuple[float, float],
-                               timestamp: Optional[datetime] = None) -> ValidationResult:
-        """Validação abrangente integrando todos os componentes"""
+                               timestamp: Optional[datetime] = None,
+                               nearest_routes: Optional[List[Tuple[float, Dict]]] = None) -> ValidationResult:
+        """
+        Validação abrangente integrando todos os componentes.
+        
+        nearest_routes: rotas mais próximas de device_gps já calculadas em
+        lote (find_nearest_routes_bulk); se None, consulta o índice espacial.
+        """
         
         result = ValidationResult()
         
+        # Incorporar rotas novas/alteradas no CSV (em segundo plano, verificação limitada por reload_interval)
+        self.check_for_changes()
+        
         if timestamp is None:
             timestamp = datetime.now()
         
         # 1. Validação GPS
-        gps_validation = self._validate_gps_location(analysis_result, device_gps)
+        gps_validation = self._validate_gps_location(analysis_result, device_gps, nearest_routes)
         result.add_validation("gps_match", gps_validation["valid"], gps_validation["score"], gps_validation["details"])
         result.gps_distance = gps_validation.get("distance", 0.0)
         result.matched_route = gps_validation.get("matched_route")
@@ -121,27 +427,18 @@ class EnhancedValidators:
         
         return result
     
-    def _validate_gps_location(self, analysis_result: Dict, device_gps: Tuple[float, float]) -> Dict:
+    def _validate_gps_location(self, analysis_result: Dict, device_gps: Tuple[float, float],
+                               nearest_routes: Optional[List[Tuple[float, Dict]]] = None) -> Dict:
         """Validação inteligente de localização GPS"""
         
         device_lat, device_lon = device_gps
         best_match = None
         min_distance = float('inf')
         
-        # Buscar rota mais próxima
-        for route in self.delivery_routes:
-            try:
-                route_lat = float(route['gps_lat'])
-                route_lon = float(route['gps_lon'])
-                
-                distance = self._calculate_distance(device_lat, device_lon, route_lat, route_lon)
-                
-                if distance < min_distance:
-                    min_distance = distance
-                    best_match = route
-                    
-            except (ValueError, KeyError):
-                continue
+        # Buscar rota mais próxima no índice espacial (ou usar a busca em lote)
+        nearest = nearest_routes if nearest_routes is not None else self.route_index.nearest(device_lat, device_lon)
+        if nearest:
+            min_distance, best_match = nearest[0]
         
         # Determinar validade baseada na distância
         if min_distance <= 0.05:  # 50m
@@ -204,13 +501,14 @@ class EnhancedValidators:
             "details": details
         }
     
-    def _validate_delivery_time(self, route: Dict, current_time: datetime) -> Dict:
+    def _validate_delivery_time(self, route: RouteRecord, current_time: datetime) -> Dict:
         """Validação da janela de tempo de entrega"""
         
         try:
-            # Parse da janela de entrega
-            start_time = time.fromisoformat(route['delivery_window_start'])
-            end_time = time.fromisoformat(route['delivery_window_end'])
+            # Janela de entrega (já convertida na carga da base)
+            start_time, end_time = route.window_start, route.window_end
+            if start_time is None or end_time is None:
+                raise ValueError(f"janela inválida: {route['delivery_window_start']}-{route['delivery_window_end']}")
             
             current_time_only = current_time.time()
             
@@ -317,60 +615,88 @@ class EnhancedValidators:
             else:
                 result.recommendations.append("❓ Validar manualmente antes de usar para aprendizado")
         
-    def _calculate_distance(self, lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-        """Calcula distância em km entre duas coordenadas usando fórmula de Haversine"""
-        
-        R = 6371  # Raio da Terra em km
-        
-        lat1_rad = math.radians(lat1)
-        lon1_rad = math.radians(lon1)
-        lat2_rad = math.radians(lat2)
-        lon2_rad = math.radians(lon2)
-        
-        dlat = lat2_rad - lat1_rad
-        dlon = lon2_rad - lon1_rad
-        
-        a = math.sin(dlat/2)**2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(dlon/2)**2
-        c = 2 * math.asin(math.sqrt(a))
-        
-        return R * c
-    
-    def find_route_by_data(self, extracted_data: Dict) -> Optional[Dict]:
-        """Encontra rota baseada nos dados extraídos"""
-        
-        for route in self.delivery_routes:
-            matches = 0
+    def find_route_candidates(self, extracted_data: Dict, min_score: int = ROUTE_MATCH_MIN_SCORE) -> List[Tuple[int, Dict]]:
+        """
+        Rotas compatíveis com os dados extraídos, ranqueadas por pontuação.
+        
+        NF e CEP são consultados nos índices hash; o nome do destinatário só é
+        comparado (fuzzy) com as rotas candidatas: as que coincidem em NF, CEP
+        ou em ao menos um token do nome, e as que _fuzzy_match aceitaria pelo
+        nome sem espaços (nome da rota contido no do OCR, pelo índice de nomes;
+        nome do OCR contido no da rota, pelos trigramas). O resultado é o
+        mesmo da comparação com todas as rotas.
+        
+        Returns:
+            list: (pontuação, rota) em ordem decrescente de pontuação; empates
+                  seguem a ordem da base de dados
+        """
+        tables = self._tables
+        scores: Dict[int, int] = {}
+        
+        # Verificar nota fiscal (vale mais)
+        if "nf_number" in extracted_data:
+            ocr_nf = (extracted_data["nf_number"][0] or "").upper()
+            for position in tables.by_nf.get(ocr_nf, ()):
+                scores[position] = scores.get(position, 0) + ROUTE_MATCH_POINTS["nf_number"]
+        
+        # Verificar CEP
+        if "cep" in extracted_data:
+            ocr_cep = _NON_DIGITS.sub("", extracted_data["cep"][0] or "")
+            for position in tables.by_cep.get(ocr_cep, ()):
+                scores[position] = scores.get(position, 0) + ROUTE_MATCH_POINTS["cep"]
+        
+        # Verificar nome do destinatário apenas nas candidatas
+        if "recipient_name" in extracted_data:
+            ocr_name = (extracted_data["recipient_name"][0] or "").lower()
+            candidates = set(scores)
+            for token in set(ocr_name.split()):
+                candidates.update(tables.by_name_token.get(token, ()))
+            candidates.update(self._compact_name_candidates(tables, "".join(ocr_name.split())))
             
-            # Verificar nome do destinatário
-            if "recipient_name" in extracted_data:
-                ocr_name = extracted_data["recipient_name"][0].lower()
-                route_name = route["recipient_name"].lower()
-                
-                # Verificação fuzzy de nome
+            for position in candidates:
+                route_name = (tables.routes[position]["recipient_name"] or "").lower()
                 if self._fuzzy_match(ocr_name, route_name, threshold=0.8):
-                    matches += 2  # Nome vale mais
-            
-            # Verificar CEP
-            if "cep" in extracted_data:
-                ocr_cep = re.sub(r"[^0-9]", "", extracted_data["cep"][0])
-                route_cep = re.sub(r"[^0-9]", "", route["cep"])
-                
-                if ocr_cep == route_cep:
-                    matches += 2
-            
-            # Verificar nota fiscal
-            if "nf_number" in extracted_data:
-                ocr_nf = extracted_data["nf_number"][0].upper()
-                route_nf = route["nf_number"].upper()
-                
-                if ocr_nf == route_nf:
-                    matches += 3  # NF vale mais ainda
-            
-            # Se tiver pelo menos 2 matches, considerar como rota encontrada
-            if matches >= 2:
-                return route
+                    scores[position] = scores.get(position, 0) + ROUTE_MATCH_POINTS["recipient_name"]
         
-        return None
+        ranked = sorted(
+            (position for position, score in scores.items() if score >= min_score),
+            key=lambda position: (-scores[position], position)
+        )
+        return [(scores[position], tables.routes[position]) for position in ranked]
+    
+    @staticmethod
+    def _compact_name_candidates(tables: RouteTables, compact: str) -> set:
+        """Rotas cujo nome sem espaços contém `compact` ou está contido nele"""
+        if not compact:
+            return set()
+        
+        # Nome da rota contido no do OCR (ex: "mariasilva" com a rota "maria silva")
+        candidates = set()
+        for start in range(len(compact)):
+            for stop in range(start + 1, len(compact) + 1):
+                candidates.update(tables.by_compact_name.get(compact[start:stop], ()))
+        
+        # Nome do OCR contido no da rota: a rota tem todos os trigramas dele
+        trigrams = _trigrams(compact)
+        if not trigrams:
+            # Menos de 3 letras: poucas consultas assim, comparar com todos os nomes
+            for name, positions in tables.by_compact_name.items():
+                if compact in name:
+                    candidates.update(positions)
+            return candidates
+        
+        postings = sorted((tables.by_name_trigram.get(trigram, ()) for trigram in trigrams), key=len)
+        common = set(postings[0])
+        for posting in postings[1:]:
+            if not common:
+                break
+            common.intersection_update(posting)
+        return candidates | common
+    
+    def find_route_by_data(self, extracted_data: Dict) -> Optional[Dict]:
+        """Encontra a rota de maior pontuação para os dados extraídos"""
+        candidates = self.find_route_candidates(extracted_data)
+        return candidates[0][1] if candidates else None
     
     def _fuzzy_match(self, text1: str, text2: str, threshold: float = 0.8) -> bool:
         """Verificação fuzzy simples entre dois textos"""
@@ -402,5 +728,19 @@ class EnhancedValidators:
         return similarity >= threshold
 
 
-# Instância global
-enhanced_validators = EnhancedValidators() 
\ No newline at end of file
+_enhanced_validators: Optional[EnhancedValidators] = None
+
+
+def get_enhanced_validators() -> EnhancedValidators:
+    """Instância global (a base de rotas só é carregada no primeiro uso)"""
+    global _enhanced_validators
+    if _enhanced_validators is None:
+        _enhanced_validators = EnhancedValidators()
+    return _enhanced_validators
+
+
+def __getattr__(name):
+    # Compatibilidade com `from lib.validators import enhanced_validators`
+    if name == "enhanced_validators":
+        return get_enhanced_validators()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,191 @@
+"""
+👁️ Assinatura Visual das Etiquetas
+dHash de 64 bits da imagem reduzida (Pillow/NumPy), BK-tree para busca por
+distância de Hamming e índice das assinaturas por transportadora, usado para
+pré-classificar a foto antes do OCR (Pillow e NumPy importados no primeiro uso)
+"""
+
+import io
+import os
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, List, Optional, Tuple
+
+HASH_SIZE = 8                    # 8x8 diferenças = 64 bits
+DEFAULT_MATCH_DISTANCE = 10      # Distância máxima de Hamming para um vizinho contar
+DEFAULT_MIN_AGREEMENT = 0.8      # Fração dos vizinhos que precisa apontar a mesma transportadora
+DUPLICATE_DISTANCE = 2           # Assinaturas mais próximas que isso não são gravadas de novo
+
+
+def dhash(image, hash_size: int = HASH_SIZE) -> int:
+    """dHash: compara cada pixel com o vizinho da direita na imagem reduzida em escala de cinza"""
+    import numpy as np
+    from PIL import Image
+
+    gray = image.convert('L').resize((hash_size + 1, hash_size), Image.BILINEAR)
+    pixels = np.asarray(gray, dtype=np.int16)
+    bits = pixels[:, 1:] > pixels[:, :-1]
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+def image_hash(source, hash_size: int = HASH_SIZE) -> Optional[int]:
+    """
+    dHash de um arquivo (caminho ou bytes) de imagem; None se não decodificar.
+
+    JPEGs são decodificados já reduzidos (draft), então o custo é uma fração
+    da decodificação completa feita para o OCR.
+    """
+    from PIL import Image, ImageOps
+
+    try:
+        image = Image.open(io.BytesIO(source) if isinstance(source, bytes) else source)
+        image.draft('L', (hash_size * 8, hash_size * 8))
+        return dhash(ImageOps.exif_transpose(image), hash_size)
+    except Exception as e:
+        print(f"⚠️ [VISUAL] Não foi possível calcular a assinatura visual: {e}")
+        return None
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class BKTree:
+    """
+    BK-tree sobre a distância de Hamming.
+
+    Cada nó guarda um hash e os valores associados a ele; os filhos são
+    indexados pela distância ao nó, e a desigualdade triangular poda as
+    subárvores fora de [d - raio, d + raio].
+    """
+
+    def __init__(self):
+        self._root: Optional[list] = None   # [hash, valores, {distância: filho}]
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, value_hash: int, value: Any):
+        self._size += 1
+        if self._root is None:
+            self._root = [value_hash, [value], {}]
+            return
+
+        node = self._root
+        while True:
+            distance = hamming(value_hash, node[0])
+            if distance == 0:
+                node[1].append(value)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [value_hash, [value], {}]
+                return
+            node = child
+
+    def search(self, value_hash: int, max_distance: int) -> List[Tuple[int, int, Any]]:
+        """(distância, hash, valor) de todos os itens a até `max_distance`, do mais próximo ao mais distante"""
+        found = []
+        stack = [self._root] if self._root is not None else []
+        while stack:
+            node = stack.pop()
+            distance = hamming(value_hash, node[0])
+            if distance <= max_distance:
+                found.extend((distance, node[0], value) for value in node[1])
+            for child_distance, child in node[2].items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    stack.append(child)
+
+        found.sort(key=lambda item: item[0])
+        return found
+
+
+@dataclass
+class VisualMatch:
+    company: str
+    distance: int        # Distância do vizinho mais próximo da transportadora escolhida
+    neighbours: int      # Vizinhos encontrados dentro do raio
+    agreement: float     # Fração dos vizinhos da transportadora escolhida
+
+
+class VisualSignatureIndex:
+    """
+    Índice das assinaturas visuais (tabela visual_hashes do SignatureStore).
+
+    A BK-tree acompanha a tabela em append: registros novos (gravados por
+    este processo ou, no modo somente leitura, pelo serviço de conhecimento)
+    são inseridos na próxima consulta.
+    """
+
+    def __init__(self, store, max_distance: Optional[int] = None, min_agreement: Optional[float] = None):
+        if max_distance is None:
+            max_distance = int(os.getenv('VISUAL_MATCH_DISTANCE', DEFAULT_MATCH_DISTANCE))
+        if min_agreement is None:
+            min_agreement = float(os.getenv('VISUAL_MIN_AGREEMENT', DEFAULT_MIN_AGREEMENT))
+
+        self.store = store
+        self.max_distance = max_distance
+        self.min_agreement = min_agreement
+
+        self._tree = BKTree()
+        self._indexed = 0
+
+        # Estatísticas
+        self.lookups = 0
+        self.hits = 0
+
+    def _sync(self):
+        rows = self.store.rows("visual_hashes")
+        for row in rows[self._indexed:]:
+            self._tree.add(int(row["hash"]), int(row["company"]))
+        self._indexed = len(rows)
+
+    def classify(self, value_hash: Optional[int]) -> Optional[VisualMatch]:
+        """Transportadora dos vizinhos mais próximos, se eles concordarem o suficiente"""
+        if value_hash is None:
+            return None
+
+        self._sync()
+        self.lookups += 1
+        found = self._tree.search(value_hash, self.max_distance)
+        if not found:
+            return None
+
+        votes = Counter(company_id for _, _, company_id in found)
+        company_id, count = votes.most_common(1)[0]
+        agreement = count / len(found)
+        if agreement < self.min_agreement:
+            return None
+
+        self.hits += 1
+        distance = next(distance for distance, _, value in found if value == company_id)
+        return VisualMatch(
+            company=self.store.company_name(company_id),
+            distance=distance,
+            neighbours=len(found),
+            agreement=agreement
+        )
+
+    def learn(self, value_hash: Optional[int], company: str) -> bool:
+        """Grava a assinatura da transportadora (exceto quase duplicatas de uma já gravada)"""
+        if value_hash is None:
+            return False
+
+        self._sync()
+        company_id = self.store.company_id(company)
+        for _, _, known_company in self._tree.search(value_hash, DUPLICATE_DISTANCE):
+            if known_company == company_id:
+                return False
+
+        self.store.add_visual_hash(company, value_hash)
+        self._sync()
+        return True
+
+    def stats(self):
+        return {
+            "signatures": self._indexed,
+            "max_distance": self.max_distance,
+            "lookups": self.lookups,
+            "hits": self.hits
+        }
@@ -4,8 +4,9 @@ Versão 2.0 com IA, aprendizado automático e validação multi-camadas
 """
 
 import os
+import argparse
 from datetime import datetime
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple
 
 # Importações do sistema base (mantidas para compatibilidade)
 from ocr_extractor import extract_ocr_data
@@ -15,17 +16,25 @@ from gps_vehicle_fetcher import get_vehicle_location
 from notifier import send_alert
 
 # 🧠 Importações do novo sistema inteligente
-from lib import tags_patterns, learning_engine, enhanced_validators
+# (instâncias criadas no primeiro uso: `--help` e o modo lote não carregam modelos nem rotas)
+from lib import get_tags_patterns, get_learning_engine, get_enhanced_validators
 from lib.tags_patterns import CompanyType
-from lib.validators import ValidationResult
+from lib.visual_hash import image_hash
 
 
-def process_intelligent_delivery(photo_path: str) -> Dict[str, Any]:
+def process_intelligent_delivery(photo_path: str, ocr_data: Optional[Dict[str, Any]] = None,
+                                 visual_hash: Optional[int] = None,
+                                 metadata: Optional[Dict[str, Any]] = None,
+                                 nearest_routes: Optional[List[Tuple[float, Dict]]] = None) -> Dict[str, Any]:
     """
     🧠 Processamento inteligente de entrega com aprendizado automático
     
     Args:
         photo_path: Caminho para o arquivo de imagem
+        ocr_data: Resultado de OCR já calculado (modo lote); se None, executa o OCR aqui
+        visual_hash: dHash da foto já calculado (modo lote); se None, é calculado aqui
+        metadata: Metadados EXIF já lidos (modo lote); se None, são lidos aqui
+        nearest_routes: Rotas mais próximas do GPS da foto, buscadas em lote; se None, busca aqui
         
     Returns:
         dict: Resultado completo da validação inteligente
@@ -42,7 +51,19 @@ def process_intelligent_delivery(photo_path: str) -> Dict[str, Any]:
     # ETAPA 1: OCR TRADICIONAL (Sistema Base)
     # ===========================================
     print("🔍 [DEBUG] Etapa 1: Extração OCR básica")
-    ocr_data = extract_ocr_data(photo_path)
+    
+    # Pré-classificação visual (dHash da foto reduzida): escolhe o perfil de OCR da transportadora
+    if visual_hash is None:
+        visual_hash = image_hash(photo_path)
+    visual_match = get_learning_engine().visual_recognition(visual_hash)
+    if visual_match:
+        print(f"👁️ [VISUAL] Transportadora pela assinatura visual: {visual_match.company} "
+              f"(distância {visual_match.distance}, {visual_match.agreement:.0%} de {visual_match.neighbours} vizinhos)")
+    
+    if ocr_data is None:
+        ocr_data = extract_ocr_data(photo_path, carrier=visual_match.company if visual_match else None)
+    else:
+        print("⚡ [DEBUG] OCR recebido do pool de processos (modo lote)")
     ocr_text = ocr_data.get("raw_text", "")
     
     print(f"📝 [OCR] Texto extraído: {len(ocr_text)} caracteres")
@@ -57,12 +78,12 @@ def process_intelligent_delivery(photo_path: str) -> Dict[str, Any]:
     print("🧠 [DEBUG] Etapa 2: Análise inteligente de padrões")
     
     # Verificar cache de reconhecimento rápido primeiro
-    quick_company = learning_engine.quick_recognition(ocr_text)
+    quick_company = get_learning_engine().quick_recognition(ocr_text)
     if quick_company:
         print(f"⚡ [CACHE] Reconhecimento instantâneo: {quick_company}")
     
     # Análise completa dos padrões
-    analysis_result = tags_patterns.analyze_full_text(ocr_text)
+    analysis_result = get_tags_patterns().analyze_full_text(ocr_text)
     
     print(f"🏢 [IA] Empresa detectada: {analysis_result['company'].company.value}")
     print(f"🎯 [IA] Confiança da empresa: {analysis_result['company'].confidence:.2f}")
@@ -78,7 +99,8 @@ def process_intelligent_delivery(photo_path: str) -> Dict[str, Any]:
     # ETAPA 3: METADADOS E GPS (Sistema Base)
     # ===========================================
     print("📱 [DEBUG] Etapa 3: Extração de metadados")
-    metadata = extract_metadata(photo_path)
+    if metadata is None:
+        metadata = extract_metadata(photo_path)
     
     print("🗺️ [DEBUG] Etapa 4: GPS do dispositivo")
     device_gps = metadata.get("gps") or get_device_location()
@@ -104,10 +126,11 @@ def process_intelligent_delivery(photo_path: str) -> Dict[str, Any]:
     validation_timestamp = metadata.get("datetime") or datetime.now()
     
     # Validação abrangente
-    validation_result: ValidationResult = enhanced_validators.comprehensive_validation(
+    validation_result = get_enhanced_validators().comprehensive_validation(
         analysis_result=analysis_result,
         device_gps=device_gps,
-        timestamp=validation_timestamp
+        timestamp=validation_timestamp,
+        nearest_routes=nearest_routes
     )
     
     print(f"✅ [VALIDAÇÃO] Entrega válida: {validation_result.is_valid}")
@@ -137,19 +160,20 @@ def process_intelligent_delivery(photo_path: str) -> Dict[str, Any]:
     route_match = validation_result.matched_route is not None
     
     # Processar sessão de aprendizado
-    learning_session = learning_engine.process_learning_session(
+    learning_session = get_learning_engine().process_learning_session(
         image_path=photo_path,
         ocr_text=ocr_text,
         analysis_result=analysis_result,
         gps_validation=gps_validation,
-        route_match=route_match
+        route_match=route_match,
+        visual_hash=visual_hash
     )
     
     print(f"🧠 [APRENDIZADO] Empresa: {learning_session.company_detected}")
     print(f"🧠 [APRENDIZADO] Resultado: {learning_session.learning_outcome}")
     
     # Mostrar estatísticas de aprendizado
-    learning_stats = learning_engine.get_learning_stats()
+    learning_stats = get_learning_engine().get_learning_stats()
     print(f"📈 [ESTATÍSTICAS] Total processado: {learning_stats['total_images_processed']}")
     print(f"📈 [ESTATÍSTICAS] Precisão atual: {learning_stats['recognition_accuracy']:.1f}%")
     print(f"📈 [ESTATÍSTICAS] Empresas aprendidas: {learning_stats['companies_learned']}")
@@ -195,6 +219,8 @@ def process_intelligent_delivery(photo_path: str) -> Dict[str, Any]:
         "data_fields_extracted": len(analysis_result['extracted_data']),
         "extracted_data": dict(analysis_result['extracted_data']),
         "overall_ai_confidence": analysis_result['overall_confidence'],
+        "visual_company": visual_match.company if visual_match else None,
+        "ocr_cached": bool(ocr_data.get("ocr_cached")),
         
         # Validação
         "is_valid": validation_result.is_valid,
@@ -221,16 +247,56 @@ def process_intelligent_delivery(photo_path: str) -> Dict[str, Any]:
     }
 
 
+def parse_args():
+    """Argumentos de linha de comando do sistema principal"""
+    parser = argparse.ArgumentParser(description="Sistema Inteligente de Validação de Entregas")
+    parser.add_argument(
+        "--image",
+        help="Imagem única a processar (padrão: DEBUG_IMAGE ou samples/test_001.jpg)"
+    )
+    parser.add_argument(
+        "--batch",
+        help="Modo lote: diretório, glob (ex: 'fotos/*.jpg') ou manifesto (.txt/.jsonl) com caminhos"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Número de processos de OCR no modo lote (padrão: núcleos da CPU)"
+    )
+    parser.add_argument(
+        "--output",
+        help="Arquivo JSONL de resultados do lote (padrão: data/batches/batch_<timestamp>.jsonl)"
+    )
+    parser.add_argument(
+        "--debug",
+        action="store_true",
+        help="Ativa breakpoints automáticos (equivalente a DEBUG_MODE=1)"
+    )
+    return parser.parse_args()
+
+
 def main():
     """Função principal do sistema inteligente"""
     
+    args = parse_args()
+    
+    if args.debug:
+        os.environ['DEBUG_MODE'] = '1'
+    
     print("="*60)
     print("🚚 SISTEMA INTELIGENTE DE VALIDAÇÃO DE ENTREGAS v2.0")
     print("🧠 Com aprendizado automático e IA de reconhecimento")
     print("="*60)
     
+    # Modo lote: OCR paralelo em processos, demais etapas no processo principal
+    if args.batch:
+        from batch_processor import process_batch
+        process_batch(args.batch, workers=args.workers, output_path=args.output)
+        return
+    
     # Verificar imagem de debug ou usar padrão
-    debug_image = os.getenv('DEBUG_IMAGE')
+    debug_image = args.image or os.getenv('DEBUG_IMAGE')
     
     if debug_image:
         path = debug_image
@@ -269,6 +335,8 @@ def main():
     print(f"   📋 Dados extraídos: {result['data_fields_extracted']} campos")
     print(f"   💯 IA Geral: {result['overall_ai_confidence']:.2f}")
     
+    print(f"   ⚡ OCR do cache (reenvio): {'sim' if result['ocr_cached'] else 'não'}")
+    
     # Seção: Validação
     print("\n🎯 VALIDAÇÃO MULTI-CAMADAS:")
     print(f"   ✅ Válida: {result['is_valid']}")
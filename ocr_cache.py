@@ -0,0 +1,222 @@
+# ocr_cache.py
+"""
+💾 Cache em disco de resultados de OCR
+
+Chave: SHA-256 dos bytes da imagem + idioma + config do OCR (motor, config do
+Tesseract, pré-processamento). O valor é o texto e a confiança informada pelo motor.
+Armazenamento: SQLite (WAL) compartilhado entre processos, com
+despejo LRU limitado por tamanho e contadores de hit/miss.
+"""
+
+import os
+import time
+import sqlite3
+import hashlib
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+# Incrementar quando o pipeline de OCR mudar de forma a invalidar resultados antigos
+OCR_CACHE_VERSION = "1"
+
+DEFAULT_CACHE_PATH = "data/cache/ocr_cache.sqlite"
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+class OCRCache:
+    """Cache LRU de texto OCR persistido em SQLite"""
+
+    def __init__(self, db_path: str = DEFAULT_CACHE_PATH, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+
+        # Contadores do processo atual (os totais persistidos ficam na tabela counters)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS ocr_results (
+                key TEXT PRIMARY KEY,
+                raw_text TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        # Caches criados antes da coluna de confiança
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(ocr_results)")}
+        if "confidence" not in columns:
+            self._conn.execute("ALTER TABLE ocr_results ADD COLUMN confidence REAL")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_ocr_results_last_access ON ocr_results(last_access)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        # Tamanho total mantido em counters a cada gravação; caches anteriores ao contador somam uma vez
+        self._conn.execute(
+            "INSERT OR IGNORE INTO counters(name, value) "
+            "SELECT 'size_bytes', COALESCE(SUM(size), 0) FROM ocr_results"
+        )
+
+    @staticmethod
+    def make_key(image_bytes: bytes, lang: str, config: str) -> str:
+        """Gera a chave do cache a partir do conteúdo da imagem e da configuração de OCR"""
+        digest = hashlib.sha256(image_bytes)
+        digest.update(f"|v{OCR_CACHE_VERSION}|{lang}|{config}".encode('utf-8'))
+        return digest.hexdigest()
+
+    def _bump(self, name: str, amount: int = 1):
+        self._conn.execute(
+            "INSERT INTO counters(name, value) VALUES(?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            (name, amount)
+        )
+
+    def get(self, key: str) -> Optional[str]:
+        """Retorna o texto em cache (atualizando o acesso LRU) ou None"""
+        entry = self.get_entry(key)
+        return entry[0] if entry else None
+
+    def get_entry(self, key: str) -> Optional[Tuple[str, Optional[float]]]:
+        """(texto, confiança) em cache (atualizando o acesso LRU) ou None"""
+        row = self._conn.execute("SELECT raw_text, confidence FROM ocr_results WHERE key = ?", (key,)).fetchone()
+
+        if row is None:
+            self.misses += 1
+            self._bump("misses")
+            return None
+
+        self.hits += 1
+        self._conn.execute(
+            "UPDATE ocr_results SET last_access = ?, hits = hits + 1 WHERE key = ?",
+            (time.time(), key)
+        )
+        self._bump("hits")
+        return row[0], row[1]
+
+    def put(self, key: str, raw_text: str, confidence: Optional[float] = None):
+        """Grava um resultado e despeja entradas antigas se o limite de tamanho for excedido"""
+        now = time.time()
+        size = len(raw_text.encode('utf-8'))
+
+        # Gravação e tamanho total na mesma transação (outros processos gravam no mesmo arquivo)
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            previous = self._conn.execute("SELECT size FROM ocr_results WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ocr_results(key, raw_text, size, created_at, last_access, hits, confidence) "
+                "VALUES(?, ?, ?, ?, ?, 0, ?)",
+                (key, raw_text, size, now, now, confidence)
+            )
+            self._bump("size_bytes", size - (previous[0] if previous else 0))
+            removed = self._evict_if_needed()
+            self._conn.execute("COMMIT")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+
+        if removed:
+            self.evictions += removed
+            print(f"[OCR-Cache] 🗑️ {removed} entradas despejadas (LRU)")
+
+    def _total_size(self) -> int:
+        """Tamanho total das entradas (contador mantido por put e pelo despejo)"""
+        row = self._conn.execute("SELECT value FROM counters WHERE name = 'size_bytes'").fetchone()
+        return row[0] if row else 0
+
+    def _evict_if_needed(self) -> int:
+        """
+        Despejo LRU até ficar em 90% do limite, pelas entradas mais antigas do
+        índice de last_access (sem varrer a tabela). Roda na transação de put.
+
+        Returns:
+            int: Entradas despejadas
+        """
+        total = self._total_size()
+        if total <= self.max_bytes:
+            return 0
+
+        target = int(self.max_bytes * 0.9)
+        removed = freed_total = 0
+        batch = 1
+        oldest = "SELECT {} FROM ocr_results ORDER BY last_access ASC LIMIT ?"
+
+        while total > target:
+            count, freed = self._conn.execute(
+                f"SELECT COUNT(*), COALESCE(SUM(size), 0) FROM ({oldest.format('size')})", (batch,)
+            ).fetchone()
+            if not count:
+                # Cache vazio: o contador volta a refletir a tabela
+                self._conn.execute("UPDATE counters SET value = 0 WHERE name = 'size_bytes'")
+                break
+            self._conn.execute(f"DELETE FROM ocr_results WHERE key IN ({oldest.format('key')})", (batch,))
+            self._bump("size_bytes", -freed)
+            total -= freed
+            removed += count
+            freed_total += freed
+            # Próximo lote estimado pelo tamanho médio das entradas já despejadas
+            batch = max(1, -(-(total - target) * removed // max(freed_total, 1)))
+
+        self._bump("evictions", removed)
+        return removed
+
+    def stats(self) -> Dict:
+        """Estatísticas do cache: processo atual e totais persistidos"""
+        entries = self._conn.execute("SELECT COUNT(*) FROM ocr_results").fetchone()[0]
+        totals = dict(self._conn.execute("SELECT name, value FROM counters").fetchall())
+        total_hits = totals.get("hits", 0)
+        total_lookups = total_hits + totals.get("misses", 0)
+
+        return {
+            "entries": entries,
+            "size_bytes": totals.get("size_bytes", 0),
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "total_hits": total_hits,
+            "total_misses": totals.get("misses", 0),
+            "total_evictions": totals.get("evictions", 0),
+            "hit_rate": (total_hits / total_lookups) if total_lookups else 0.0
+        }
+
+    def clear(self):
+        """Remove todas as entradas e zera os contadores"""
+        self._conn.execute("DELETE FROM ocr_results")
+        self._conn.execute("DELETE FROM counters")
+        self._bump("size_bytes", 0)
+        self.hits = self.misses = self.evictions = 0
+
+
+_cache: Optional[OCRCache] = None
+_cache_pid: Optional[int] = None
+
+
+def get_ocr_cache() -> Optional[OCRCache]:
+    """
+    Instância do cache para o processo atual (None se desativado).
+
+    Variáveis de ambiente:
+        OCR_CACHE=0            desativa o cache
+        OCR_CACHE_PATH=...     caminho do arquivo SQLite
+        OCR_CACHE_MAX_MB=256   limite de tamanho para despejo LRU
+    """
+    global _cache, _cache_pid
+
+    if os.getenv('OCR_CACHE', '1') == '0':
+        return None
+
+    # Conexões SQLite não podem ser herdadas via fork pelos workers do modo lote
+    if _cache is None or _cache_pid != os.getpid():
+        db_path = os.getenv('OCR_CACHE_PATH', DEFAULT_CACHE_PATH)
+        max_bytes = int(float(os.getenv('OCR_CACHE_MAX_MB', DEFAULT_MAX_BYTES / (1024 * 1024))) * 1024 * 1024)
+        try:
+            _cache = OCRCache(db_path, max_bytes=max_bytes)
+            _cache_pid = os.getpid()
+        except sqlite3.Error as e:
+            print(f"[OCR-Cache] ⚠️ Cache indisponível: {e}")
+            return None
+
+    return _cache
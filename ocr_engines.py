@@ -0,0 +1,405 @@
+# ocr_engines.py
+"""
+🔌 Motores de OCR plugáveis
+
+Cada motor (Tesseract, EasyOCR) implementa OCREngine.recognize() sobre uma
+imagem PIL e um OCRProfile (motor, idioma, config). Os motores ficam em um
+registro por processo: modelos são carregados uma vez por worker e
+reaproveitados entre as fotos.
+
+O OCRRouter monta o plano de OCR de cada foto, do mais barato ao mais caro:
+uma passada rápida em baixa resolução, a resolução cheia, a passada genérica
+por+eng, outro modo de segmentação, a foto sem o recorte da etiqueta e, por
+fim, os motores pesados. Cada passada só roda se a anterior não foi aceita
+(pouco texto, confiança baixa ou transportadora/campos obrigatórios não
+encontrados no texto). Fotos borradas vão direto para o motor pesado.
+
+recognize_tiled divide a etiqueta em blocos de texto e faz o OCR dos blocos
+em paralelo (threads persistentes), para reduzir o tempo de uma única foto,
+quando o ganho estimado pela área dos blocos compensa.
+"""
+
+import os
+import time
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, replace
+from typing import Callable, Dict, List, Optional, Tuple
+
+DEFAULT_LANG = 'por+eng'
+DEFAULT_CONFIG = '--psm 6'
+SPARSE_CONFIG = '--psm 11'     # Texto esparso: blocos soltos da etiqueta, sem ordem de leitura
+ERROR_TEXT = "[ERRO] Não foi possível extrair texto da imagem"
+TILE_PADDING = 10              # Borda branca em volta de cada bloco (o Tesseract erra texto colado na borda)
+DEFAULT_TILE_MIN_SPEEDUP = 1.5  # Ganho estimado mínimo para dividir a etiqueta em blocos
+
+
+@dataclass(frozen=True)
+class OCRProfile:
+    engine: str = "tesseract"
+    lang: str = DEFAULT_LANG
+    config: str = DEFAULT_CONFIG    # Config no formato da linha de comando do Tesseract
+    target_dpi: Optional[int] = None  # Resolução do pré-processamento (None: OCR_TARGET_DPI)
+    crop: bool = True                 # Recortar a região da etiqueta (se o pré-processamento recorta)
+
+    def __str__(self) -> str:
+        description = f"{self.engine} {self.lang} {self.config}".strip()
+        if self.target_dpi:
+            description += f" @{self.target_dpi}dpi"
+        if not self.crop:
+            description += " sem recorte"
+        return description
+
+
+@dataclass
+class OCRResult:
+    text: str
+    confidence: Optional[float] = None   # 0-1; None se o motor não informa
+    engine: str = ""
+    lang: str = ""
+
+    @property
+    def is_error(self) -> bool:
+        return self.text.startswith("[ERRO]")
+
+
+class OCREngine:
+    """Interface dos motores de OCR"""
+
+    name = ""
+    supports_tiles = False   # OCR por blocos faz sentido (o motor não segmenta a página sozinho)
+
+    def is_available(self) -> bool:
+        return True
+
+    def recognize(self, image, profile: OCRProfile, log: bool = True) -> OCRResult:
+        raise NotImplementedError
+
+    def warm_up(self, profile: OCRProfile):
+        """Carrega os modelos do perfil antes da primeira imagem"""
+
+
+ENGINE_CLASSES: Dict[str, type] = {}
+
+
+def register_engine(engine_class: type) -> type:
+    """Registra um motor pelo nome (usável como decorador)"""
+    ENGINE_CLASSES[engine_class.name] = engine_class
+    return engine_class
+
+
+@register_engine
+class TesseractEngine(OCREngine):
+    """
+    Tesseract via tesseract_pool.py (motores persistentes com tesserocr ou
+    pytesseract), com a cadeia de fallback de idiomas quando a chamada falha.
+    """
+
+    name = "tesseract"
+    supports_tiles = True
+
+    # Idiomas tentados, sem config, quando o anterior falha (None: padrão do Tesseract)
+    LANG_FALLBACKS = ('eng', None)
+
+    def is_available(self) -> bool:
+        return (importlib.util.find_spec("tesserocr") is not None
+                or importlib.util.find_spec("pytesseract") is not None)
+
+    def recognize(self, image, profile: OCRProfile, log: bool = True) -> OCRResult:
+        from tesseract_pool import get_tesseract
+
+        tesseract = get_tesseract()
+        attempts = [(profile.lang, profile.config)]
+        attempts += [(lang, '') for lang in self.LANG_FALLBACKS if lang != profile.lang]
+
+        for lang, config in attempts:
+            try:
+                # Confianças por palavra na mesma passada (sem rodar o Tesseract duas vezes)
+                text, confidence = tesseract.image_to_data(image, lang=lang, config=config)
+                if log:
+                    print(f"[OCR] ✅ OCR executado com sucesso ({lang or 'padrão'}, confiança "
+                          f"{'-' if confidence is None else f'{confidence:.0%}'})")
+                return OCRResult(text=text, confidence=confidence, engine=self.name, lang=lang or "")
+            except Exception as e:
+                print(f"[OCR] ⚠️ Tesseract falhou ({lang or 'padrão'}): {e}")
+
+        if log:
+            print("[OCR] ❌ Todas as tentativas do Tesseract falharam")
+        return OCRResult(text=ERROR_TEXT, confidence=0.0, engine=self.name, lang=profile.lang)
+
+    def warm_up(self, profile: OCRProfile):
+        from tesseract_pool import get_tesseract
+
+        get_tesseract().warm_up(profile.lang, profile.config)
+
+
+@register_engine
+class EasyOCREngine(OCREngine):
+    """
+    EasyOCR em CPU (detector + reconhecedor neurais): mais lento que o
+    Tesseract, mais robusto em fotos borradas, inclinadas ou com pouco
+    contraste. Um Reader por combinação de idiomas, carregado no primeiro uso.
+    """
+
+    name = "easyocr"
+
+    # Códigos de idioma do Tesseract -> EasyOCR
+    LANG_CODES = {"por": "pt", "eng": "en", "spa": "es"}
+
+    def __init__(self):
+        self._readers = {}
+
+    def is_available(self) -> bool:
+        return importlib.util.find_spec("easyocr") is not None
+
+    def _reader(self, lang: str):
+        langs = tuple(self.LANG_CODES.get(code, code) for code in lang.split('+') if code)
+        reader = self._readers.get(langs)
+        if reader is None:
+            import easyocr
+
+            started = time.perf_counter()
+            reader = easyocr.Reader(list(langs), gpu=False, verbose=False)
+            print(f"[OCR] 🧠 Modelos do EasyOCR carregados ({'+'.join(langs)}) em {time.perf_counter() - started:.2f}s")
+            self._readers[langs] = reader
+        return reader
+
+    @staticmethod
+    def _join_lines(detections) -> str:
+        """Agrupa as caixas detectadas em linhas (pela altura) e as linhas em texto"""
+        boxes = []
+        for bbox, text, _ in detections:
+            ys = [point[1] for point in bbox]
+            xs = [point[0] for point in bbox]
+            boxes.append((min(ys), max(ys), min(xs), text))
+        boxes.sort()
+
+        lines: List[list] = []
+        for top, bottom, left, text in boxes:
+            middle = (top + bottom) / 2
+            if lines and middle <= lines[-1][0]:
+                lines[-1][1].append((left, text))
+                lines[-1][0] = max(lines[-1][0], bottom)
+            else:
+                lines.append([bottom, [(left, text)]])
+
+        return "\n".join(" ".join(text for _, text in sorted(words)) for _, words in lines)
+
+    def recognize(self, image, profile: OCRProfile, log: bool = True) -> OCRResult:
+        import numpy as np
+
+        try:
+            detections = self._reader(profile.lang).readtext(np.asarray(image), detail=1)
+        except Exception as e:
+            print(f"[OCR] ❌ EasyOCR falhou: {e}")
+            return OCRResult(text=ERROR_TEXT, confidence=0.0, engine=self.name, lang=profile.lang)
+
+        if log:
+            print(f"[OCR] ✅ EasyOCR executado com sucesso ({profile.lang})")
+        confidence = sum(score for _, _, score in detections) / len(detections) if detections else 0.0
+        return OCRResult(text=self._join_lines(detections), confidence=float(confidence),
+                         engine=self.name, lang=profile.lang)
+
+    def warm_up(self, profile: OCRProfile):
+        self._reader(profile.lang)
+
+
+_engines: Dict[str, OCREngine] = {}
+_engines_pid: Optional[int] = None
+
+
+def get_engine(name: str) -> Optional[OCREngine]:
+    """Instância do motor no processo atual (None se desconhecido ou não instalado)"""
+    global _engines, _engines_pid
+
+    # Modelos e conexões não são herdados via fork: cada worker carrega os seus
+    if _engines_pid != os.getpid():
+        _engines = {}
+        _engines_pid = os.getpid()
+
+    if name not in _engines:
+        engine_class = ENGINE_CLASSES.get(name)
+        engine = engine_class() if engine_class else None
+        if engine is None or not engine.is_available():
+            print(f"[OCR] ⚠️ Motor de OCR indisponível: {name}")
+            engine = None
+        _engines[name] = engine
+
+    return _engines[name]
+
+
+_tile_pool: Optional[ThreadPoolExecutor] = None
+_tile_pool_key: Optional[Tuple[int, int]] = None
+
+
+def get_tile_pool(workers: int) -> ThreadPoolExecutor:
+    """
+    Threads do OCR por blocos no processo atual. São reaproveitadas entre as
+    fotos: os motores do Tesseract (por thread) continuam carregados.
+    """
+    global _tile_pool, _tile_pool_key
+
+    if _tile_pool is None or _tile_pool_key != (os.getpid(), workers):
+        _tile_pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ocr-tile")
+        _tile_pool_key = (os.getpid(), workers)
+    return _tile_pool
+
+
+def estimated_tile_speedup(blocks: List[Tuple[int, int, int, int]], workers: int) -> float:
+    """
+    Ganho ideal do OCR por blocos em `workers` threads, supondo o tempo do
+    OCR proporcional à área: área total / área da thread mais carregada
+    (maior bloco primeiro, sempre para a thread menos carregada).
+    """
+    areas = sorted((width * height for _, _, width, height in blocks), reverse=True)
+    if not areas or workers < 2:
+        return 1.0
+
+    loads = [0] * min(workers, len(areas))
+    for area in areas:
+        loads[loads.index(min(loads))] += area
+    return sum(areas) / max(loads)
+
+
+def recognize_tiled(engine: OCREngine, image, profile: OCRProfile, workers: int, max_blocks: int = 12,
+                    min_speedup: float = DEFAULT_TILE_MIN_SPEEDUP) -> OCRResult:
+    """
+    OCR por blocos de texto em paralelo, com o texto remontado em ordem de
+    leitura. Com menos de dois blocos (ou sem OpenCV), ou se um bloco domina a
+    etiqueta (ganho estimado abaixo de `min_speedup`), OCR da imagem inteira.
+    """
+    from PIL import ImageOps
+
+    try:
+        from ocr_preprocess import find_text_blocks
+        blocks = find_text_blocks(image, max_blocks)
+    except ImportError as e:
+        print(f"[OCR] ⚠️ Segmentação em blocos indisponível (OpenCV): {e}")
+        blocks = []
+
+    if len(blocks) < 2:
+        return engine.recognize(image, profile)
+
+    speedup = estimated_tile_speedup(blocks, workers)
+    if speedup < min_speedup:
+        print(f"[OCR] 🧩 {len(blocks)} blocos, ganho estimado {speedup:.2f}x em {workers} threads - "
+              f"OCR da etiqueta inteira")
+        return engine.recognize(image, profile)
+
+    fill = 255 if image.mode == 'L' else 'white'
+    tiles = [
+        ImageOps.expand(image.crop((x, y, x + width, y + height)), border=TILE_PADDING, fill=fill)
+        for x, y, width, height in blocks
+    ]
+
+    started = time.perf_counter()
+    pool = get_tile_pool(workers)
+    results = list(pool.map(lambda tile: engine.recognize(tile, profile, log=False), tiles))
+    usable = [result for result in results if not result.is_error and result.text.strip()]
+    print(f"[OCR] 🧩 {len(tiles)} blocos de texto em {min(workers, len(tiles))} threads "
+          f"({engine.name} {profile.lang}, ganho estimado {speedup:.2f}x): {time.perf_counter() - started:.2f}s")
+
+    if not usable:
+        if all(result.is_error for result in results):
+            return OCRResult(text=ERROR_TEXT, confidence=0.0, engine=engine.name, lang=profile.lang)
+        return OCRResult(text="", confidence=None, engine=engine.name, lang=profile.lang)
+
+    # Confiança do conjunto: média dos blocos ponderada pelo tamanho do texto
+    weighted = [(len(result.text.strip()), result.confidence) for result in usable if result.confidence is not None]
+    total = sum(size for size, _ in weighted)
+    confidence = sum(size * value for size, value in weighted) / total if total else None
+
+    return OCRResult(
+        text="\n".join(result.text.strip() for result in usable),
+        confidence=confidence,
+        engine=engine.name,
+        lang=usable[0].lang
+    )
+
+
+@dataclass
+class OCRRouter:
+    """
+    Plano de OCR por foto e critério de aceitação de cada resultado.
+
+    Passadas, da mais barata à mais cara (repetidas são omitidas):
+        1. perfil principal (transportadora ou genérico) em `fast_dpi`
+        2. perfil principal na resolução cheia
+        3. perfil genérico (por+eng)
+        4. perfil genérico com `sparse_config` (outro modo de segmentação)
+        5. perfil genérico sem o recorte da etiqueta
+        6. perfis de escalonamento (motores pesados)
+    Só as `max_passes` primeiras passadas leves (1-5) entram no plano. Os
+    motores pesados só rodam se o melhor resultado até ali não for confiável
+    (ver `should_escalate`); com nitidez abaixo de `blur_threshold`, vão para
+    o início.
+
+    `content_check(texto)` -> (completo, pontuação) verifica o conteúdo
+    (transportadora e campos obrigatórios); sem ele, só texto e confiança
+    são avaliados. Conteúdo incompleto leva à próxima passada leve, mas não
+    ao motor pesado: etiquetas sem CEP ou de transportadora desconhecida
+    continuam sem eles depois de outro OCR.
+    """
+
+    default_profile: OCRProfile = field(default_factory=OCRProfile)
+    carrier_profiles: Dict[str, OCRProfile] = field(default_factory=dict)
+    escalation: List[OCRProfile] = field(default_factory=list)
+    min_text: int = 20
+    min_confidence: float = 0.6
+    blur_threshold: float = 0.0
+    fast_dpi: Optional[int] = None
+    max_passes: Optional[int] = None
+    sparse_config: str = SPARSE_CONFIG
+    content_check: Optional[Callable[[str], Tuple[bool, float]]] = None
+
+    def plan(self, carrier: Optional[str] = None, sharpness: Optional[float] = None) -> List[OCRProfile]:
+        primary = self.carrier_profiles.get(carrier, self.default_profile)
+        generic = self.default_profile
+
+        profiles = [primary, generic, replace(generic, config=self.sparse_config), replace(generic, crop=False)]
+        if self.fast_dpi:
+            profiles.insert(0, replace(primary, target_dpi=self.fast_dpi))
+
+        light = []
+        for profile in profiles:
+            if profile not in light and get_engine(profile.engine):
+                light.append(profile)
+        light = light[:self.max_passes or None]
+
+        escalation = [profile for profile in self.escalation if get_engine(profile.engine) and profile not in light]
+        if sharpness is not None and sharpness < self.blur_threshold:
+            return escalation + light
+        return light + escalation
+
+    def should_escalate(self, result: Optional[OCRResult]) -> bool:
+        """Motor pesado só para resultados não confiáveis: erro, pouco texto ou confiança baixa"""
+        if result is None or result.is_error:
+            return True
+        if len(result.text.strip()) < self.min_text:
+            return True
+        return result.confidence is not None and result.confidence < self.min_confidence
+
+    def uses_sharpness(self) -> bool:
+        """A nitidez da foto só muda o plano se houver um motor pesado disponível"""
+        return self.blur_threshold > 0 and any(get_engine(profile.engine) for profile in self.escalation)
+
+    def assess(self, result: OCRResult) -> Tuple[bool, tuple]:
+        """
+        (aceito, pontuação) do resultado. Aceito encerra o plano; sem nenhum
+        aceito, fica o resultado de maior pontuação.
+        """
+        if result.is_error:
+            return False, (False,)
+
+        enough_text = len(result.text.strip()) >= self.min_text
+        confident = result.confidence is None or result.confidence >= self.min_confidence
+        complete, content_score = self.content_check(result.text) if self.content_check else (True, 0.0)
+
+        accepted = enough_text and confident and complete
+        # Um resultado aceito sempre supera os anteriores (não aceitos)
+        score = (accepted, True, content_score, result.confidence or 0.0, len(result.text.strip()))
+        return accepted, score
+
+    def accept(self, result: OCRResult) -> bool:
+        """Resultado bom o bastante para encerrar o plano"""
+        return self.assess(result)[0]
@@ -1,73 +1,272 @@
 # ocr_extractor.py
-import pytesseract
-from PIL import Image
-import numpy as np
+# Os motores de OCR (ocr_engines.py) e o PIL são carregados só quando o OCR roda de fato
+# (acertos do cache e processos que só importam o módulo não pagam esse custo)
 import re
 import io
-import tempfile
 import os
+from dataclasses import replace
 
-def extract_ocr_data(image_path):
+from ocr_cache import OCRCache, get_ocr_cache
+from ocr_engines import DEFAULT_TILE_MIN_SPEEDUP, OCRProfile, OCRResult, OCRRouter, get_engine, recognize_tiled
+from ocr_preprocess import image_sharpness, preprocess_config, preprocess_for_ocr
+
+# Configuração principal do Tesseract (também compõe a chave do cache)
+OCR_LANG = 'por+eng'
+OCR_CONFIG = '--psm 6'
+DEFAULT_OCR_PROFILE = OCRProfile("tesseract", OCR_LANG, OCR_CONFIG)
+
+# Perfis por transportadora, usados quando a assinatura visual da foto já
+# identificou a etiqueta: um único idioma no lugar da passada genérica por+eng
+CARRIER_OCR_PROFILES = {
+    "amazon": OCRProfile("tesseract", 'por', '--psm 6'),
+    "correios": OCRProfile("tesseract", 'por', '--psm 6'),
+    "mercado_livre": OCRProfile("tesseract", 'por', '--psm 6'),
+    "jadlog": OCRProfile("tesseract", 'por', '--psm 6'),
+}
+# Abaixo disso o texto de um perfil é descartado e o próximo perfil do plano roda
+CARRIER_MIN_TEXT = 20
+
+# Motores pesados, usados quando o resultado tem confiança baixa ou a foto está borrada
+DEFAULT_ESCALATION = "easyocr"
+DEFAULT_MIN_CONFIDENCE = 0.6
+DEFAULT_BLUR_THRESHOLD = 100.0  # Variância do Laplaciano (ver image_sharpness)
+
+# Primeira passada em baixa resolução: etiquetas limpas terminam aqui
+DEFAULT_FAST_DPI = 200
+# Passadas leves (Tesseract) por foto; o motor pesado não entra na conta
+DEFAULT_MAX_PASSES = 2
+# Campos que o texto precisa conter (além da transportadora) para encerrar o plano
+DEFAULT_REQUIRED_FIELDS = "cep"
+
+# OCR dos blocos de texto da etiqueta em paralelo (desativado por padrão)
+DEFAULT_TILE_MAX_BLOCKS = 12
+
+# Threads do OCR por blocos por processo (definido pelos workers do modo lote)
+_tile_thread_limit = None
+
+
+def carrier_ocr_profile(carrier=None):
+    """Perfil de OCR da transportadora pré-classificada (ou o padrão)"""
+    return CARRIER_OCR_PROFILES.get(carrier, DEFAULT_OCR_PROFILE)
+
+
+def label_content_check(required_fields):
+    """
+    Verificação do conteúdo lido: transportadora identificada e campos
+    obrigatórios extraídos (TagsPatterns, carregado no primeiro uso).
+    """
+    def check(text):
+        from lib.tags_patterns import CompanyType, get_tags_patterns
+
+        patterns = get_tags_patterns()
+        company_found = patterns.identify_company(text).company != CompanyType.UNKNOWN
+        extracted = patterns.extract_all(text)
+        missing = [name for name in required_fields if name not in extracted]
+
+        score = company_found + (len(required_fields) - len(missing)) + 0.1 * len(extracted)
+        return company_found and not missing, score
+
+    return check
+
+
+def ocr_router():
     """
-    Aplica OCR real na imagem usando pytesseract para extrair texto livre.
+    Roteador de OCR a partir das variáveis de ambiente:
+        OCR_ESCALATION=easyocr      motores pesados, em ordem (vazio desativa)
+        OCR_MIN_CONFIDENCE=0.6      confiança mínima (por palavra) para aceitar um resultado
+        OCR_BLUR_THRESHOLD=100      nitidez abaixo da qual o motor pesado roda primeiro
+        OCR_FAST_DPI=200            resolução da primeira passada (0 desativa)
+        OCR_MAX_PASSES=2            passadas leves por foto (0 = todas as do plano)
+        OCR_REQUIRED_FIELDS=cep     campos obrigatórios no texto, além da transportadora
+        OCR_CONTENT_CHECK=0         aceita pelo texto e confiança, sem analisar o conteúdo
+    """
+    escalation = [
+        OCRProfile(name.strip(), OCR_LANG, '')
+        for name in os.getenv('OCR_ESCALATION', DEFAULT_ESCALATION).split(',') if name.strip()
+    ]
+    return OCRRouter(
+        default_profile=DEFAULT_OCR_PROFILE,
+        carrier_profiles=CARRIER_OCR_PROFILES,
+        escalation=escalation,
+        min_text=CARRIER_MIN_TEXT,
+        min_confidence=float(os.getenv('OCR_MIN_CONFIDENCE', DEFAULT_MIN_CONFIDENCE)),
+        blur_threshold=float(os.getenv('OCR_BLUR_THRESHOLD', DEFAULT_BLUR_THRESHOLD)),
+        fast_dpi=int(os.getenv('OCR_FAST_DPI', DEFAULT_FAST_DPI)) or None,
+        max_passes=int(os.getenv('OCR_MAX_PASSES', DEFAULT_MAX_PASSES)) or None,
+        content_check=None if os.getenv('OCR_CONTENT_CHECK', '1') == '0' else label_content_check(
+            [name.strip() for name in os.getenv('OCR_REQUIRED_FIELDS', DEFAULT_REQUIRED_FIELDS).split(',')
+             if name.strip()]
+        )
+    )
+
+
+def _decode_image(image_bytes):
+    """
+    Decodifica a imagem em memória, em RGB.
+
+    MPO (fotos de celular com várias imagens no mesmo arquivo) é um JPEG com
+    quadros extras: usa-se o quadro principal, já decodificado, sem regravar
+    nem reabrir um JPEG temporário.
+    """
+    from PIL import Image
+
+    image = Image.open(io.BytesIO(image_bytes))
+    print(f"[OCR] Imagem carregada: {image.format}, {image.size}, {image.mode}")
+    
+    if image.format == 'MPO':
+        print(f"[OCR] Formato MPO detectado ({getattr(image, 'n_frames', 1)} quadros) - usando o quadro principal")
+        image.seek(0)
+    
+    # Converter para RGB se necessário (para compatibilidade)
+    if image.mode != 'RGB':
+        print(f"[OCR] Convertendo de {image.mode} para RGB")
+        image = image.convert('RGB')
+    else:
+        image.load()
+    
+    return image
+
+
+def limit_tile_threads(threads):
     """
-    print("[OCR] Usando Tesseract para extrair texto da imagem...")
+    Limita as threads do OCR por blocos deste processo. Os workers do modo
+    lote já ocupam os núcleos: cada um recebe núcleos // workers, e com menos
+    de 2 threads o OCR por blocos fica desativado no worker.
+    """
+    global _tile_thread_limit
+    _tile_thread_limit = threads
+
+
+def ocr_tiling():
+    """
+    (threads, máximo de blocos, ganho mínimo) do OCR por blocos em paralelo, ou None:
+        OCR_TILES=1                    ativa (motores que não segmentam a página: Tesseract)
+        OCR_TILE_WORKERS=<núcleos>     threads por foto (no modo lote, no máximo núcleos // workers)
+        OCR_TILE_MAX=12                acima disso os blocos são agrupados (ou OCR da imagem inteira)
+        OCR_TILE_MIN_SPEEDUP=1.5       ganho estimado mínimo (área dos blocos) para dividir a etiqueta
+    """
+    if os.getenv('OCR_TILES', '0') != '1':
+        return None
+    workers = max(1, int(os.getenv('OCR_TILE_WORKERS', os.cpu_count() or 1)))
+    if _tile_thread_limit is not None:
+        workers = min(workers, _tile_thread_limit)
+    if workers < 2:
+        return None
+    return (workers, int(os.getenv('OCR_TILE_MAX', DEFAULT_TILE_MAX_BLOCKS)),
+            float(os.getenv('OCR_TILE_MIN_SPEEDUP', DEFAULT_TILE_MIN_SPEEDUP)))
+
+
+def _profile_preprocess(preprocess, profile):
+    """Pré-processamento da passada: resolução e recorte do perfil sobre a configuração base"""
+    steps = preprocess.steps if profile.crop else tuple(step for step in preprocess.steps if step != "roi")
+    return replace(preprocess, steps=steps, target_dpi=profile.target_dpi or preprocess.target_dpi)
+
+
+def _cached_ocr(image_bytes, profile, load_image, preprocess, tiling=None):
+    """
+    OCR com cache pelo conteúdo: reenvios da mesma foto não repetem o OCR.
+
+    Returns:
+        tuple: (OCRResult, True se veio do cache)
+    """
+    engine = get_engine(profile.engine)
+    tiling = tiling if engine.supports_tiles else None
+    
+    cache = get_ocr_cache()
+    # O texto depende do motor, do pré-processamento e da divisão em blocos: todos entram na chave
+    cache_config = f"{profile.engine}|{profile.config}|{preprocess.signature()}"
+    if tiling:
+        cache_config += f"|blocos<={tiling[1]},ganho>={tiling[2]}"
+    cache_key = OCRCache.make_key(image_bytes, profile.lang, cache_config) if cache else None
+    entry = cache.get_entry(cache_key) if cache else None
+    
+    if entry is not None:
+        print(f"[OCR] ⚡ Texto recuperado do cache (mesmo conteúdo de imagem, {profile.engine})")
+        return OCRResult(text=entry[0], confidence=entry[1], engine=profile.engine, lang=profile.lang), True
+    
+    if tiling:
+        workers, max_blocks, min_speedup = tiling
+        result = recognize_tiled(engine, load_image(preprocess), profile, workers, max_blocks, min_speedup)
+    else:
+        result = engine.recognize(load_image(preprocess), profile)
+    if cache and not result.is_error:
+        cache.put(cache_key, result.text, result.confidence)
+    return result, False
+
+
+def extract_ocr_data(image_path, carrier=None):
+    """
+    Aplica OCR real na imagem para extrair texto livre.
+    Resultados ficam em cache pelo hash do conteúdo da imagem (ver ocr_cache.py).
+    
+    O roteador (ver ocr_engines.py) define o plano, da passada mais barata à
+    mais cara: até OCR_MAX_PASSES passadas leves (baixa resolução, resolução
+    cheia, ...) e os motores pesados (EasyOCR). Cada passada só roda se a
+    anterior não foi aceita: pouco texto, confiança média das palavras baixa,
+    ou transportadora/campos obrigatórios não encontrados. Os motores pesados
+    só rodam se o melhor resultado tiver pouco texto ou confiança baixa.
+    A imagem é decodificada uma única vez, no primeiro OCR sem cache.
+    """
+    print("[OCR] Usando motores de OCR para extrair texto da imagem...")
     print(f"[OCR] Processando arquivo: {image_path}")
 
     try:
-        # Abrir a imagem
-        image = Image.open(image_path)
-        print(f"[OCR] Imagem carregada: {image.format}, {image.size}, {image.mode}")
+        with open(image_path, 'rb') as f:
+            image_bytes = f.read()
         
-        # 🔧 CONVERSÃO MPO → JPEG se necessário
-        if image.format == 'MPO':
-            print("[OCR] ⚠️ Formato MPO detectado - convertendo para JPEG...")
-            
-            # Converter para RGB se necessário
-            if image.mode != 'RGB':
-                print(f"[OCR] Convertendo de {image.mode} para RGB")
-                image = image.convert('RGB')
-            
-            # Criar arquivo temporário JPEG
-            with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as temp_file:
-                temp_path = temp_file.name
-                image.save(temp_path, 'JPEG', quality=95)
-                print(f"[OCR] ✅ MPO convertido para JPEG temporário: {temp_path}")
-            
-            # Reabrir como JPEG
-            image = Image.open(temp_path)
-            print(f"[OCR] ✅ Imagem recarregada: {image.format}, {image.size}, {image.mode}")
+        router = ocr_router()
+        sharpness = image_sharpness(image_bytes) if router.uses_sharpness() else None
+        plan = router.plan(carrier, sharpness)
+        if carrier in CARRIER_OCR_PROFILES:
+            print(f"[OCR] 👁️ Perfil da transportadora {carrier}: {CARRIER_OCR_PROFILES[carrier]}")
+        if sharpness is not None and sharpness < router.blur_threshold:
+            print(f"[OCR] 🌫️ Foto pouco nítida ({sharpness:.0f}) - motor pesado primeiro")
+        
+        base_preprocess = preprocess_config()
+        tiling = ocr_tiling()
+        decoded = []
+        prepared = {}
+        
+        def load_image(preprocess):
+            # 🔧 Recorte da etiqueta, redução para a resolução alvo, deskew e binarização
+            if not decoded:
+                decoded.append(_decode_image(image_bytes))
+            if preprocess not in prepared:
+                prepared[preprocess] = preprocess_for_ocr(decoded[0], preprocess)
+            return prepared[preprocess]
+        
+        best, best_score, accepted = None, None, False
+        passes = cached_passes = 0
+        seen = set()
+        failed_engines = set()
+        for profile in plan:
+            preprocess = _profile_preprocess(base_preprocess, profile)
+            signature = (profile.engine, profile.lang, profile.config, preprocess)
+            # Passadas repetidas, ou de um motor que falhou em todas as tentativas, não rodam
+            if signature in seen or profile.engine in failed_engines:
+                continue
+            # Conteúdo incompleto com texto confiável não justifica o motor pesado
+            if passes and profile in router.escalation and not router.should_escalate(best):
+                break
+            seen.add(signature)
             
-            # Usar o arquivo temporário para OCR
-            ocr_image_path = temp_path
-        else:
-            # Converter para RGB se necessário (para compatibilidade)
-            if image.mode != 'RGB':
-                print(f"[OCR] Convertendo de {image.mode} para RGB")
-                image = image.convert('RGB')
-            ocr_image_path = image_path
+            if passes:
+                print(f"[OCR] 🪜 Resultado insuficiente - nova passada: {profile}")
+            passes += 1
+            result, cached = _cached_ocr(image_bytes, profile, load_image, preprocess, tiling)
+            cached_passes += cached
+            if result.is_error:
+                failed_engines.add(profile.engine)
+            accepted, score = router.assess(result)
+            if best is None or score > best_score:
+                best, best_score = result, score
+            if accepted:
+                break
         
-        # Tentar OCR com diferentes configurações
-        try:
-            # Primeira tentativa com configuração padrão
-            print(f"[OCR] Info da imagem: {image.info}")
-            raw_text = pytesseract.image_to_string(image, lang='por+eng', config='--psm 6')
-            print("[OCR] ✅ OCR executado com sucesso (por+eng)")
-        except Exception as e1:
-            print(f"[OCR] ⚠️ Primeira tentativa falhou: {e1}")
-            try:
-                # Segunda tentativa apenas com inglês
-                raw_text = pytesseract.image_to_string(image, lang='eng')
-                print("[OCR] ✅ OCR executado com sucesso (eng)")
-            except Exception as e2:
-                print(f"[OCR] ⚠️ Segunda tentativa falhou: {e2}")
-                try:
-                    # Terceira tentativa sem especificar idioma
-                    raw_text = pytesseract.image_to_string(image)
-                    print("[OCR] ✅ OCR executado com sucesso (padrão)")
-                except Exception as e3:
-                    print(f"[OCR] ❌ Todas as tentativas falharam: {e3}")
-                    raw_text = "[ERRO] Não foi possível extrair texto da imagem"
+        if not accepted:
+            print(f"[OCR] ⚠️ Nenhuma das {passes} passadas foi aceita - usando a melhor ({best.engine} {best.lang})")
+        result = best
+        raw_text = result.text
 
         print("[OCR] Texto extraído:")
         print(raw_text)
@@ -79,23 +278,19 @@ def extract_ocr_data(image_path):
         endereco_match = re.search(r'Rua\s+[\w\s]+,\s*\d+.*', raw_text)
 
         # Aqui você pode usar regex para extrair NF, endereço, etc.
-        result = {
+        return {
             "nf_number": nf_match.group(1) if nf_match else "NF_NOT_FOUND",
             "route_number": rota_match.group(1) if rota_match else "R_NOT_FOUND",
             "address": endereco_match.group(0) if endereco_match else "ADDRESS_NOT_FOUND",
-            "raw_text": raw_text
+            "raw_text": raw_text,
+            "ocr_lang": result.lang,
+            "ocr_engine": result.engine,
+            "ocr_confidence": result.confidence,
+            "ocr_passes": passes,
+            # Todas as passadas vieram do cache: reenvio da foto, sem nenhuma chamada de OCR
+            "ocr_cached": cached_passes == passes
         }
         
-        # 🗑️ Limpar arquivo temporário se foi criado
-        if image.format == 'JPEG' and 'temp_path' in locals():
-            try:
-                os.unlink(temp_path)
-                print(f"[OCR] 🗑️ Arquivo temporário removido: {temp_path}")
-            except:
-                pass
-        
-        return result
-        
     except Exception as e:
         print(f"[OCR] ❌ Erro ao processar imagem: {e}")
         return {
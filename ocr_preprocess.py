@@ -0,0 +1,323 @@
+# ocr_preprocess.py
+"""
+🔧 Pré-processamento da imagem antes do Tesseract
+
+O tempo do Tesseract cresce com o número de pixels, e as fotos chegam em
+resolução de câmera (3024x4032 no iPhone) com a etiqueta ocupando só parte
+do quadro. Etapas (OpenCV, importado no primeiro uso):
+
+    roi        recorta a região da etiqueta (papel claro sobre a caixa)
+    downscale  reduz a etiqueta para a resolução alvo (OCR_TARGET_DPI)
+    deskew     corrige a inclinação das linhas de texto
+    threshold  binarização adaptativa (sombras e iluminação irregular)
+
+A imagem é convertida para escala de cinza antes de qualquer etapa.
+find_text_blocks segmenta a etiqueta em blocos de texto para o OCR em
+paralelo (ver ocr_engines.recognize_tiled).
+"""
+
+import os
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+PREPROCESS_STEPS = ("roi", "downscale", "deskew", "threshold")
+DEFAULT_TARGET_DPI = 300
+DEFAULT_LABEL_INCHES = 6.0     # Lado maior da etiqueta padrão 4x6"
+
+ROI_DETECTION_SIDE = 640       # Lado maior da cópia usada para achar a etiqueta
+ROI_MIN_AREA = 0.10            # Fração do quadro: abaixo disso não é a etiqueta
+ROI_MAX_AREA = 0.90            # Acima disso a etiqueta já ocupa o quadro (sem recorte)
+ROI_MARGIN = 0.03              # Margem em volta da região detectada
+
+SKEW_DETECTION_SIDE = 600
+SKEW_MAX_ANGLE = 10.0          # Graus testados em cada sentido
+SKEW_STEP = 0.5
+SKEW_MIN_ANGLE = 0.5           # Inclinações menores não são corrigidas
+
+SHARPNESS_SIDE = 512           # Lado maior da cópia usada para medir a nitidez
+
+# Segmentação em blocos de texto (OCR em paralelo por bloco)
+CHAR_MIN_HEIGHT = 0.006        # Altura de um caractere, em fração da altura da imagem
+CHAR_MAX_HEIGHT = 0.06
+CHAR_MAX_WIDTH = 0.2           # Componentes mais largos são bordas, linhas ou código de barras
+BLOCK_MIN_CHARS = 3            # Blocos com menos caracteres são ruído (textura da caixa)
+
+
+@dataclass(frozen=True)
+class PreprocessConfig:
+    steps: Tuple[str, ...] = PREPROCESS_STEPS
+    target_dpi: int = DEFAULT_TARGET_DPI
+    label_inches: float = DEFAULT_LABEL_INCHES
+
+    @property
+    def target_pixels(self) -> int:
+        """Lado maior da etiqueta, em pixels, na resolução alvo"""
+        return int(self.target_dpi * self.label_inches)
+
+    def signature(self) -> str:
+        """Identifica a configuração na chave do cache de OCR"""
+        if not self.steps:
+            return "raw"
+        return f"{'+'.join(self.steps)}@{self.target_dpi}dpi/{self.label_inches:g}in"
+
+
+def preprocess_config() -> PreprocessConfig:
+    """
+    Configuração a partir das variáveis de ambiente:
+        OCR_PREPROCESS=roi,downscale,deskew,threshold   etapas (0 desativa)
+        OCR_TARGET_DPI=300                              resolução alvo da etiqueta
+        OCR_LABEL_INCHES=6                              lado maior da etiqueta (polegadas)
+    """
+    raw_steps = os.getenv('OCR_PREPROCESS', ','.join(PREPROCESS_STEPS))
+    requested = set() if raw_steps.strip() == '0' else {
+        step.strip().lower() for step in raw_steps.split(',') if step.strip()
+    }
+
+    unknown = requested - set(PREPROCESS_STEPS)
+    if unknown:
+        print(f"[OCR] ⚠️ Etapas de pré-processamento desconhecidas ignoradas: {', '.join(sorted(unknown))}")
+
+    return PreprocessConfig(
+        steps=tuple(step for step in PREPROCESS_STEPS if step in requested),
+        target_dpi=int(os.getenv('OCR_TARGET_DPI', DEFAULT_TARGET_DPI)),
+        label_inches=float(os.getenv('OCR_LABEL_INCHES', DEFAULT_LABEL_INCHES))
+    )
+
+
+def _resize_long_side(gray, long_side: int):
+    import cv2
+
+    height, width = gray.shape[:2]
+    scale = long_side / max(height, width)
+    if scale >= 1:
+        return gray, 1.0
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    return cv2.resize(gray, size, interpolation=cv2.INTER_AREA), scale
+
+
+def find_label_roi(gray) -> Optional[Tuple[int, int, int, int]]:
+    """
+    (x, y, largura, altura) da etiqueta na imagem, ou None.
+
+    A etiqueta é o maior componente claro (Otsu) depois de fechar os buracos
+    deixados pelo texto; regiões pequenas demais ou que já ocupam quase todo
+    o quadro não são recortadas.
+    """
+    import cv2
+
+    small, scale = _resize_long_side(gray, ROI_DETECTION_SIDE)
+    blurred = cv2.GaussianBlur(small, (5, 5), 0)
+    _, bright = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (15, 15))
+    bright = cv2.morphologyEx(bright, cv2.MORPH_CLOSE, kernel)
+
+    contours, _ = cv2.findContours(bright, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if not contours:
+        return None
+
+    x, y, width, height = cv2.boundingRect(max(contours, key=cv2.contourArea))
+    frame_area = small.shape[0] * small.shape[1]
+    if not ROI_MIN_AREA <= (width * height) / frame_area <= ROI_MAX_AREA:
+        return None
+
+    margin_x, margin_y = int(width * ROI_MARGIN), int(height * ROI_MARGIN)
+    x0, y0 = max(0, x - margin_x), max(0, y - margin_y)
+    x1 = min(small.shape[1], x + width + margin_x)
+    y1 = min(small.shape[0], y + height + margin_y)
+    return (int(x0 / scale), int(y0 / scale), int((x1 - x0) / scale), int((y1 - y0) / scale))
+
+
+def estimate_skew(gray) -> float:
+    """
+    Inclinação do texto em graus (perfil de projeção).
+
+    Gira uma cópia reduzida e binarizada em passos de SKEW_STEP e escolhe o
+    ângulo em que a soma das linhas varia mais bruscamente (linhas de texto
+    alinhadas com as linhas da imagem).
+    """
+    import cv2
+    import numpy as np
+
+    small, _ = _resize_long_side(gray, SKEW_DETECTION_SIDE)
+    _, ink = cv2.threshold(small, 0, 1, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    ink = ink.astype(np.float32)
+
+    height, width = ink.shape
+    center = (width / 2, height / 2)
+    best_angle, best_score = 0.0, -1.0
+    for angle in np.arange(-SKEW_MAX_ANGLE, SKEW_MAX_ANGLE + SKEW_STEP / 2, SKEW_STEP):
+        matrix = cv2.getRotationMatrix2D(center, float(angle), 1.0)
+        rotated = cv2.warpAffine(ink, matrix, (width, height), flags=cv2.INTER_NEAREST)
+        profile = rotated.sum(axis=1)
+        score = float(np.sum(np.diff(profile) ** 2))
+        if score > best_score:
+            best_angle, best_score = float(angle), score
+
+    return best_angle
+
+
+def deskew(gray, angle: float):
+    """Gira a imagem em `angle` graus (bordas preenchidas com os pixels vizinhos)"""
+    import cv2
+
+    height, width = gray.shape[:2]
+    matrix = cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1.0)
+    return cv2.warpAffine(gray, matrix, (width, height), flags=cv2.INTER_LINEAR,
+                          borderMode=cv2.BORDER_REPLICATE)
+
+
+def adaptive_threshold(gray):
+    """Binarização por vizinhança: o limiar acompanha sombras e gradientes de luz"""
+    import cv2
+
+    block_size = max(15, (max(gray.shape[:2]) // 60) | 1)
+    return cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                                 cv2.THRESH_BINARY, block_size, 10)
+
+
+def _merge_overlapping(rects):
+    """Une retângulos (x0, y0, x1, y1) que se sobrepõem, até não haver sobreposição"""
+    rects = list(rects)
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(rects)):
+            for j in range(i + 1, len(rects)):
+                a, b = rects[i], rects[j]
+                if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                    rects[i] = (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+                    del rects[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return rects
+
+
+def _reading_order(rects):
+    """Ordena blocos em linhas (sobreposição vertical) de cima para baixo e, na linha, da esquerda para a direita"""
+    rows = []
+    for rect in sorted(rects, key=lambda r: r[1]):
+        middle = (rect[1] + rect[3]) / 2
+        if rows and middle <= rows[-1][0]:
+            rows[-1][1].append(rect)
+            rows[-1][0] = max(rows[-1][0], rect[3])
+        else:
+            rows.append([rect[3], [rect]])
+    return [rect for _, row in rows for rect in sorted(row)]
+
+
+def find_text_blocks(image, max_blocks: int = 12) -> List[Tuple[int, int, int, int]]:
+    """
+    Blocos de texto (x, y, largura, altura) da imagem PIL, em ordem de leitura.
+
+    Componentes conexos com tamanho de caractere (bordas, linhas e barras de
+    código de barras ficam de fora) são dilatados até formar blocos; blocos
+    com poucos caracteres são descartados. Com mais de `max_blocks`, a
+    dilatação é dobrada até caber (ou retorna [] para o OCR da imagem inteira).
+    """
+    import cv2
+    import numpy as np
+
+    gray = np.asarray(image.convert('L'))
+    height, width = gray.shape
+    _, ink = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+
+    count, labels, stats, centroids = cv2.connectedComponentsWithStats(ink, connectivity=8)
+    widths, heights = stats[:, cv2.CC_STAT_WIDTH], stats[:, cv2.CC_STAT_HEIGHT]
+    is_char = ((heights >= height * CHAR_MIN_HEIGHT) & (heights <= height * CHAR_MAX_HEIGHT)
+               & (widths <= width * CHAR_MAX_WIDTH))
+    is_char[0] = False   # Fundo
+    chars = np.where(is_char[labels], 255, 0).astype(np.uint8)
+    char_centers = centroids[is_char]
+
+    kernel_width, kernel_height = max(9, width // 35), max(5, height // 90)
+    for _ in range(3):
+        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (kernel_width, kernel_height))
+        contours, _ = cv2.findContours(cv2.dilate(chars, kernel), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+        rects = []
+        for contour in contours:
+            x, y, w, h = cv2.boundingRect(contour)
+            inside = ((char_centers[:, 0] >= x) & (char_centers[:, 0] < x + w)
+                      & (char_centers[:, 1] >= y) & (char_centers[:, 1] < y + h))
+            if inside.sum() >= BLOCK_MIN_CHARS:
+                rects.append((x, y, x + w, y + h))
+        rects = _merge_overlapping(rects)
+
+        if len(rects) <= max_blocks:
+            return [(x0, y0, x1 - x0, y1 - y0) for x0, y0, x1, y1 in _reading_order(rects)]
+        kernel_width, kernel_height = kernel_width * 2, kernel_height * 2
+
+    return []
+
+
+def image_sharpness(image_bytes: bytes) -> Optional[float]:
+    """
+    Nitidez da foto: variância do Laplaciano em uma cópia reduzida (JPEGs são
+    decodificados já reduzidos). Valores baixos indicam foto borrada.
+    """
+    import io
+    import cv2
+    import numpy as np
+    from PIL import Image
+
+    try:
+        image = Image.open(io.BytesIO(image_bytes))
+        image.draft('L', (SHARPNESS_SIDE, SHARPNESS_SIDE))
+        gray, _ = _resize_long_side(np.asarray(image.convert('L')), SHARPNESS_SIDE)
+    except Exception as e:
+        print(f"[OCR] ⚠️ Não foi possível medir a nitidez da imagem: {e}")
+        return None
+    return float(cv2.Laplacian(gray, cv2.CV_64F).var())
+
+
+def preprocess_for_ocr(image, config: Optional[PreprocessConfig] = None):
+    """
+    Aplica as etapas configuradas a uma imagem PIL e retorna a imagem (PIL,
+    escala de cinza) entregue ao Tesseract. Sem etapas, retorna a original.
+    """
+    config = preprocess_config() if config is None else config
+    if not config.steps:
+        return image
+
+    try:
+        import cv2
+        import numpy as np
+        from PIL import Image
+    except ImportError as e:
+        print(f"[OCR] ⚠️ Pré-processamento indisponível (OpenCV): {e}")
+        return image
+
+    gray = cv2.cvtColor(np.asarray(image.convert('RGB')), cv2.COLOR_RGB2GRAY)
+    original_size = (gray.shape[1], gray.shape[0])
+    applied = []
+
+    if "roi" in config.steps:
+        roi = find_label_roi(gray)
+        if roi is not None:
+            x, y, width, height = roi
+            gray = gray[y:y + height, x:x + width]
+            applied.append("ROI")
+
+    if "downscale" in config.steps:
+        gray, scale = _resize_long_side(gray, config.target_pixels)
+        if scale < 1:
+            applied.append(f"escala {scale:.2f}")
+
+    if "deskew" in config.steps:
+        angle = estimate_skew(gray)
+        if abs(angle) >= SKEW_MIN_ANGLE:
+            gray = deskew(gray, angle)
+            applied.append(f"deskew {angle:+.1f}°")
+
+    if "threshold" in config.steps:
+        gray = adaptive_threshold(gray)
+        applied.append("limiar adaptativo")
+
+    original_pixels = original_size[0] * original_size[1]
+    print(f"[OCR] 🔧 Pré-processamento: {original_size[0]}x{original_size[1]} → "
+          f"{gray.shape[1]}x{gray.shape[0]} ({gray.size / original_pixels:.0%} dos pixels; "
+          f"{', '.join(applied) or 'escala de cinza'})")
+
+    return Image.fromarray(gray)
@@ -0,0 +1,242 @@
+# tesseract_pool.py
+"""
+🧵 Motores do Tesseract persistentes
+
+pytesseract abre um processo `tesseract` por chamada, e cada processo
+recarrega o traineddata (por+eng) antes de ler a imagem: em recortes
+pequenos de etiqueta, esse custo fixo é boa parte do tempo do OCR.
+
+Com tesserocr (binding da API C do Tesseract) instalado, cada processo
+mantém os motores carregados, um por (idioma, config), e reaproveita-os a
+cada imagem. Os workers do modo lote são processos de longa duração, um por
+núcleo, alimentados pela fila do ProcessPoolExecutor: cada worker carrega
+os modelos uma vez por lote (ver warm_up_worker). Sem tesserocr, cada
+chamada ainda abre um processo via pytesseract.
+"""
+
+import os
+import time
+import shlex
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+DEFAULT_MAX_ENGINES = 4     # Motores carregados por thread (cada um mantém seus modelos em memória)
+DEFAULT_LANG = 'eng'        # Idioma do Tesseract quando nenhum é informado
+
+
+def parse_config(config: str) -> Tuple[Optional[int], Optional[int], Tuple[Tuple[str, str], ...]]:
+    """(psm, oem, variáveis -c) de uma string de config no formato da linha de comando do Tesseract"""
+    psm = oem = None
+    variables = []
+
+    tokens = shlex.split(config or '')
+    index = 0
+    while index < len(tokens):
+        token = tokens[index]
+        value = tokens[index + 1] if index + 1 < len(tokens) else ''
+        if token == '--psm':
+            psm, index = int(value), index + 2
+        elif token == '--oem':
+            oem, index = int(value), index + 2
+        elif token == '-c':
+            key, _, variable_value = value.partition('=')
+            variables.append((key, variable_value))
+            index += 2
+        elif token.startswith('-c') and '=' in token:
+            key, _, variable_value = token[2:].partition('=')
+            variables.append((key, variable_value))
+            index += 1
+        else:
+            raise ValueError(f"Opção de config do Tesseract não suportada pela API: {token}")
+
+    return psm, oem, tuple(variables)
+
+
+class TesseractEngines:
+    """
+    Motores do Tesseract do processo atual.
+
+    backend 'api' usa tesserocr, com os motores em um LRU de até
+    `max_engines` por thread (a API não é thread-safe; o reconhecimento
+    libera o GIL). backend 'cli' chama o pytesseract, um processo por imagem.
+    """
+
+    def __init__(self, backend: str = 'api', max_engines: int = DEFAULT_MAX_ENGINES):
+        self.backend = backend
+        self.max_engines = max_engines
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+        # Estatísticas
+        self.calls = 0
+        self.engines_loaded = 0
+        self.load_seconds = 0.0
+
+    def _engines(self) -> "OrderedDict":
+        engines = getattr(self._local, "engines", None)
+        if engines is None:
+            engines = self._local.engines = OrderedDict()
+        return engines
+
+    def _engine(self, lang: Optional[str], config: str):
+        import tesserocr
+
+        psm, oem, variables = parse_config(config)
+        key = (lang or DEFAULT_LANG, psm, oem, variables)
+
+        engines = self._engines()
+        api = engines.get(key)
+        if api is not None:
+            engines.move_to_end(key)
+            return api
+
+        started = time.perf_counter()
+        options = {"lang": key[0]}
+        if psm is not None:
+            options["psm"] = psm
+        if oem is not None:
+            options["oem"] = oem
+        api = tesserocr.PyTessBaseAPI(**options)
+        for name, value in variables:
+            api.SetVariable(name, value)
+        elapsed = time.perf_counter() - started
+
+        with self._lock:
+            self.engines_loaded += 1
+            self.load_seconds += elapsed
+        print(f"[OCR] 🧵 Motor Tesseract carregado ({key[0]}, {config or 'padrão'}) em {elapsed:.2f}s")
+
+        engines[key] = api
+        while len(engines) > self.max_engines:
+            _, evicted = engines.popitem(last=False)
+            evicted.End()
+        return api
+
+    def image_to_string(self, image, lang: Optional[str] = None, config: str = '') -> str:
+        """Texto da imagem PIL (mesma semântica de pytesseract.image_to_string)"""
+        return self._run(image, lang, config, with_confidence=False)[0]
+
+    def image_to_data(self, image, lang: Optional[str] = None, config: str = '') -> Tuple[str, Optional[float]]:
+        """
+        (texto, confiança média das palavras de 0 a 1) em uma única passada
+        (API: AllWordConfidences; pytesseract: image_to_data, com o texto
+        remontado linha a linha). Confiança None se nenhuma palavra foi lida.
+        """
+        return self._run(image, lang, config, with_confidence=True)
+
+    def _run(self, image, lang: Optional[str], config: str, with_confidence: bool) -> Tuple[str, Optional[float]]:
+        with self._lock:
+            self.calls += 1
+
+        if self.backend == 'api':
+            try:
+                api = self._engine(lang, config)
+            except ValueError as e:
+                print(f"[OCR] ⚠️ {e} - usando pytesseract nesta chamada")
+            else:
+                return self._recognize(api, image, with_confidence)
+
+        import pytesseract
+
+        options = {"config": config} if lang is None else {"lang": lang, "config": config}
+        if not with_confidence:
+            return pytesseract.image_to_string(image, **options), None
+
+        data = pytesseract.image_to_data(image, output_type=pytesseract.Output.DICT, **options)
+        lines = OrderedDict()
+        confidences = []
+        for index, word in enumerate(data["text"]):
+            confidence = float(data["conf"][index])
+            if confidence < 0 or not word.strip():
+                continue
+            line = (data["block_num"][index], data["par_num"][index], data["line_num"][index])
+            lines.setdefault(line, []).append(word)
+            confidences.append(confidence)
+
+        text = "\n".join(" ".join(words) for words in lines.values())
+        return text, _mean_confidence(confidences)
+
+    @staticmethod
+    def _recognize(api, image, with_confidence: bool) -> Tuple[str, Optional[float]]:
+        try:
+            api.SetImage(image)
+            text = api.GetUTF8Text()
+            return text, _mean_confidence(api.AllWordConfidences()) if with_confidence else None
+        finally:
+            api.Clear()
+
+    def warm_up(self, lang: Optional[str] = None, config: str = ''):
+        """Carrega o motor antes da primeira imagem (sem efeito no backend 'cli')"""
+        if self.backend == 'api':
+            self._engine(lang, config)
+
+    def stats(self) -> Dict:
+        return {
+            "backend": self.backend,
+            "calls": self.calls,
+            "engines_loaded": self.engines_loaded,
+            "load_seconds": round(self.load_seconds, 3)
+        }
+
+    def close(self):
+        """Libera os motores da thread atual"""
+        engines = self._engines()
+        while engines:
+            _, api = engines.popitem()
+            api.End()
+
+
+def _mean_confidence(confidences) -> Optional[float]:
+    """Média das confianças por palavra do Tesseract (0-100) em 0-1"""
+    confidences = list(confidences)
+    return sum(confidences) / len(confidences) / 100 if confidences else None
+
+
+def _resolve_backend(requested: str) -> str:
+    if requested == 'cli':
+        return 'cli'
+
+    try:
+        import tesserocr  # noqa: F401
+        return 'api'
+    except ImportError:
+        if requested == 'api':
+            print("[OCR] ⚠️ TESSERACT_BACKEND=api, mas tesserocr não está instalado - usando pytesseract")
+        else:
+            print("[OCR] ℹ️ tesserocr não instalado - um processo tesseract por imagem "
+                  "(pip install -r requirements-optional.txt)")
+        return 'cli'
+
+
+_tesseract: Optional[TesseractEngines] = None
+_tesseract_pid: Optional[int] = None
+
+
+def get_tesseract() -> TesseractEngines:
+    """
+    Motores do Tesseract do processo atual.
+
+    Variáveis de ambiente:
+        TESSERACT_BACKEND=auto        api (tesserocr), cli (pytesseract) ou auto
+        TESSERACT_MAX_ENGINES=4       motores carregados por thread
+    """
+    global _tesseract, _tesseract_pid
+
+    # Motores da API C não sobrevivem a um fork: cada worker carrega os seus
+    if _tesseract is None or _tesseract_pid != os.getpid():
+        _tesseract = TesseractEngines(
+            backend=_resolve_backend(os.getenv('TESSERACT_BACKEND', 'auto').lower()),
+            max_engines=int(os.getenv('TESSERACT_MAX_ENGINES', DEFAULT_MAX_ENGINES))
+        )
+        _tesseract_pid = os.getpid()
+
+    return _tesseract
+
+
+def warm_up_worker(lang: Optional[str] = None, config: str = ''):
+    """Initializer dos workers de OCR: carrega o motor principal enquanto o lote é planejado"""
+    try:
+        get_tesseract().warm_up(lang, config)
+    except Exception as e:
+        print(f"[OCR] ⚠️ Não foi possível pré-carregar o Tesseract: {e}")
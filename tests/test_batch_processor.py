@@ -0,0 +1,95 @@
+"""Modo lote: pré-classificação visual escolhe o perfil de OCR de cada foto"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import batch_processor
+import lib
+import main
+from lib.learning_engine import LearningEngine
+from ocr_extractor import CARRIER_OCR_PROFILES, DEFAULT_OCR_PROFILE, carrier_ocr_profile
+
+KNOWN_HASH = 0x0F0F_F0F0_3C3C_C3C3
+UNKNOWN_HASH = KNOWN_HASH ^ 0xFFFF_FFFF_FFFF_FFFF
+
+
+def test_batch_photo_with_known_signature_gets_carrier_profile(tmp_path, monkeypatch):
+    learning_engine = LearningEngine(str(tmp_path / "models"))
+    assert learning_engine.visual_index.learn(KNOWN_HASH, "jadlog")
+
+    photos = tmp_path / "fotos"
+    photos.mkdir()
+    hashes = {"conhecida.jpg": KNOWN_HASH, "desconhecida.jpg": UNKNOWN_HASH}
+    for name in hashes:
+        (photos / name).write_bytes(name.encode())
+
+    ocr_carriers = {}
+
+    def fake_ocr(path, carrier=None):
+        ocr_carriers[os.path.basename(path)] = carrier
+        return {"raw_text": "", "ocr_engine": "tesseract"}
+
+    # Pool em threads e OCR falso: o teste verifica só o roteamento do lote
+    monkeypatch.setattr(lib, "get_learning_engine", lambda: learning_engine)
+    monkeypatch.setattr(batch_processor, "ProcessPoolExecutor", ThreadPoolExecutor)
+    monkeypatch.setattr(batch_processor, "image_hash", lambda path: hashes[os.path.basename(path)])
+    monkeypatch.setattr(batch_processor, "_photo_metadata", lambda path: {"gps": None})
+    monkeypatch.setattr(batch_processor, "extract_ocr_data", fake_ocr)
+    monkeypatch.setattr(main, "process_intelligent_delivery", lambda path, **kwargs: {"is_valid": True})
+
+    summary = batch_processor.process_batch(str(photos), workers=2, output_path=str(tmp_path / "lote.jsonl"))
+
+    assert summary["processed"] == 2
+    assert ocr_carriers == {"conhecida.jpg": "jadlog", "desconhecida.jpg": None}
+    assert carrier_ocr_profile(ocr_carriers["conhecida.jpg"]) == CARRIER_OCR_PROFILES["jadlog"]
+    assert carrier_ocr_profile(ocr_carriers["desconhecida.jpg"]) == DEFAULT_OCR_PROFILE
+
+
+def test_batch_copies_and_cached_photos_skip_ocr(tmp_path, monkeypatch):
+    photos = tmp_path / "fotos"
+    photos.mkdir()
+    contents = {"a.jpg": b"etiqueta A", "b.jpg": b"etiqueta B", "copia_a.jpg": b"etiqueta A",
+                "reenvio.jpg": b"etiqueta R"}
+    for name, content in contents.items():
+        (photos / name).write_bytes(content)
+
+    ocr_calls = []
+
+    def fake_ocr(path, carrier=None):
+        ocr_calls.append(os.path.basename(path))
+        return {"raw_text": "", "ocr_cached": os.path.basename(path) == "reenvio.jpg"}
+
+    monkeypatch.setattr(lib, "get_learning_engine", lambda: LearningEngine(str(tmp_path / "models")))
+    monkeypatch.setattr(batch_processor, "ProcessPoolExecutor", ThreadPoolExecutor)
+    monkeypatch.setattr(batch_processor, "image_hash", lambda path: None)
+    monkeypatch.setattr(batch_processor, "_photo_metadata", lambda path: {"gps": None})
+    monkeypatch.setattr(batch_processor, "extract_ocr_data", fake_ocr)
+    monkeypatch.setattr(main, "process_intelligent_delivery", lambda path, **kwargs: {"is_valid": True})
+
+    summary = batch_processor.process_batch(str(photos), workers=2, output_path=str(tmp_path / "lote.jsonl"))
+
+    assert sorted(ocr_calls) == ["a.jpg", "b.jpg", "reenvio.jpg"]
+    assert summary["processed"] == 4
+    assert summary["ocr_calls_avoided"] == 2  # a cópia de a.jpg e o reenvio servido pelo cache
+
+
+def test_ocr_starts_before_all_signatures_are_computed(tmp_path, monkeypatch):
+    photos = tmp_path / "fotos"
+    photos.mkdir()
+    for number in range(4):
+        (photos / f"foto{number}.jpg").write_bytes(f"foto {number}".encode())
+
+    events = []
+    monkeypatch.setattr(lib, "get_learning_engine", lambda: LearningEngine(str(tmp_path / "models")))
+    monkeypatch.setattr(batch_processor, "ProcessPoolExecutor", ThreadPoolExecutor)
+    monkeypatch.setattr(batch_processor, "image_hash", lambda path: events.append(("hash", path)))
+    monkeypatch.setattr(batch_processor, "_photo_metadata", lambda path: {"gps": None})
+    monkeypatch.setattr(batch_processor, "extract_ocr_data",
+                        lambda path, carrier=None: events.append(("ocr", path)) or {"raw_text": ""})
+    monkeypatch.setattr(main, "process_intelligent_delivery", lambda path, **kwargs: {"is_valid": True})
+
+    summary = batch_processor.process_batch(str(photos), workers=1, output_path=str(tmp_path / "lote.jsonl"))
+
+    assert summary["processed"] == 4
+    stages = [stage for stage, _ in events]
+    assert stages.index("ocr") < len(stages) - 1 - stages[::-1].index("hash")
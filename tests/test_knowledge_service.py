@@ -0,0 +1,109 @@
+"""Serviço de conhecimento: protocolo JSON autenticado, socket privado e fila de pendentes limitada"""
+
+import os
+import sys
+import stat
+import threading
+from multiprocessing.connection import Client
+
+import pytest
+
+from lib.knowledge_service import KnowledgeService, RemoteLearningEngine
+from lib.learning_engine import LearningEngine
+from lib.tags_patterns import CompanyType, PatternMatch
+
+AUTHKEY = "chave-de-teste"
+
+
+def _analysis(company=CompanyType.JADLOG, confidence=0.9):
+    return {
+        "company": PatternMatch(company, confidence, "JADLOG", "logo", {}),
+        "extracted_data": {"cep": ("01310-100", 0.9), "nf_number": ("NF123", 0.8)}
+    }
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    monkeypatch.setenv("LEARNING_SERVICE_AUTHKEY", AUTHKEY)
+    # `lib.learning_engine` como atributo de lib é a instância global; o módulo vem de sys.modules
+    monkeypatch.setattr(sys.modules["lib.learning_engine"], "LEARNING_LOG_FILE", str(tmp_path / "learning_progress.csv"))
+    service = KnowledgeService(str(tmp_path / "run" / "learning.sock"), LearningEngine(str(tmp_path / "models")),
+                               publish_seconds=0.05)
+    service.start()
+    threading.Thread(target=service.accept_forever, daemon=True).start()
+    yield service
+    service.shutdown()
+
+
+def _client(service, **kwargs):
+    return RemoteLearningEngine(str(service.socket_path), str(service.engine.models_dir), **kwargs)
+
+
+def test_refuses_to_start_without_authkey(tmp_path, monkeypatch):
+    monkeypatch.delenv("LEARNING_SERVICE_AUTHKEY", raising=False)
+    service = KnowledgeService(str(tmp_path / "learning.sock"), LearningEngine(str(tmp_path / "models")))
+
+    with pytest.raises(ValueError):
+        service.start()
+    assert not (tmp_path / "learning.sock").exists()
+    with pytest.raises(ValueError):
+        RemoteLearningEngine(str(tmp_path / "learning.sock"), str(tmp_path / "models"))
+
+
+def test_socket_is_private_from_creation(service):
+    assert stat.S_IMODE(os.stat(service.socket_path).st_mode) == 0o600
+    assert stat.S_IMODE(os.stat(service.socket_path.parent).st_mode) == 0o700
+
+
+def test_sessions_round_trip_through_json_protocol(service):
+    client = _client(service)
+    session = client.process_learning_session("foto.jpg", "JADLOG CEP 01310-100", _analysis(),
+                                               gps_validation=True, route_match=True, visual_hash=2**63 + 5)
+    client.flush()
+
+    assert session.company_detected == "jadlog"
+    assert service.sessions_applied == 1
+    stats = client.get_learning_stats()
+    assert stats["total_images_processed"] == 1
+    assert stats["successful_recognitions"] == 1
+    assert client._snapshot["log_seq"] >= 1
+    client.close()
+
+
+def test_pickled_messages_are_not_unpickled(service, tmp_path):
+    marker = tmp_path / "unpickled"
+
+    class Exploit:
+        def __reduce__(self):
+            return (open, (str(marker), "w"))
+
+    conn = Client(str(service.socket_path), family="AF_UNIX", authkey=AUTHKEY.encode())
+    conn.send(Exploit())  # pickle, como o protocolo antigo
+    with pytest.raises((EOFError, OSError)):
+        conn.recv_bytes()
+    conn.close()
+
+    assert not marker.exists()
+    client = _client(service)
+    assert client._call("stats") is not None  # o serviço segue atendendo
+    client.close()
+
+
+def test_wrong_authkey_is_rejected(service):
+    from multiprocessing import AuthenticationError
+
+    with pytest.raises(AuthenticationError):
+        Client(str(service.socket_path), family="AF_UNIX", authkey=b"outra-chave")
+
+
+def test_pending_messages_are_capped_while_service_is_down(tmp_path, monkeypatch, capsys):
+    monkeypatch.setenv("LEARNING_SERVICE_AUTHKEY", AUTHKEY)
+    client = RemoteLearningEngine(str(tmp_path / "ausente.sock"), str(tmp_path / "models"), max_pending=3)
+
+    for number in range(5):
+        client.process_learning_session(f"foto{number}.jpg", "JADLOG", _analysis())
+
+    assert len(client._pending) == 3
+    assert client.dropped_messages == 2
+    assert [message[1]["image_path"] for message in client._pending] == ["foto2.jpg", "foto3.jpg", "foto4.jpg"]
+    client._pending.clear()
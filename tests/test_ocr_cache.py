@@ -0,0 +1,52 @@
+"""Cache de OCR: tamanho total mantido em contador e despejo LRU pelo índice de last_access"""
+
+from ocr_cache import OCRCache
+
+
+def _real_size(cache):
+    return cache._conn.execute("SELECT COALESCE(SUM(size), 0) FROM ocr_results").fetchone()[0]
+
+
+def test_total_size_counter_tracks_puts_and_replacements(tmp_path):
+    cache = OCRCache(str(tmp_path / "ocr.sqlite"), max_bytes=10_000)
+    cache.put("a", "x" * 100)
+    cache.put("b", "y" * 50)
+    cache.put("a", "z" * 30)  # mesma chave: substitui, não soma
+
+    assert cache.stats()["size_bytes"] == _real_size(cache) == 80
+    cache.clear()
+    assert cache.stats()["size_bytes"] == 0
+
+
+def test_eviction_removes_least_recently_used_until_below_target(tmp_path):
+    cache = OCRCache(str(tmp_path / "ocr.sqlite"), max_bytes=1000)
+    for number in range(10):
+        cache.put(f"k{number}", "x" * 100)
+    assert cache.get("k0") is not None  # k0 volta a ser recente
+
+    cache.put("k10", "x" * 100)
+
+    stats = cache.stats()
+    assert stats["size_bytes"] == _real_size(cache) <= 900
+    assert stats["total_evictions"] == 2
+    assert cache.get("k0") is not None
+    assert cache.get("k1") is None and cache.get("k2") is None
+    assert cache.get("k3") is not None
+
+
+def test_existing_cache_without_counter_is_summed_once(tmp_path):
+    path = str(tmp_path / "ocr.sqlite")
+    cache = OCRCache(path)
+    cache.put("a", "x" * 120)
+    cache._conn.execute("DELETE FROM counters WHERE name = 'size_bytes'")  # cache anterior ao contador
+    cache._conn.close()
+
+    assert OCRCache(path).stats()["size_bytes"] == 120
+
+
+def test_eviction_query_uses_last_access_index(tmp_path):
+    cache = OCRCache(str(tmp_path / "ocr.sqlite"))
+    plan = cache._conn.execute(
+        "EXPLAIN QUERY PLAN SELECT key FROM ocr_results ORDER BY last_access ASC LIMIT 1"
+    ).fetchall()
+    assert any("idx_ocr_results_last_access" in row[-1] for row in plan)
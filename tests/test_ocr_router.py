@@ -0,0 +1,71 @@
+"""Plano de OCR: passadas leves limitadas e motor pesado só para resultados pouco confiáveis"""
+
+from types import SimpleNamespace
+
+import pytest
+
+import ocr_engines
+import ocr_extractor
+from ocr_engines import OCRResult
+
+LABEL = "JADLOG DESTINATARIO MARIA SILVA RUA DAS FLORES 123"
+
+
+@pytest.fixture
+def ocr(tmp_path, monkeypatch):
+    """OCR falso: `ocr.results[motor]` é o resultado de cada passada, registrada em `ocr.calls`"""
+    ocr = SimpleNamespace(calls=[], results={}, photo=tmp_path / "foto.jpg")
+    ocr.photo.write_bytes(b"foto")
+    monkeypatch.setenv("OCR_ESCALATION", "easyocr")
+    monkeypatch.setenv("OCR_MAX_PASSES", "2")
+    monkeypatch.setattr(ocr_engines, "get_engine", lambda name: object())
+    monkeypatch.setattr(ocr_extractor, "image_sharpness", lambda image_bytes: 500.0)
+
+    def fake_cached_ocr(image_bytes, profile, load_image, preprocess, tiling=None):
+        ocr.calls.append(profile.engine)
+        return ocr.results[profile.engine], False
+
+    monkeypatch.setattr(ocr_extractor, "_cached_ocr", fake_cached_ocr)
+    return ocr
+
+
+def _result(engine, text=LABEL, confidence=0.9):
+    return OCRResult(text=text, confidence=confidence, engine=engine, lang="por")
+
+
+def test_light_passes_are_capped(ocr, monkeypatch):
+    monkeypatch.setenv("OCR_ESCALATION", "")
+    assert len(ocr_extractor.ocr_router().plan()) == 2
+
+    monkeypatch.setenv("OCR_MAX_PASSES", "0")
+    assert len(ocr_extractor.ocr_router().plan()) == 4  # sem transportadora, perfil principal = genérico
+    assert len(ocr_extractor.ocr_router().plan("jadlog")) == 5
+
+
+def test_incomplete_content_does_not_escalate(ocr, monkeypatch):
+    # Texto confiável de etiqueta sem CEP: a verificação de conteúdo falha em todas as passadas
+    monkeypatch.setattr(ocr_extractor, "label_content_check", lambda fields: lambda text: (False, 1.0))
+    ocr.results = {"tesseract": _result("tesseract"), "easyocr": _result("easyocr")}
+
+    data = ocr_extractor.extract_ocr_data(str(ocr.photo))
+
+    assert ocr.calls == ["tesseract", "tesseract"]
+    assert data["ocr_passes"] == 2
+
+
+def test_low_confidence_escalates_to_heavy_engine(ocr):
+    ocr.results = {"tesseract": _result("tesseract", confidence=0.3), "easyocr": _result("easyocr")}
+
+    data = ocr_extractor.extract_ocr_data(str(ocr.photo))
+
+    assert ocr.calls == ["tesseract", "tesseract", "easyocr"]
+    assert data["ocr_engine"] == "easyocr"
+
+
+def test_accepted_pass_is_kept_over_earlier_richer_content(ocr, monkeypatch):
+    router = ocr_extractor.ocr_router()
+    router.content_check = lambda text: (True, 2.0) if "CEP" in text else (False, 5.0)
+
+    rich = _result("tesseract", text=LABEL + " NF 123456 ROTA R001", confidence=0.3)
+    accepted = _result("tesseract", text=LABEL + " CEP 01310-100")
+    assert router.assess(accepted)[1] > router.assess(rich)[1]
@@ -0,0 +1,87 @@
+"""Busca de rotas por dados do OCR: os índices encontram as mesmas rotas que a comparação com toda a base"""
+
+import csv
+import re
+
+import pytest
+
+from lib.validators import ROUTE_MATCH_MIN_SCORE, ROUTE_MATCH_POINTS, EnhancedValidators
+
+FIELDS = ["route_id", "recipient_name", "cep", "nf_number", "gps_lat", "gps_lon"]
+
+ROUTES = [
+    ("R1", "Maria Silva", "01310-100", "NF100"),
+    ("R2", "maria silva santos", "22041-001", "NF200"),
+    ("R3", "Ana", "30140-071", "NF300"),
+    ("R4", "Mariana Souza", "01310-100", "NF400"),
+    ("R5", "José Souza", "", "NF500"),
+    ("R6", None, "40010-000", "NF600"),
+    ("R7", "CARLOS EDUARDO MENDES", "01310-100", "nf700"),
+    ("R8", "Jo", "70040-010", "NF800"),
+]
+
+QUERIES = [
+    {"recipient_name": ("mariasilva", 0.9)},                  # só o nome, sem espaços
+    {"recipient_name": ("MARIANA SOUZA", 0.9)},
+    {"recipient_name": ("silvasantos", 0.9)},
+    {"recipient_name": ("jo", 0.9)},                          # menor que um trigrama
+    {"recipient_name": ("carloseduardo", 0.9), "cep": ("01310100", 0.9)},
+    {"nf_number": ("NF700", 0.9)},
+    {"cep": ("01310-100", 0.9), "recipient_name": ("xyz", 0.9)},
+    {"recipient_name": (None, 0.9), "nf_number": ("NF600", 0.9)},
+    {"recipient_name": ("", 0.9), "cep": ("40010000", 0.9)},
+]
+
+
+@pytest.fixture
+def validators(tmp_path, monkeypatch):
+    monkeypatch.setenv("ROUTE_SNAPSHOT", "0")
+    path = tmp_path / "routes.csv"
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(FIELDS)
+        for route_id, name, cep, nf in ROUTES:
+            # Rota sem nome: campo ausente na linha (None no csv.DictReader)
+            row = [route_id, name, cep, nf, "-23.5", "-46.6"]
+            writer.writerow(row if name is not None else row[:1])
+    return EnhancedValidators(str(path), reload_interval=0)
+
+
+def _baseline_scores(validators, extracted_data):
+    """Comparação de cada rota com os dados (a busca linear anterior aos índices)"""
+    scores = {}
+    for position, route in enumerate(validators.delivery_routes):
+        score = 0
+        if "recipient_name" in extracted_data:
+            ocr_name = (extracted_data["recipient_name"][0] or "").lower()
+            if validators._fuzzy_match(ocr_name, (route["recipient_name"] or "").lower(), threshold=0.8):
+                score += ROUTE_MATCH_POINTS["recipient_name"]
+        if "cep" in extracted_data:
+            ocr_cep = re.sub(r"[^0-9]", "", extracted_data["cep"][0])
+            route_cep = re.sub(r"[^0-9]", "", route["cep"] or "")
+            if ocr_cep and ocr_cep == route_cep:
+                score += ROUTE_MATCH_POINTS["cep"]
+        if "nf_number" in extracted_data:
+            if extracted_data["nf_number"][0].upper() == (route["nf_number"] or "").upper():
+                score += ROUTE_MATCH_POINTS["nf_number"]
+        if score >= ROUTE_MATCH_MIN_SCORE:
+            scores[route["route_id"]] = score
+    return scores
+
+
+@pytest.mark.parametrize("extracted_data", QUERIES)
+def test_candidates_match_linear_scan(validators, extracted_data):
+    found = {route["route_id"]: score for score, route in validators.find_route_candidates(extracted_data)}
+    assert found == _baseline_scores(validators, extracted_data)
+
+
+def test_name_without_spaces_finds_route(validators):
+    assert validators.find_route_by_data({"recipient_name": ("mariasilva", 0.9)})["route_id"] == "R1"
+
+
+def test_updated_name_is_reindexed(validators):
+    validators.update_route("R3", {"recipient_name": "Ana Paula Lima"})
+
+    found = [route["route_id"] for _, route in validators.find_route_candidates({"recipient_name": ("paulalima", 0.9)})]
+    assert found == ["R3"]
+    assert validators.find_route_candidates({"recipient_name": ("xana", 0.9)}) == []
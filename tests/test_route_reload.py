@@ -0,0 +1,130 @@
+"""Recarga a quente da base de rotas: acréscimos incrementais, reescritas com recarga completa"""
+
+import csv
+import os
+
+import pytest
+
+import lib.route_store as route_store
+from lib.validators import EnhancedValidators
+
+FIELDS = ["route_id", "recipient_name", "cep", "nf_number", "gps_lat", "gps_lon", "status"]
+
+
+def _route(number, status="pending", lat=-23.5):
+    return [f"R{number:03d}", f"Destinatário {number}", "01310-100", f"NF{number:03d}", str(lat + number / 1000), "-46.6", status]
+
+
+def _write(path, rows, mode="w"):
+    with open(path, mode, newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        if mode == "w":
+            writer.writerow(FIELDS)
+        writer.writerows(rows)
+
+
+def _replace(path, rows):
+    """Reescrita como a de um editor: arquivo novo renomeado sobre o antigo"""
+    tmp_path = path.with_name(path.name + ".tmp")
+    _write(tmp_path, rows)
+    os.replace(tmp_path, path)
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    monkeypatch.setenv("ROUTE_SNAPSHOT_DIR", str(tmp_path / "cache"))
+    path = tmp_path / "routes.csv"
+    _write(path, [_route(1), _route(2)])
+    return path
+
+
+def _ids(validators):
+    return [route["route_id"] for route in validators.delivery_routes]
+
+
+def test_appended_lines_are_indexed_incrementally(database, monkeypatch):
+    validators = EnhancedValidators(str(database), reload_interval=0)
+    tables = validators._tables
+
+    # Base lida do CSV: o estado do sha256 fica em memória e os acréscimos não releem o trecho já lido
+    monkeypatch.setattr(route_store, "_source_hash", lambda f, length: pytest.fail("trecho já lido relido"))
+    _write(database, [_route(3)], mode="a")
+    assert validators.refresh_if_changed(force=True)
+    _write(database, [_route(4)], mode="a")
+    assert validators.refresh_if_changed(force=True)
+
+    assert validators._tables is tables
+    assert _ids(validators) == ["R001", "R002", "R003", "R004"]
+    assert validators.routes_by_nf["NF004"] == [3]
+    assert validators.find_nearest_routes(-23.5 + 4 / 1000, -46.6)[0][1]["route_id"] == "R004"
+    assert tables.routes.source_digest == route_store.hashlib.sha256(database.read_bytes()).digest()
+
+
+def test_partial_last_line_waits_for_newline(database):
+    validators = EnhancedValidators(str(database), reload_interval=0)
+    with open(database, "a", encoding="utf-8") as f:
+        f.write("R003,Parcial")
+
+    validators.refresh_if_changed(force=True)
+    assert _ids(validators) == ["R001", "R002"]
+
+    with open(database, "a", encoding="utf-8") as f:
+        f.write(",01310-100,NF003,-23.4,-46.6,pending\n")
+    validators.refresh_if_changed(force=True)
+    assert _ids(validators) == ["R001", "R002", "R003"]
+    assert validators.delivery_routes[2]["recipient_name"] == "Parcial"
+
+
+def test_rewrites_trigger_a_full_reload(database):
+    validators = EnhancedValidators(str(database), reload_interval=0)
+
+    # Mesmo tamanho, conteúdo diferente
+    tables = validators._tables
+    _write(database, [_route(1, status="shipped"), _route(2)])
+    assert validators.refresh_if_changed(force=True)
+    assert validators._tables is not tables
+    assert validators.delivery_routes[0]["status"] == "shipped"
+
+    # Linha do início editada e arquivo maior
+    tables = validators._tables
+    _replace(database, [_route(1, status="delivered"), _route(2), _route(3)])
+    assert validators.refresh_if_changed(force=True)
+    assert validators._tables is not tables
+    assert [route["status"] for route in validators.delivery_routes] == ["delivered", "pending", "pending"]
+    assert validators.routes_by_nf["NF003"] == [2]
+
+
+def test_snapshot_store_verifies_prefix_once(database):
+    EnhancedValidators(str(database), reload_interval=0)  # grava o snapshot
+    validators = EnhancedValidators(str(database), reload_interval=0)
+    assert validators.delivery_routes._source is None  # veio do snapshot
+
+    _write(database, [_route(3)], mode="a")
+    assert validators.refresh_if_changed(force=True)
+    assert _ids(validators) == ["R001", "R002", "R003"]
+    assert validators.delivery_routes._source is not None
+
+
+def test_validations_refresh_in_background(database):
+    validators = EnhancedValidators(str(database), reload_interval=0.001)
+    _write(database, [_route(3)], mode="a")
+
+    validators._next_check = 0
+    validators.check_for_changes()
+    assert validators._refresher is not None
+    validators._refresher.join(timeout=5)
+    assert _ids(validators) == ["R001", "R002", "R003"]
+
+
+def test_updates_are_applied_in_place(database):
+    validators = EnhancedValidators(str(database), reload_interval=0)
+    routes = validators.delivery_routes
+    codes, lat = routes.codes, routes.lat
+
+    assert validators.update_route("R002", {"status": "delivered", "gps_lat": "-22.9"}) == 1
+    assert routes.codes is codes and routes.lat is lat
+    assert routes[1]["status"] == "delivered"
+    assert validators.find_nearest_routes(-22.9, -46.6)[0][1]["route_id"] == "R002"
+
+    validators.update_route("R002", {"gps_lat": ""})
+    assert [route["route_id"] for _, route in validators.find_routes_within(-22.9, -46.6, 50)] == []
@@ -0,0 +1,72 @@
+"""Base de rotas colunar: snapshot binário equivalente ao CSV e recarga a quente"""
+
+import csv
+import os
+
+import numpy as np
+
+from lib.route_store import RouteStore, default_snapshot_path, load_route_store
+
+FIELDS = ["route_id", "recipient_name", "cep", "nf_number", "gps_lat", "gps_lon",
+          "delivery_window_start", "delivery_window_end", "status"]
+
+
+def _write_routes(path, rows, mode="w"):
+    with open(path, mode, newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        if mode == "w":
+            writer.writerow(FIELDS)
+        writer.writerows(rows)
+    return path
+
+
+def _route(number, lat="-23.5", lon="-46.6", status="pending"):
+    return [f"R{number:03d}", f"Destinatário {number}", "01310-100", f"NF{number}", lat, lon, "08:00", "18:00", status]
+
+
+def _as_dicts(store):
+    return [dict(route) for route in store]
+
+
+def test_snapshot_round_trip_matches_csv(tmp_path):
+    rows = [_route(1), _route(2, lat="inválida"), ["R003", "Sem janela", "", "NF3", "-22.9", "-43.2", "", "25:00"]]
+    csv_path = _write_routes(tmp_path / "routes.csv", rows)
+    snapshot_path = tmp_path / "routes.npz"
+
+    from_csv = load_route_store(csv_path, snapshot_path)
+    assert snapshot_path.exists()
+    from_snapshot = RouteStore.load_snapshot(snapshot_path, source_path=csv_path)
+
+    assert from_snapshot is not None
+    assert _as_dicts(from_snapshot) == _as_dicts(from_csv)
+    assert from_snapshot[2]["status"] is None  # campo ausente na linha continua ausente
+    for column in ("lat", "lon", "window_start", "window_end"):
+        np.testing.assert_array_equal(getattr(from_snapshot, column), getattr(from_csv, column))
+    assert (from_snapshot.source_offset, from_snapshot.source_digest) == (from_csv.source_offset, from_csv.source_digest)
+
+
+def test_snapshot_is_discarded_when_csv_changes(tmp_path):
+    csv_path = _write_routes(tmp_path / "routes.csv", [_route(1)])
+    snapshot_path = tmp_path / "routes.npz"
+    load_route_store(csv_path, snapshot_path)
+
+    _write_routes(csv_path, [_route(1, status="delivered")])
+    os.utime(csv_path, ns=(0, 0))
+
+    assert RouteStore.load_snapshot(snapshot_path, source_path=csv_path) is None
+    assert load_route_store(csv_path, snapshot_path)[0]["status"] == "delivered"
+
+
+def test_same_file_name_in_different_directories_gets_distinct_snapshots(tmp_path, monkeypatch):
+    monkeypatch.setenv("ROUTE_SNAPSHOT_DIR", str(tmp_path / "cache"))
+    (tmp_path / "a").mkdir()
+    (tmp_path / "b").mkdir()
+    first = _write_routes(tmp_path / "a" / "routes.csv", [_route(1)])
+    second = _write_routes(tmp_path / "b" / "routes.csv", [_route(2), _route(3)])
+
+    assert default_snapshot_path(first) != default_snapshot_path(second)
+    assert default_snapshot_path(first) == default_snapshot_path(tmp_path / "a" / ".." / "a" / "routes.csv")
+
+    load_route_store(first)
+    assert len(load_route_store(second)) == 2
+    assert [route["route_id"] for route in load_route_store(first)] == ["R001"]
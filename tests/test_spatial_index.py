@@ -0,0 +1,92 @@
+"""Índice espacial em grade: mesmos resultados de uma varredura linear, sem degenerar com pontos isolados"""
+
+import numpy as np
+
+from lib.geo import haversine_np
+from lib.spatial_index import RouteSpatialIndex
+
+
+def _brute_force(points, lat, lon, k):
+    """Varredura linear de referência: k menores por (distância, ordem de inserção)"""
+    points = np.asarray(points, dtype=np.float64)
+    distances = haversine_np(lat, lon, points[:, 0], points[:, 1])
+    order = np.lexsort((np.arange(len(points)), distances))[:k]
+    return [(float(distances[i]), int(i)) for i in order]
+
+
+def _index(points):
+    index = RouteSpatialIndex()
+    for item, (lat, lon) in enumerate(points):
+        index.add(float(lat), float(lon), item)
+    return index
+
+
+def _items(results):
+    return [item for _, item in results]
+
+
+def test_nearest_matches_linear_scan_with_isolated_route():
+    rng = np.random.default_rng(5)
+    # Rotas aglomeradas em São Paulo e uma isolada no Rio de Janeiro
+    points = np.vstack([rng.normal((-23.55, -46.63), 0.05, (3000, 2)), [(-22.9, -43.2)]])
+    index = _index(points)
+
+    queries = np.vstack([
+        points[rng.integers(0, len(points), 50)] + 0.0005,  # junto às rotas
+        rng.normal((-23.55, -46.63), 0.5, (30, 2)),         # ao redor do aglomerado
+        [(-22.9, -43.21), (0.0, 0.0), (-30.0, -60.0)],      # perto da isolada e longe de tudo
+    ])
+    for lat, lon in queries:
+        for k in (1, 3):
+            found = index.nearest(float(lat), float(lon), k)
+            expected = _brute_force(points, lat, lon, k)
+            assert _items(found) == [item for _, item in expected]
+            assert np.allclose([d for d, _ in found], [d for d, _ in expected])
+
+
+def test_isolated_route_does_not_force_a_full_scan(monkeypatch):
+    rng = np.random.default_rng(7)
+    points = np.vstack([rng.normal((-23.55, -46.63), 0.05, (3000, 2)), [(-22.9, -43.2)]])
+    index = _index(points)
+
+    examined = []
+    distances = index._distances
+    monkeypatch.setattr(index, "_distances",
+                        lambda lat, lon, indexes: examined.append(len(indexes)) or distances(lat, lon, indexes))
+
+    index.nearest(float(points[10, 0]), float(points[10, 1]))
+    assert sum(examined) < len(points) // 10
+
+
+def test_move_and_remove_keep_results_consistent():
+    rng = np.random.default_rng(11)
+    points = rng.normal((-23.55, -46.63), 0.05, (500, 2))
+    index = _index(points)
+
+    points[7] = (-23.40, -46.50)
+    index.move(7, *points[7])
+    index.remove(3)
+    live = [item for item in range(len(points)) if item != 3]
+
+    assert len(index) == len(points) - 1
+    for lat, lon in [points[3], points[7], (-23.5, -46.6)]:
+        expected = [live[i] for _, i in _brute_force(points[live], lat, lon, 5)]
+        assert _items(index.nearest(float(lat), float(lon), 5)) == expected
+
+    within = _items(index.within_radius(float(points[3, 0]), float(points[3, 1]), 2.0))
+    assert 3 not in within
+    assert 7 in _items(index.within_radius(-23.40, -46.50, 0.01))
+
+
+def test_nearest_bulk_matches_single_queries():
+    rng = np.random.default_rng(13)
+    points = np.vstack([rng.normal((-23.55, -46.63), 0.05, (2000, 2)), [(-22.9, -43.2)]])
+    index = _index(points)
+    queries = np.vstack([rng.normal((-23.55, -46.63), 0.2, (40, 2)), [(-22.9, -43.21)]])
+
+    bulk = index.nearest_bulk(queries, k=2)
+    assert bulk == [index.nearest(float(lat), float(lon), 2) for lat, lon in queries]
+    assert [_items(found) for found in bulk] == [
+        [item for _, item in _brute_force(points, lat, lon, 2)] for lat, lon in queries
+    ]
+    assert RouteSpatialIndex().nearest_bulk(queries) == [[] for _ in queries]
@@ -0,0 +1,51 @@
+"""Literais declarados nos padrões: pular padrões pelo literal não muda nenhum resultado"""
+
+import pytest
+
+from lib.tags_patterns import TagsPatterns
+
+LABELS = [
+    "JADLOG\nSQUEEZE DE ALUMÍNIO CORPO DO SQUEEZE UNICO 500ML\n"
+    "Para: ana caroline de souza da silva\nRua Professor Taciel Cylleno 599 Apto 202\n"
+    "Recreio dos Bandeirantes - RJ\nCEP: 22790-010\nNF: 258454",
+    "amazon.com.br\nFulfillment Center GRU5 - Av. das Nações Unidas 14401 Barueri SP\n"
+    "DESTINATÁRIO: Carlos Eduardo Mendes\nAv. Paulista 1000, Bela Vista\n"
+    "São Paulo - SP\n01310-100\nNota Fiscal: NF789123\nPrime 1 de 1",
+    "Empresa Brasileira de Correios e Telégrafos\nSEDEX 10 correios.com.br\n"
+    "AB123456789BR\nNOME: Fernanda Lima Costa\nRua das Flores 250 casa 2\n"
+    "Rio de Janeiro - RJ\nCEP 22071900\nN.F. 445789",
+    "Mercado Envios\nconta Logistics #1582976565\nRua Jussara 1250 Tambore Barueri\n"
+    "José Roberto Alves\nPRAÇA Atlântica 500 Copacabana\nCIDADE: rio de janeiro\n"
+    "22021-001\nNF 334567\nMELI",
+    "Jad Log entrega\nEndereço: Alameda Santos 45\nSAO PAULO, SP 01419-000\nnf:A998877",
+    "texto sem nenhum dado reconhecível",
+]
+
+
+@pytest.fixture(scope="module")
+def patterns_pair():
+    """Padrões com os literais declarados e os mesmos padrões sem nenhum (todos rodam sempre)"""
+    unfiltered = TagsPatterns()
+    for patterns in unfiltered.company_patterns.values():
+        for pattern_info in patterns:
+            pattern_info.pop("literals", None)
+    for patterns_info in unfiltered.data_extraction_patterns.values():
+        patterns_info.pop("literals", None)
+    unfiltered._compile_company_matcher()
+    unfiltered._compile_extraction_plan()
+    return TagsPatterns(), unfiltered
+
+
+@pytest.mark.parametrize("text", LABELS)
+def test_declared_literals_do_not_change_results(patterns_pair, text):
+    filtered, unfiltered = patterns_pair
+    assert filtered.identify_company(text) == unfiltered.identify_company(text)
+    for data_type in filtered.data_extraction_patterns:
+        assert filtered.extract_data(text, data_type) == unfiltered.extract_data(text, data_type)
+
+
+def test_literals_are_declared_per_pattern():
+    patterns = TagsPatterns()
+    for patterns_info in patterns.data_extraction_patterns.values():
+        assert len(patterns_info["literals"]) == len(patterns_info["patterns"])
+    assert patterns._unfiltered_patterns  # correios_code: sem literal, roda sempre